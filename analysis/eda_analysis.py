@@ -1,30 +1,645 @@
-import pandas as pd
+"""
+Headless exploratory analysis of the women's health dataset.
+
+The dataset is streamed in chunks (model/dataset_io.py, so CSV, Parquet or
+Feather) and folded into mergeable accumulators; no more than one chunk is
+ever in memory, so 100M rows take the same memory as 1M:
+
+- Moments: count, mean, min/max and the co-moment matrix of the numeric
+  columns, merged with Chan et al.'s parallel update. Variances and the
+  correlation matrix come from it without a second pass.
+- CategoryDelays: for every categorical column, an exact histogram of
+  delay_days per category (delays are whole days), which gives counts,
+  means, spreads and quantiles.
+
+Accumulators from separate chunks or files merge into the same result as a
+single pass. A directory written by notebooks/create_datasets.py --parts is
+summarised part by part across --workers processes.
+
+Figures (PNG) and summary.json are written to --output-dir; nothing is shown
+on screen. Both come from a cache in analysis/.cache/ (see eda_cache.py):
+the summary is keyed by the dataset's content hash and the EDA configuration,
+and each figure by a hash of the aggregates it is drawn from, so rerunning
+on an unchanged dataset only copies files and a changed dataset redraws
+only the figures whose data changed.
+
+Run with:
+    python analysis/eda_analysis.py
+    python analysis/eda_analysis.py big.parquet --output-dir eda_big
+    python analysis/eda_analysis.py big_parts/ --workers 8
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import multiprocessing
 import os
+import shutil
+import sys
+import time
+
+import matplotlib
+
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
-import seaborn as sns
-
-# Load dataset
-data_path = os.path.join("..", "/home/ritirai/Desktop/RITI/AI-Powered Women Health Insight System/Women Health Insight/data/women_health_dataset.csv")
-df = pd.read_csv(data_path) 
-# Display basic info    
-print("Dataset Info:")
-print(df.head())
-print(df.describe())
-
-#stress vs delay_days analysis
-plt.scatter(df['stress_level'], df['delay_days'])
-plt.title('Stress Level vs Delay Days')
-plt.xlabel('Stress Level')
-plt.ylabel('Delay Days')
-plt.savefig(os.path.join("..", "/home/ritirai/Desktop/RITI/AI-Powered Women Health Insight System/Women Health Insight/PNG OUTPUT/stress_vs_delay_days.png"))
-plt.show()
-
-#boxplot for stress vs delay_days
-sns.boxplot(x='stress_level', y='delay_days', data=df)
-plt.title('Stress Level vs Delay Days (Boxplot)')
-plt.savefig(os.path.join("..", "stress_vs_delay_days_boxplot.png"))
-plt.show()
-
-corr=df.corr()
-print("Correlation Matrix:")
-print(corr)
+import numpy as np
+from matplotlib import cbook
+from matplotlib.colors import LogNorm
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, "model"))
+
+from dataset_io import CHUNKSIZE, SCHEMA, iter_dataset, vocab_codes
+from eda_cache import CACHE_DIR, DATA_PATH, dataset_digest, record_summary, summary_json_path
+from feature_encoder import TARGET
+from pipeline import Pipeline, Stage
+
+OUTPUT_DIR = os.path.join(BASE_DIR, "PNG OUTPUT")
+
+# Identifiers are not analysed
+NUMERIC_COLUMNS = [col for col, dtype in SCHEMA.items()
+                   if not isinstance(dtype, pd.CategoricalDtype) and col != "user_id"]
+CATEGORICAL_COLUMNS = {col: list(dtype.categories) for col, dtype in SCHEMA.items()
+                       if isinstance(dtype, pd.CategoricalDtype)}
+
+# Figures switch from per-row rendering (drawn from a sample holding every row)
+# to aggregated rendering above this many rows
+RAW_PLOT_ROWS = 50_000
+PLOT_CATEGORY = "stress_level"
+# Numeric inputs plotted against delay_days
+DENSITY_COLUMNS = ["sleep_hours", "cycle_length", "bmi"]
+# Inputs with population reference ranges in summary.json (read by the app)
+REFERENCE_COLUMNS = ["age", "cycle_length", "period_duration", "sleep_hours", "water_intake", "bmi"]
+REFERENCE_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+# Grid / histogram bin width of each column
+BIN_WIDTHS = {"age": 1, "cycle_length": 1, "period_duration": 1, "sleep_hours": 0.1, "water_intake": 1,
+              "bmi": 0.25, TARGET: 1}
+# Part of every cache key; bump when the accumulators or the figures change
+EDA_VERSION = 1
+
+
+class Moments:
+    """Count, mean, min/max and co-moments of a fixed set of columns; mergeable"""
+
+    def __init__(self, columns: list):
+        self.columns = list(columns)
+        k = len(self.columns)
+        self.n = 0
+        self.missing = np.zeros(k, dtype=np.int64)
+        self.mean = np.zeros(k)
+        self.comoment = np.zeros((k, k))
+        self.min = np.full(k, np.inf)
+        self.max = np.full(k, -np.inf)
+
+    def update(self, chunk: pd.DataFrame):
+        X = np.column_stack([chunk[col].to_numpy(dtype=np.float64) for col in self.columns])
+        # Rows with a missing value are counted per column and left out of the moments
+        nan = np.isnan(X)
+        self.missing += nan.sum(axis=0)
+        X = X[~nan.any(axis=1)]
+        if not len(X):
+            return
+        other = Moments(self.columns)
+        other.n = len(X)
+        other.mean = X.mean(axis=0)
+        centered = X - other.mean
+        other.comoment = centered.T @ centered
+        other.min, other.max = X.min(axis=0), X.max(axis=0)
+        self._absorb(other)
+
+    def merge(self, other: "Moments"):
+        self.missing += other.missing
+        self._absorb(other)
+
+    def _absorb(self, other: "Moments"):
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.comoment += other.comoment + np.outer(delta, delta) * (self.n * other.n / n)
+        self.mean = self.mean + delta * (other.n / n)
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        self.n = n
+
+    @property
+    def variance(self) -> np.ndarray:
+        return np.diag(self.comoment) / max(self.n - 1, 1)
+
+    def correlation(self) -> pd.DataFrame:
+        scale = np.sqrt(np.diag(self.comoment))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = self.comoment / np.outer(scale, scale)
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+    def describe(self) -> dict:
+        std = np.sqrt(self.variance)
+        return {
+            col: {"count": self.n, "missing": int(self.missing[j]), "mean": float(self.mean[j]),
+                  "std": float(std[j]), "var": float(self.variance[j]),
+                  "min": float(self.min[j]), "max": float(self.max[j])}
+            for j, col in enumerate(self.columns)
+        }
+
+
+class CategoryDelays:
+    """Exact per-category histograms of a whole-day target; mergeable"""
+
+    def __init__(self, categorical: dict, target: str = TARGET):
+        self.categorical = {col: list(vocab) for col, vocab in categorical.items()}
+        self.target = target
+        # counts[col][category, delay] -> rows; the delay axis grows as larger delays appear
+        self.counts = {col: np.zeros((len(vocab) + 1, 1), dtype=np.int64) for col, vocab in self.categorical.items()}
+
+    @staticmethod
+    def _pad(counts: np.ndarray, width: int) -> np.ndarray:
+        if counts.shape[1] >= width:
+            return counts
+        return np.pad(counts, ((0, 0), (0, width - counts.shape[1])))
+
+    def update(self, chunk: pd.DataFrame):
+        delay = chunk[self.target].to_numpy(dtype=np.float64)
+        valid = ~np.isnan(delay) & (delay >= 0)
+        delay = np.rint(delay[valid]).astype(np.int64)
+        if not len(delay):
+            return
+        width = int(delay.max()) + 1
+        for col, vocab in self.categorical.items():
+            # Code -1 (missing / outside the vocabulary) is kept as an extra last row
+            codes = vocab_codes(chunk[col], vocab)[valid].astype(np.int64)
+            codes[codes < 0] = len(vocab)
+            counts = np.bincount(codes * width + delay, minlength=(len(vocab) + 1) * width)
+            counts = counts.reshape(len(vocab) + 1, width)
+            size = max(width, self.counts[col].shape[1])
+            self.counts[col] = self._pad(self.counts[col], size) + self._pad(counts, size)
+
+    def merge(self, other: "CategoryDelays"):
+        for col, counts in other.counts.items():
+            size = max(counts.shape[1], self.counts[col].shape[1])
+            self.counts[col] = self._pad(self.counts[col], size) + self._pad(counts, size)
+
+    @staticmethod
+    def quantiles(hist: np.ndarray, qs) -> list:
+        """Nearest-rank quantiles of the values 0..len(hist)-1, weighted by hist"""
+        cumulative = np.cumsum(hist)
+        return [int(np.searchsorted(cumulative, q * cumulative[-1], side="left")) for q in qs]
+
+    def distribution(self, col: str) -> dict:
+        """Per category: rows, share and the target's mean / std / min / quartiles / max"""
+        counts = self.counts[col]
+        total = counts.sum()
+        values = np.arange(counts.shape[1])
+        summary = {}
+        for i, category in enumerate(self.categorical[col] + ["(other)"]):
+            hist = counts[i]
+            n = int(hist.sum())
+            if n == 0:
+                continue
+            mean = float(values @ hist / n)
+            std = float(np.sqrt(((values - mean) ** 2) @ hist / max(n - 1, 1)))
+            nonzero = np.flatnonzero(hist)
+            p25, p50, p75 = self.quantiles(hist, (0.25, 0.5, 0.75))
+            summary[category] = {"count": n, "share": float(n / total), "mean": mean, "std": std,
+                                 "min": int(nonzero[0]), "p25": p25, "median": p50, "p75": p75,
+                                 "max": int(nonzero[-1])}
+        return summary
+
+
+class DensityGrid:
+    """Row counts of two numeric columns on a fixed grid; mergeable, sized by the value range, not the rows"""
+
+    def __init__(self, x: str, y: str, x_width: float, y_width: float):
+        self.x, self.y = x, y
+        self.x_width, self.y_width = x_width, y_width
+        # (i, j) -> rows; cell (i, j) is centred on (i * x_width, j * y_width), so the grid
+        # is the same for every chunk and file without knowing the value range up front
+        self.counts = {}
+
+    def update(self, chunk: pd.DataFrame):
+        x = chunk[self.x].to_numpy(dtype=np.float64)
+        y = chunk[self.y].to_numpy(dtype=np.float64)
+        valid = ~(np.isnan(x) | np.isnan(y))
+        if not valid.any():
+            return
+        i = np.rint(x[valid] / self.x_width).astype(np.int64)
+        j = np.rint(y[valid] / self.y_width).astype(np.int64)
+        # One sort over a combined key; only the occupied cells reach Python
+        i0, j0 = i.min(), j.min()
+        height = j.max() - j0 + 1
+        keys, rows = np.unique((i - i0) * height + (j - j0), return_counts=True)
+        for key, n in zip(keys.tolist(), rows.tolist()):
+            cell = (key // height + i0, key % height + j0)
+            self.counts[cell] = self.counts.get(cell, 0) + n
+
+    def merge(self, other: "DensityGrid"):
+        for cell, n in other.counts.items():
+            self.counts[cell] = self.counts.get(cell, 0) + n
+
+    def dense(self):
+        """x edges, y edges and the (y, x) count matrix over the occupied range"""
+        cells = np.array(list(self.counts), dtype=np.int64).reshape(-1, 2)
+        low, high = cells.min(axis=0), cells.max(axis=0)
+        grid = np.zeros((high[1] - low[1] + 1, high[0] - low[0] + 1), dtype=np.int64)
+        grid[cells[:, 1] - low[1], cells[:, 0] - low[0]] = list(self.counts.values())
+        x_edges = (np.arange(low[0], high[0] + 2) - 0.5) * self.x_width
+        y_edges = (np.arange(low[1], high[1] + 2) - 0.5) * self.y_width
+        return x_edges, y_edges, grid
+
+
+class ColumnHistogram:
+    """Row counts of one numeric column in fixed-width bins centred on multiples of the width; mergeable"""
+
+    def __init__(self, col: str, width: float):
+        self.col = col
+        self.width = width
+        self.counts = {}
+
+    def update(self, chunk: pd.DataFrame):
+        values = chunk[self.col].to_numpy(dtype=np.float64)
+        values = values[~np.isnan(values)]
+        bins, rows = np.unique(np.rint(values / self.width).astype(np.int64), return_counts=True)
+        for i, n in zip(bins.tolist(), rows.tolist()):
+            self.counts[i] = self.counts.get(i, 0) + n
+
+    def merge(self, other: "ColumnHistogram"):
+        for i, n in other.counts.items():
+            self.counts[i] = self.counts.get(i, 0) + n
+
+    def quantiles(self, qs) -> list:
+        """Nearest-rank quantiles, accurate to the bin width"""
+        bins = sorted(self.counts)
+        if not bins:
+            return [None] * len(qs)
+        ranks = CategoryDelays.quantiles(np.array([self.counts[i] for i in bins]), qs)
+        return [round(bins[rank] * self.width, 6) for rank in ranks]
+
+
+class RowSample:
+    """A uniform sample of at most `size` rows of some columns; mergeable
+
+    Every row draws a random key and the rows with the smallest keys are kept,
+    so merging two samples is keeping the smallest keys of both. Datasets with
+    no more than `size` rows are kept whole.
+    """
+
+    def __init__(self, numeric: list, categorical: dict, size: int, seed=None):
+        self.numeric = list(numeric)
+        self.categorical = {col: list(vocab) for col, vocab in categorical.items()}
+        self.size = int(size)
+        self.rng = np.random.default_rng(seed)
+        self.keys = np.empty(0)
+        # Categoricals are kept as vocabulary codes
+        self.columns = {col: np.empty(0, dtype=np.float64) for col in self.numeric}
+        self.columns.update({col: np.empty(0, dtype=np.int8) for col in self.categorical})
+
+    def _keep(self, keys: np.ndarray, columns: dict):
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size - 1)[:self.size]
+            keys, columns = keys[keep], {col: values[keep] for col, values in columns.items()}
+        self.keys, self.columns = keys, columns
+
+    def update(self, chunk: pd.DataFrame):
+        keys = self.rng.random(len(chunk))
+        # Only the chunk's own smallest keys can enter the sample
+        rows = np.argpartition(keys, self.size - 1)[:self.size] if len(keys) > self.size else slice(None)
+        columns = {col: chunk[col].to_numpy(dtype=np.float64)[rows] for col in self.numeric}
+        columns.update({col: vocab_codes(chunk[col], vocab)[rows].astype(np.int8)
+                        for col, vocab in self.categorical.items()})
+        self._keep(np.concatenate([self.keys, keys[rows]]),
+                   {col: np.concatenate([self.columns[col], values]) for col, values in columns.items()})
+
+    def merge(self, other: "RowSample"):
+        self._keep(np.concatenate([self.keys, other.keys]),
+                   {col: np.concatenate([self.columns[col], other.columns[col]]) for col in self.columns})
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class EDASummary:
+    """All accumulators for one dataset (or one part of it)"""
+
+    def __init__(self, numeric: list = None, categorical: dict = None, sample_rows: int = RAW_PLOT_ROWS,
+                 seed=None):
+        self.rows = 0
+        self.chunks = 0
+        self.moments = Moments(numeric or NUMERIC_COLUMNS)
+        self.delays = CategoryDelays(categorical or CATEGORICAL_COLUMNS)
+        self.density = {x: DensityGrid(x, TARGET, BIN_WIDTHS[x], BIN_WIDTHS[TARGET]) for x in DENSITY_COLUMNS}
+        self.histograms = {col: ColumnHistogram(col, BIN_WIDTHS[col]) for col in REFERENCE_COLUMNS}
+        self.sample = RowSample(DENSITY_COLUMNS + [TARGET], {PLOT_CATEGORY: CATEGORICAL_COLUMNS[PLOT_CATEGORY]},
+                                sample_rows, seed)
+
+    def update(self, chunk: pd.DataFrame):
+        self.rows += len(chunk)
+        self.chunks += 1
+        self.moments.update(chunk)
+        self.delays.update(chunk)
+        for grid in self.density.values():
+            grid.update(chunk)
+        for histogram in self.histograms.values():
+            histogram.update(chunk)
+        self.sample.update(chunk)
+
+    def merge(self, other: "EDASummary"):
+        self.rows += other.rows
+        self.chunks += other.chunks
+        self.moments.merge(other.moments)
+        self.delays.merge(other.delays)
+        for x, grid in self.density.items():
+            grid.merge(other.density[x])
+        for col, histogram in self.histograms.items():
+            histogram.merge(other.histograms[col])
+        self.sample.merge(other.sample)
+
+    def to_dict(self) -> dict:
+        corr = self.moments.correlation()
+        return {
+            "rows": self.rows,
+            "numeric": self.moments.describe(),
+            "correlation": {col: {other: (None if np.isnan(v) else float(v)) for other, v in row.items()}
+                            for col, row in corr.to_dict(orient="index").items()},
+            "categorical": {col: self.delays.distribution(col) for col in self.delays.categorical},
+            "reference_ranges": {col: self.reference_range(col) for col in self.histograms},
+        }
+
+    def reference_range(self, col: str) -> dict:
+        """Population percentiles of one input, for comparing a single assessment against"""
+        histogram = self.histograms[col]
+        p5, p25, p50, p75, p95 = histogram.quantiles(REFERENCE_QUANTILES)
+        return {"p5": p5, "p25": p25, "median": p50, "p75": p75, "p95": p95, "resolution": histogram.width}
+
+
+def summarize_file(path: str, chunksize: int = CHUNKSIZE, sample_rows: int = RAW_PLOT_ROWS,
+                   seed=None) -> EDASummary:
+    columns = NUMERIC_COLUMNS + [col for col in CATEGORICAL_COLUMNS if col not in NUMERIC_COLUMNS]
+    summary = EDASummary(sample_rows=sample_rows, seed=seed)
+    for chunk in iter_dataset(path, chunksize, columns=columns):
+        summary.update(chunk)
+    return summary
+
+
+def dataset_files(path: str) -> list:
+    """The file itself, or the parts listed by a create_datasets.py --parts manifest"""
+    if not os.path.isdir(path):
+        return [path]
+    with open(os.path.join(path, "manifest.json")) as f:
+        return [os.path.join(path, part["file"]) for part in json.load(f)["parts"]]
+
+
+def summarize(path: str, chunksize: int = CHUNKSIZE, workers: int = 1, sample_rows: int = RAW_PLOT_ROWS,
+              seed: int = 42) -> EDASummary:
+    """Stream every file of the dataset into one EDASummary, files in parallel if workers > 1"""
+    files = dataset_files(path)
+    # One seed per file, so the sample does not depend on the number of workers
+    tasks = [(file, chunksize, sample_rows, file_seed)
+             for file, file_seed in zip(files, np.random.SeedSequence(seed).spawn(len(files)))]
+    workers = max(1, min(int(workers), len(files)))
+    if workers == 1:
+        parts = (summarize_file(*task) for task in tasks)
+    else:
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        with ctx.Pool(workers) as pool:
+            parts = pool.starmap(summarize_file, tasks)
+
+    total = EDASummary(sample_rows=sample_rows)
+    for part in parts:
+        total.merge(part)
+    return total
+
+
+def raw_plots(summary: EDASummary) -> bool:
+    """Whether the sample still holds every row, so figures can be drawn per row"""
+    return summary.rows <= summary.sample.size
+
+
+def _label(col: str) -> str:
+    return col.replace("_", " ").title()
+
+
+def plot_category_delays(summary: EDASummary, col: str, path: str):
+    """Per-row scatter for small datasets; above that every distinct (category, delay) pair sized by its rows"""
+    vocab = summary.delays.categorical[col]
+    fig, ax = plt.subplots(figsize=(8, 5))
+    if raw_plots(summary):
+        codes, delays = summary.sample.columns[col], summary.sample.columns[TARGET]
+        known = codes >= 0
+        ax.scatter(codes[known], delays[known], alpha=0.6)
+    else:
+        counts = summary.delays.counts[col][:len(vocab)]
+        x, y = np.nonzero(counts)
+        ax.scatter(x, y, s=10 + 90 * np.sqrt(counts[x, y] / counts.max()), alpha=0.6)
+    ax.set_xticks(range(len(vocab)), vocab)
+    ax.set_title(f"{_label(col)} vs Delay Days")
+    ax.set_xlabel(_label(col))
+    ax.set_ylabel("Delay Days")
+    fig.savefig(path, bbox_inches="tight")
+    plt.close(fig)
+
+
+def plot_category_boxplot(summary: EDASummary, col: str, path: str):
+    """Boxplot (1.5 IQR whiskers) of the rows for small datasets, of the exact histograms above that"""
+    counts = summary.delays.counts[col]
+    stats = []
+    for i, category in enumerate(summary.delays.categorical[col]):
+        if raw_plots(summary):
+            delays = summary.sample.columns[TARGET][summary.sample.columns[col] == i]
+            delays = delays[~np.isnan(delays)]
+            if len(delays):
+                stats.extend(cbook.boxplot_stats(delays, labels=[category]))
+            continue
+        hist = counts[i]
+        if not hist.sum():
+            continue
+        q1, med, q3 = CategoryDelays.quantiles(hist, (0.25, 0.5, 0.75))
+        values = np.flatnonzero(hist)
+        low = values[values >= q1 - 1.5 * (q3 - q1)].min()
+        high = values[values <= q3 + 1.5 * (q3 - q1)].max()
+        stats.append({"label": category, "q1": q1, "med": med, "q3": q3, "whislo": low, "whishi": high,
+                      "fliers": values[(values < low) | (values > high)]})
+    fig, ax = plt.subplots(figsize=(8, 5))
+    ax.bxp(stats, showfliers=True)
+    ax.set_title(f"{_label(col)} vs Delay Days (Boxplot)")
+    ax.set_xlabel(_label(col))
+    ax.set_ylabel("Delay Days")
+    fig.savefig(path, bbox_inches="tight")
+    plt.close(fig)
+
+
+def plot_density(summary: EDASummary, x: str, path: str):
+    """Per-row scatter for small datasets; above that a 2D histogram of the grid, log-scaled row counts"""
+    fig, ax = plt.subplots(figsize=(8, 5))
+    if raw_plots(summary):
+        ax.scatter(summary.sample.columns[x], summary.sample.columns[TARGET], s=8, alpha=0.5)
+    elif summary.density[x].counts:
+        x_edges, y_edges, grid = summary.density[x].dense()
+        mesh = ax.pcolormesh(x_edges, y_edges, np.ma.masked_equal(grid, 0), norm=LogNorm(), cmap="viridis")
+        fig.colorbar(mesh, ax=ax, label="Rows")
+    ax.set_title(f"{_label(x)} vs Delay Days")
+    ax.set_xlabel(_label(x))
+    ax.set_ylabel("Delay Days")
+    fig.savefig(path, bbox_inches="tight")
+    plt.close(fig)
+
+
+def plot_correlation(summary: EDASummary, path: str):
+    corr = summary.moments.correlation()
+    fig, ax = plt.subplots(figsize=(10, 8))
+    image = ax.imshow(corr.to_numpy(), cmap="coolwarm", vmin=-1, vmax=1)
+    ax.set_xticks(range(len(corr)), corr.columns, rotation=90)
+    ax.set_yticks(range(len(corr)), corr.index)
+    fig.colorbar(image, ax=ax)
+    ax.set_title("Correlation Matrix")
+    fig.savefig(path, bbox_inches="tight")
+    plt.close(fig)
+
+
+def eda_config(raw_plot_rows: int = RAW_PLOT_ROWS, seed: int = 42) -> dict:
+    """Everything besides the data that the summary depends on (not the chunk size or workers)"""
+    return {"version": EDA_VERSION, "numeric": NUMERIC_COLUMNS, "categorical": CATEGORICAL_COLUMNS,
+            "density": DENSITY_COLUMNS, "reference": REFERENCE_COLUMNS, "bin_widths": BIN_WIDTHS,
+            "plot_category": PLOT_CATEGORY, "raw_plot_rows": raw_plot_rows, "seed": seed}
+
+
+def _digest(*arrays) -> str:
+    digest = hashlib.sha256()
+    for values in arrays:
+        values = np.ascontiguousarray(values)
+        digest.update(f"{values.dtype}{values.shape}".encode())
+        digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+def figures(summary: EDASummary) -> dict:
+    """File name -> (plot function taking a path or file, digest of the data the figure is drawn from)"""
+    raw = raw_plots(summary)
+    sample = summary.sample.columns
+    category = (_digest(sample[PLOT_CATEGORY], sample[TARGET]) if raw
+                else _digest(summary.delays.counts[PLOT_CATEGORY]))
+    specs = {
+        "stress_vs_delay_days.png": (lambda f: plot_category_delays(summary, PLOT_CATEGORY, f), category),
+        "stress_vs_delay_days_boxplot.png": (lambda f: plot_category_boxplot(summary, PLOT_CATEGORY, f), category),
+        "correlation_matrix.png": (lambda f: plot_correlation(summary, f),
+                                   _digest(summary.moments.correlation().to_numpy())),
+    }
+    for x in DENSITY_COLUMNS:
+        grid = summary.density[x]
+        inputs = (_digest(sample[x], sample[TARGET]) if raw
+                  else _digest(*grid.dense()) if grid.counts else "empty")
+        specs[f"{x}_vs_delay_days.png"] = (lambda f, x=x: plot_density(summary, x, f), inputs)
+    return specs
+
+
+def _render(plot) -> bytes:
+    buffer = io.BytesIO()
+    plot(buffer)
+    return buffer.getvalue()
+
+
+def write_outputs(summary: EDASummary, output_dir: str, pipeline: Pipeline, summary_json: str):
+    """Figures and summary.json in output_dir; only figures whose inputs are not cached are drawn
+
+    Returns the paths written and the number of figures rendered.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    raw = raw_plots(summary)
+    paths, rendered = [], 0
+    for name, (plot, inputs) in figures(summary).items():
+        # Keyed on what the figure shows, so a change to one column redraws only its figures
+        stage = Stage(f"figure_{os.path.splitext(name)[0]}", lambda plot=plot, **params: _render(plot),
+                      params={"version": EDA_VERSION, "raw": raw, "inputs": inputs})
+        png = pipeline.run(stage)
+        rendered += pipeline.log[-1]["status"] == "ran"
+        paths.append(os.path.join(output_dir, name))
+        with open(paths[-1], "wb") as f:
+            f.write(png)
+
+    paths.append(os.path.join(output_dir, "summary.json"))
+    shutil.copyfile(summary_json, paths[-1])
+    return paths, rendered
+
+
+def write_summary_json(summary: EDASummary, path: str, extra: dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({**summary.to_dict(), "plots": "raw" if raw_plots(summary) else "aggregated", **extra},
+                  f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def print_summary(summary: EDASummary):
+    print("=" * 80)
+    print(f"DATASET SUMMARY ({summary.rows:,} rows)")
+    print("=" * 80)
+    print(f"{'Column':<22} {'Mean':>10} {'Std':>10} {'Min':>10} {'Max':>10} {'Corr w/ delay':>14}")
+    print("-" * 80)
+    corr = summary.moments.correlation()
+    for col, stats in summary.moments.describe().items():
+        print(f"{col:<22} {stats['mean']:>10.2f} {stats['std']:>10.2f} {stats['min']:>10.2f} {stats['max']:>10.2f} "
+              f"{corr.loc[col, TARGET]:>14.3f}")
+    print("-" * 80)
+
+    for col in summary.delays.categorical:
+        print(f"\n{col}: delay_days by category")
+        print(f"   {'Category':<22} {'Rows':>12} {'Share':>7} {'Mean':>8} {'Median':>7} {'IQR':>9}")
+        for category, stats in summary.delays.distribution(col).items():
+            print(f"   {category:<22} {stats['count']:>12,} {stats['share']:>7.1%} {stats['mean']:>8.2f} "
+                  f"{stats['median']:>7} {stats['p25']:>4}–{stats['p75']:<4}")
+    print("=" * 80)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless chunked EDA: summary.json and figures")
+    parser.add_argument("data", nargs="?", default=DATA_PATH,
+                        help="Dataset file (.csv, .parquet, .feather) or a --parts directory")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE, help="Rows per chunk")
+    parser.add_argument("--workers", "-j", type=int, default=1, help="Processes for a --parts directory")
+    parser.add_argument("--raw-plot-rows", type=int, default=RAW_PLOT_ROWS,
+                        help="Largest dataset drawn per row; larger ones are plotted from aggregates")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the row sample")
+    parser.add_argument("--no-cache", action="store_true", help="Recompute the summary and every figure")
+    args = parser.parse_args(argv)
+
+    pipeline = Pipeline(CACHE_DIR, use_cache=not args.no_cache)
+    start = time.perf_counter()
+    digest = dataset_digest(args.data)
+    stage = Stage("summary",
+                  lambda **config: summarize(args.data, args.chunksize, args.workers, config["raw_plot_rows"],
+                                             config["seed"]),
+                  params={"dataset": digest, **eda_config(args.raw_plot_rows, args.seed)})
+    summary = pipeline.run(stage)
+    run = pipeline.log[-1]
+    summary_json = summary_json_path(stage.key)
+    if run["status"] == "ran" or not os.path.exists(summary_json):
+        write_summary_json(summary, summary_json, {
+            "data": os.path.abspath(args.data),
+            "dataset_sha256": digest,
+            "seconds": run["seconds"],
+            "peak_rss_mb": run["peak_rss_mb"],
+        })
+    record_summary(args.data, stage.key)
+    seconds = time.perf_counter() - start
+
+    print_summary(summary)
+    if run["status"] == "ran":
+        print(f"\n📊 {summary.rows:,} rows in {summary.chunks} chunks: {run['seconds']:.1f}s "
+              f"({summary.rows / max(run['seconds'], 1e-9):,.0f} rows/s), peak RSS {run['peak_rss_mb']:,.0f} MB")
+    else:
+        print(f"\n♻️  Summary of {summary.rows:,} rows loaded from the cache ({run['key']}) in {seconds:.2f}s")
+
+    start = time.perf_counter()
+    paths, rendered = write_outputs(summary, args.output_dir, pipeline, summary_json)
+    print(f"🖼️  Wrote {len(paths)} files to {args.output_dir} in {time.perf_counter() - start:.1f}s: "
+          f"{rendered} figures rendered, {len(paths) - 1 - rendered} from the cache "
+          f"({'per-row' if raw_plots(summary) else 'aggregated'} figures)")
+
+
+if __name__ == "__main__":
+    # Run through the module so cached summaries pickle eda_analysis.EDASummary, not __main__'s
+    import eda_analysis
+
+    eda_analysis.main()
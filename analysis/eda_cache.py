@@ -0,0 +1,116 @@
+"""
+Where analysis/eda_analysis.py keeps its cached results, and how they are found.
+
+Summaries and figures are pipeline stages (model/pipeline.py) in
+analysis/.cache/, keyed by the dataset's content hash and the EDA
+configuration. Hashing a large dataset takes seconds, so datasets.json
+remembers each file's SHA-256 together with its size and mtime and only
+rehashes a file whose stat changed. It also records the summary most
+recently computed for each dataset, which lets the app read population
+reference ranges from the cache with a stat() instead of loading the data.
+
+This module only needs the standard library, so the app can import it
+without matplotlib.
+"""
+
+import json
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, "model"))
+
+from pipeline import content_hash, file_sha256
+
+DATA_PATH = os.path.join(BASE_DIR, "data", "women_health_dataset.csv")
+CACHE_DIR = os.path.join(BASE_DIR, "analysis", ".cache")
+INDEX_PATH = os.path.join(CACHE_DIR, "datasets.json")
+
+
+def _load_index(cache_dir: str = CACHE_DIR) -> dict:
+    try:
+        with open(os.path.join(cache_dir, os.path.basename(INDEX_PATH))) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(index: dict, cache_dir: str = CACHE_DIR):
+    path = os.path.join(cache_dir, os.path.basename(INDEX_PATH))
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _stat(path: str) -> dict:
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _files(path: str) -> list:
+    """The file itself, or a --parts directory's manifest followed by its parts"""
+    if not os.path.isdir(path):
+        return [path]
+    manifest = os.path.join(path, "manifest.json")
+    with open(manifest) as f:
+        return [manifest] + [os.path.join(path, part["file"]) for part in json.load(f)["parts"]]
+
+
+def dataset_digest(path: str, cache_dir: str = CACHE_DIR) -> str:
+    """Content hash of a dataset file or --parts directory; files whose stat is unchanged are not reread"""
+    index = _load_index(cache_dir)
+    hashes, changed = [], False
+    for file in _files(path):
+        file = os.path.abspath(file)
+        entry = index.get(file, {})
+        stat = _stat(file)
+        if entry.get("size") != stat["size"] or entry.get("mtime_ns") != stat["mtime_ns"]:
+            # A new or modified file; anything recorded for the old contents no longer applies
+            entry = {**stat, "sha256": file_sha256(file)}
+            index[file] = entry
+            changed = True
+        hashes.append(entry["sha256"])
+    if changed:
+        _save_index(index, cache_dir)
+    return hashes[0] if not os.path.isdir(path) else content_hash(hashes)
+
+
+def summary_json_path(key: str, cache_dir: str = CACHE_DIR) -> str:
+    return os.path.join(cache_dir, f"summary-{key[:16]}.json")
+
+
+def record_summary(path: str, key: str, cache_dir: str = CACHE_DIR):
+    """Remember key as the latest summary of the dataset at path (see cached_summary)"""
+    index = _load_index(cache_dir)
+    entry = index.setdefault(os.path.abspath(path), {})
+    entry["summary"] = key[:16]
+    if os.path.isdir(path):
+        # Directories have no content of their own; they are current while every file is
+        entry["files"] = [os.path.abspath(file) for file in _files(path)]
+    _save_index(index, cache_dir)
+
+
+def cached_summary(path: str = DATA_PATH, cache_dir: str = CACHE_DIR):
+    """The latest cached summary.json of the dataset, or None if it was never analysed or has changed since"""
+    index = _load_index(cache_dir)
+    entry = index.get(os.path.abspath(path))
+    if not entry or "summary" not in entry:
+        return None
+    try:
+        for file in entry.get("files", [os.path.abspath(path)]):
+            recorded = index.get(file, {})
+            if recorded.get("size") is None or _stat(file) != {"size": recorded["size"],
+                                                                "mtime_ns": recorded["mtime_ns"]}:
+                return None
+        with open(os.path.join(cache_dir, f"summary-{entry['summary']}.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def reference_ranges(path: str = DATA_PATH, cache_dir: str = CACHE_DIR):
+    """Population percentiles per input from the cached summary, or None"""
+    summary = cached_summary(path, cache_dir)
+    return summary.get("reference_ranges") if summary else None
@@ -1,16 +1,30 @@
 import os
+import sys
+import uuid
 from datetime import datetime, timedelta
 
-import joblib
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
 import streamlit as st
 
-from db import save_to_csv, save_to_sqlite, load_history, make_report_path
+# Model-side modules (feature encoder, flat forest evaluator) live next to the model artifacts
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "model"))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "analysis"))
+
+from db import SQLITE_PATH, save_to_csv, save_to_sqlite, load_history, make_report_path, record_outcome
+from model_registry import get_registry
+from prediction_grid import load_or_build_grid
+from prediction_client import get_client
+from inference_governor import get_governor
+from feature_encoder import FeatureEncoder
+from model_backends import load_model, predictor_for, read_metadata
+from distill import SURROGATE_PATH, Surrogate
+from risk import risk_level, interpretation
 from report import generate_pdf_report
 from recommendations import generate_personalized_recommendations, get_bmi_category
+from eda_cache import reference_ranges
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -29,6 +43,7 @@ st.set_page_config(
 # ═══════════════════════════════════════════════════════════════════
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 MODEL_PATH = os.path.join(BASE_DIR, "model", "delay_predictor_model.pkl")
+ENCODER_PATH = os.path.join(BASE_DIR, "model", "feature_encoder.joblib")
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -902,16 +917,25 @@ st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 # MODEL LOADING
 # ═══════════════════════════════════════════════════════════════════
 def load_model_fn():
-    """Load the trained ML model with error handling"""
-    if not os.path.exists(MODEL_PATH):
-        st.error(f"❌ **Model not found** at: `{MODEL_PATH}`")
-        st.info("Please ensure the model file exists before running predictions.")
-        st.stop()
-    return joblib.load(MODEL_PATH)
-
-# Load model without caching decorator to avoid tokenize issues
+    """Fetch the trained ML model and its feature encoder from the process-wide registry"""
+    for path in (MODEL_PATH, ENCODER_PATH):
+        if not os.path.exists(path):
+            st.error(f"❌ **Model not found** at: `{path}`")
+            st.info("Please ensure the model file exists before running predictions.")
+            st.stop()
+    return model_registry.get(), encoder_registry.get()
+
+# The registry lives in an imported module, so it is shared by every session and
+# rerun in this process; it only reloads when the model file actually changes.
+# load_model checks the pickle against its metadata (random_forest or hist_gb)
+model_registry = get_registry(MODEL_PATH, loader=load_model)
+encoder_registry = get_registry(ENCODER_PATH, loader=FeatureEncoder.load)
+# Distilled single tree for the live preview; optional (python model/distill.py)
+surrogate_registry = get_registry(SURROGATE_PATH, loader=Surrogate.load)
+# Caps concurrent in-process predictions across sessions and pins BLAS/OpenMP threads
+governor = get_governor()
 try:
-    model = load_model_fn()
+    model, encoder = load_model_fn()
 except Exception as e:
     st.error(f"Error loading model: {str(e)}")
     st.stop()
@@ -920,18 +944,12 @@ except Exception as e:
 # ═══════════════════════════════════════════════════════════════════
 # HELPER FUNCTIONS
 # ═══════════════════════════════════════════════════════════════════
-def risk_level(days: float) -> str:
-    """Determine risk level based on predicted delay"""
-    if days <= 1.5:
-        return "Low"
-    elif days <= 4:
-        return "Moderate"
-    return "High"
-
-
 # Note: get_bmi_category function moved to recommendations.py
 # Import it at the top: from recommendations import get_bmi_category
 
+# Note: risk_level and interpretation moved to model/risk.py so batch
+# scoring uses the same thresholds as the dashboard
+
 
 def get_wellness_score(cycle_length, period_duration, sleep_hours, stress_level, 
                        exercise_frequency, water_intake, diet_quality, bmi, 
@@ -1012,16 +1030,7 @@ def risk_badge(risk: str) -> str:
     return badges.get(risk, "")
 
 
-def interpretation(days: float) -> str:
-    """Provide clinical interpretation of the prediction"""
-    if days <= 1.5:
-        return "Normal variation"
-    elif days <= 4:
-        return "Slight delay likely"
-    return "Irregularity risk"
-
-
-def build_gauge(delay_days: float, risk: str):
+def build_gauge(delay_days: float, risk: str, delay_lower: float = None, delay_upper: float = None):
     """Create professional gauge chart for cycle delay visualization"""
     color_map = {
         "Low": "#10B981",
@@ -1029,6 +1038,17 @@ def build_gauge(delay_days: float, risk: str):
         "High": "#EF4444"
     }
     
+    steps = [
+        {"range": [0, 1.5], "color": "rgba(16, 185, 129, 0.1)"},
+        {"range": [1.5, 4], "color": "rgba(245, 158, 11, 0.1)"},
+        {"range": [4, 10], "color": "rgba(239, 68, 68, 0.1)"},
+    ]
+    subtitle = f"Risk Level: {risk}"
+    if delay_lower is not None and delay_upper is not None:
+        # Shade the prediction interval on top of the risk bands
+        steps.append({"range": [delay_lower, delay_upper], "color": "rgba(226, 232, 240, 0.25)"})
+        subtitle += f" · Likely range {delay_lower:.1f}–{delay_upper:.1f} days"
+
     fig = go.Figure(go.Indicator(
         mode="gauge+number",
         value=delay_days,
@@ -1043,11 +1063,7 @@ def build_gauge(delay_days: float, risk: str):
                 "tickfont": {"size": 12, "color": "#94a3b8"}
             },
             "bar": {"color": color_map.get(risk, "#3b82f6"), "thickness": 0.8},
-            "steps": [
-                {"range": [0, 1.5], "color": "rgba(16, 185, 129, 0.1)"},
-                {"range": [1.5, 4], "color": "rgba(245, 158, 11, 0.1)"},
-                {"range": [4, 10], "color": "rgba(239, 68, 68, 0.1)"},
-            ],
+            "steps": steps,
             "threshold": {
                 "line": {"color": "#e2e8f0", "width": 3},
                 "thickness": 0.85,
@@ -1056,7 +1072,7 @@ def build_gauge(delay_days: float, risk: str):
             "bgcolor": "rgba(0,0,0,0)"
         },
         title={
-            "text": f"<b style='color:#FFFFFF'>Cycle Delay Prediction</b><br><span style='font-size:14px;color:#cbd5e1'>Risk Level: {risk}</span>",
+            "text": f"<b style='color:#FFFFFF'>Cycle Delay Prediction</b><br><span style='font-size:14px;color:#cbd5e1'>{subtitle}</span>",
             "font": {"size": 18}
         }
     ))
@@ -1563,8 +1579,9 @@ def build_cycle_regularity_chart(hist_df):
     return fig
 
 
-def build_health_metrics_comparison(cycle_length, period_duration, sleep_hours, flow_level, stress_level):
-    """NEW: Compare current metrics against ideal ranges"""
+def build_health_metrics_comparison(cycle_length, period_duration, sleep_hours, flow_level, stress_level,
+                                    reference=None):
+    """NEW: Compare current metrics against ideal ranges (and the dataset population, if EDA has run)"""
     
     # Define ideal ranges
     metrics = {
@@ -1608,6 +1625,20 @@ def build_health_metrics_comparison(cycle_length, period_duration, sleep_hours,
             marker=dict(color='#10b981'),
             showlegend=(i == 0)
         ))
+        
+        # Population median with its middle 50%, from the cached EDA summary
+        population = (reference or {}).get(metric_name.lower().replace(' ', '_'))
+        if population:
+            fig.add_trace(go.Bar(
+                name='Population (median, IQR)',
+                x=[metric_name],
+                y=[population['median']],
+                error_y=dict(type='data', symmetric=False,
+                             array=[population['p75'] - population['median']],
+                             arrayminus=[population['median'] - population['p25']]),
+                marker=dict(color='#a78bfa'),
+                showlegend=(i == 0)
+            ))
     
     fig.update_layout(
         title="<b style='color:#FFFFFF;'>Current vs Ideal Health Metrics</b>",
@@ -1965,26 +1996,52 @@ def build_pain_mood_correlation(cramp_severity, mood_state):
     return fig
 
 
-def encode_input(cycle_length, period_duration, sleep_hours, flow_level, stress_level):
+def encode_input(features: dict):
     """Encode user inputs into model-compatible format"""
-    df = pd.DataFrame({
-        "cycle_length": [cycle_length],
-        "period_duration": [period_duration],
-        "sleep_hours": [sleep_hours],
-        "flow_level_light": [1 if flow_level == "light" else 0],
-        "flow_level_medium": [1 if flow_level == "medium" else 0],
-        "stress_level_low": [1 if stress_level == "low" else 0],
-        "stress_level_medium": [1 if stress_level == "medium" else 0],
-    })
-
-    if hasattr(model, "feature_names_in_"):
-        expected = list(model.feature_names_in_)
-        for col in expected:
-            if col not in df.columns:
-                df[col] = 0
-        df = df[expected]
-
-    return df
+    return encoder.encode(features)
+
+
+def predict_delay(features: dict):
+    """Return (prediction, lower, upper) from the precomputed grid, falling back to the live model"""
+    encoder_snapshot = encoder_registry.current()
+    grid = model_registry.derived(
+        f"prediction_grid:{encoder_snapshot.sha256}",
+        lambda snapshot: load_or_build_grid(snapshot, encoder_snapshot),
+    )
+    pred = grid.lookup(features)
+    if pred is None:
+        # Off-grid: the backend's fast evaluator (flattened forest or flattened boosting)
+        predictor = model_registry.derived(
+            "predictor", lambda snapshot: predictor_for(snapshot.model, read_metadata(snapshot.path)["backend"])
+        )
+        pred, lower, upper = predictor.predict_interval(encode_input(features))
+        pred = float(pred[0]), float(lower[0]), float(upper[0])
+    return pred
+
+
+def preview_delay(features: dict):
+    """Instant estimate from the distilled surrogate, or None without one for the served model"""
+    if not os.path.exists(SURROGATE_PATH):
+        return None
+    surrogate = surrogate_registry.get()
+    # A surrogate distilled from another model version would disagree with "Run Prediction"
+    if not surrogate.matches(model_registry.current().sha256, encoder_registry.current().sha256):
+        return None
+    return max(0.0, surrogate.predict_row(encode_input(features)[0]))
+
+
+def governed_predict_delay(features: dict):
+    """predict_delay behind the process-wide governor, queued fairly per session"""
+    return governor.run(st.session_state.session_id, predict_delay, features)
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def recent_assessments(limit: int = 50) -> pd.DataFrame:
+    """Latest SQLite assessments for the outcome form; cached so sidebar reruns skip the query"""
+    if not os.path.exists(SQLITE_PATH):
+        # load_history would fall back to the CSV, whose rows have no id to update
+        return pd.DataFrame()
+    return load_history(limit=limit)
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -2039,6 +2096,9 @@ def login_screen():
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
 
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 if not st.session_state.logged_in:
     login_screen()
     st.stop()
@@ -2167,7 +2227,7 @@ with st.sidebar:
     
     contraceptive_use = st.selectbox(
         "Contraceptive Use",
-        options=["none", "oral contraceptive", "IUD", "implant", "other"],
+        options=["none", "oral contraceptive", "IUD", "implant"],
         index=0,
         help="Current contraceptive method"
     )
@@ -2180,7 +2240,7 @@ with st.sidebar:
     
     mood_state = st.selectbox(
         "Current Mood",
-        options=["excellent", "good", "neutral", "low", "anxious", "depressed"],
+        options=["excellent", "good", "neutral", "anxious", "depressed"],
         index=1,
         help="Overall emotional state"
     )
@@ -2215,7 +2275,70 @@ with st.sidebar:
         options=["SQLite (recommended)", "CSV"],
         help="Choose how to store patient history"
     )
-    
+
+    # Outcomes are entered here rather than under the results, which are only
+    # rendered on the run right after "Run Prediction"
+    outcome_history = recent_assessments() if save_mode.startswith("SQLite") else pd.DataFrame()
+    if not outcome_history.empty:
+        with st.expander("📝 Record observed delay"):
+            st.caption("Observed outcomes are used by `model/retrain.py` to update the model.")
+            outcome_labels = {
+                row.id: f"#{row.id} · {row.patient_name} · {str(row.timestamp)[:16]}"
+                for row in outcome_history.itertuples()
+            }
+            outcome_id = st.selectbox("Record", options=list(outcome_labels), format_func=outcome_labels.get)
+            actual_delay = st.number_input("Observed delay (days)", min_value=0.0, max_value=180.0,
+                                           value=0.0, step=0.5)
+            if st.button("✅ Save Outcome", use_container_width=True, disabled=outcome_id is None):
+                try:
+                    record_outcome(outcome_id, actual_delay)
+                    st.success("✅ Outcome saved")
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+                recent_assessments.clear()
+
+    model_stats = model_registry.stats()
+    st.caption(
+        f"🤖 Model `{model_stats['sha256'][:8]}` ({read_metadata(MODEL_PATH)['backend']}) · loaded in {model_stats['load_seconds'] * 1000:.0f} ms"
+        f" · {model_stats['memory_bytes'] / 1e6:.1f} MB in memory"
+    )
+    prediction_source = st.session_state.get("prediction_source")
+    if prediction_source:
+        st.caption(f"⚡ Last prediction served {'by the prediction server' if prediction_source == 'server' else 'in-process'}")
+    governor_stats = governor.stats()
+    if governor_stats["completed"]:
+        st.caption(
+            f"🚦 Inference queue: {governor_stats['queue_depth']} waiting · "
+            f"p99 wait {governor_stats['wait_ms']['p99']:.1f} ms · {governor_stats['max_concurrent']} concurrent max"
+        )
+
+    features = {
+        "age": age,
+        "cycle_length": cycle_length,
+        "period_duration": period_duration,
+        "sleep_hours": sleep_hours,
+        "water_intake": water_intake,
+        "weight": weight,
+        "height": height,
+        "bmi": bmi,
+        "has_pcos": int(has_pcos),
+        "has_endometriosis": int(has_endometriosis),
+        "has_thyroid": int(has_thyroid),
+        "cramp_severity": cramp_severity,
+        "flow_level": flow_level,
+        "stress_level": stress_level,
+        # Sidebar labels carry a hint, e.g. "light (1-2 days/week)"; the model knows "light"
+        "exercise_frequency": exercise_frequency.split(" (")[0],
+        "diet_quality": diet_quality,
+        "contraceptive_use": contraceptive_use,
+        "mood_state": mood_state,
+    }
+    # Reruns on every slider move, so only the distilled surrogate is evaluated here
+    preview = preview_delay(features)
+    if preview is not None:
+        st.markdown(f"⚡ **Live preview:** ~{preview:.1f} days delay")
+        st.caption("Instant estimate from a distilled model · Run Prediction uses the full model")
+
     st.markdown("<br>", unsafe_allow_html=True)
     
     col_predict, col_logout = st.columns([3, 1])
@@ -2233,9 +2356,13 @@ with st.sidebar:
 
 if run:
     with st.spinner("🔄 Running AI prediction model..."):
-        input_df = encode_input(cycle_length, period_duration, sleep_hours, flow_level, stress_level)
-        pred = model.predict(input_df)
-        pred_days = max(0.0, float(pred[0]))
+        # Served by the shared prediction server when it runs; in-process otherwise
+        (pred, pred_lower, pred_upper), st.session_state.prediction_source = get_client(
+            fallback=governed_predict_delay
+        ).predict(features)
+        pred_days = max(0.0, pred)
+        # Interval across the forest's trees (10th-90th percentile)
+        delay_lower, delay_upper = max(0.0, pred_lower), max(0.0, pred_upper)
         
         risk = risk_level(pred_days)
         interp = interpretation(pred_days)
@@ -2272,7 +2399,7 @@ if run:
         st.markdown(
             f"<div class='kpi-container'>"
             f"<div class='kpi-value'>{pred_days:.1f}</div>"
-            f"<div class='kpi-label'>Predicted Delay (days)</div>"
+            f"<div class='kpi-label'>Predicted Delay (days)<br>range {delay_lower:.1f}–{delay_upper:.1f}</div>"
             f"</div>",
             unsafe_allow_html=True
         )
@@ -2321,7 +2448,7 @@ if run:
     
     with row1_col1:
         st.markdown("<div class='analytics-card'>", unsafe_allow_html=True)
-        st.plotly_chart(build_gauge(pred_days, risk), use_container_width=True)
+        st.plotly_chart(build_gauge(pred_days, risk, delay_lower, delay_upper), use_container_width=True)
         st.markdown("</div>", unsafe_allow_html=True)
     
     with row1_col2:
@@ -2379,7 +2506,8 @@ if run:
         with symptom_col2:
             st.markdown("<div class='analytics-card'>", unsafe_allow_html=True)
             st.plotly_chart(build_health_metrics_comparison(cycle_length, period_duration, 
-                                                            sleep_hours, flow_level, stress_level), 
+                                                            sleep_hours, flow_level, stress_level,
+                                                            reference_ranges()), 
                            use_container_width=True)
             st.markdown("</div>", unsafe_allow_html=True)
     else:
@@ -2388,7 +2516,8 @@ if run:
         with single_col:
             st.markdown("<div class='analytics-card'>", unsafe_allow_html=True)
             st.plotly_chart(build_health_metrics_comparison(cycle_length, period_duration, 
-                                                            sleep_hours, flow_level, stress_level), 
+                                                            sleep_hours, flow_level, stress_level,
+                                                            reference_ranges()), 
                            use_container_width=True)
             st.markdown("</div>", unsafe_allow_html=True)
     
@@ -2490,14 +2619,14 @@ if run:
                 "Patient Name", "Patient ID", "Age",
                 "Cycle Length (days)", "Period Duration (days)", "Sleep Hours",
                 "Flow Level", "Stress Level",
-                "Predicted Delay (days)", "Risk Level", "Health Score", "Clinical Interpretation",
+                "Predicted Delay (days)", "Likely Range (days)", "Risk Level", "Health Score", "Clinical Interpretation",
                 "Clinical Notes"
             ],
             "Value": [
                 patient_name, patient_id, age,
                 cycle_length, period_duration, sleep_hours,
                 flow_level.capitalize(), stress_level.capitalize(),
-                f"{pred_days:.1f}", risk, f"{health_score:.0f}%", interp,
+                f"{pred_days:.1f}", f"{delay_lower:.1f} – {delay_upper:.1f}", risk, f"{health_score:.0f}%", interp,
                 notes.strip() if notes.strip() else "No additional notes"
             ]
         })
@@ -2556,9 +2685,24 @@ if run:
             "flow_level": flow_level,
             "stress_level": stress_level,
             "predicted_delay": float(pred_days),
+            "delay_lower": float(delay_lower),
+            "delay_upper": float(delay_upper),
             "risk_level": risk,
             "interpretation": interp,
-            "notes": notes.strip()
+            "notes": notes.strip(),
+            # Full model inputs, so records with an observed outcome can retrain the model
+            "water_intake": float(water_intake),
+            "weight": float(weight),
+            "height": float(height),
+            "bmi": float(bmi),
+            "cramp_severity": int(cramp_severity),
+            "has_pcos": int(has_pcos),
+            "has_endometriosis": int(has_endometriosis),
+            "has_thyroid": int(has_thyroid),
+            "exercise_frequency": features["exercise_frequency"],
+            "diet_quality": diet_quality,
+            "contraceptive_use": contraceptive_use,
+            "mood_state": mood_state,
         }
         
         col_save1, col_save2 = st.columns(2)
@@ -2568,6 +2712,7 @@ if run:
                 with st.spinner("💾 Saving patient record..."):
                     if save_mode.startswith("SQLite"):
                         save_to_sqlite(record)
+                        recent_assessments.clear()
                         st.success("✅ Record saved to SQLite database")
                     else:
                         save_to_csv(record)
@@ -2601,6 +2746,8 @@ if run:
                     },
                     prediction={
                         "predicted_delay": pred_days,
+                        "delay_lower": delay_lower,
+                        "delay_upper": delay_upper,
                         "risk_level": risk,
                         "interpretation": interp,
                         "wellness_score": wellness_score,
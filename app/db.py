@@ -1,6 +1,26 @@
+"""
+Patient-history storage: SQLite (default) or CSV, plus report file names.
+
+Each Streamlit session runs in its own thread, and a script rerun gets a
+fresh thread, so the database is reached through one process-wide pool of
+persistent connections per file rather than a connect/close per call. Every
+connection runs in WAL mode, so readers never block the writer or each
+other. synchronous=NORMAL syncs at checkpoints only: a power cut can lose
+the last few commits but cannot corrupt the file. busy_timeout makes
+concurrent writers wait for each other instead of failing. The schema is
+checked once per pool.
+
+Benchmark inserts and reads per second against the old per-call connections:
+    python app/db.py --sessions 1,8,32
+"""
+
 import os
 import re
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
 import pandas as pd
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -11,6 +31,11 @@ REPORTS_DIR = os.path.join(DB_DATA_DIR, "reports")
 CSV_PATH = os.path.join(DB_DATA_DIR, "patient_history.csv")
 SQLITE_PATH = os.path.join(DB_DATA_DIR, "patient_history.db")
 
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KIB = 16 * 1024
+# Idle connections kept per database; busier moments open extra ones that are closed after use
+POOL_SIZE = 8
+
 
 def ensure_dirs():
     os.makedirs(DB_DATA_DIR, exist_ok=True)
@@ -24,13 +49,79 @@ def sanitize_filename(text: str) -> str:
     return text or "patient"
 
 
-def init_sqlite():
+class ConnectionPool:
+    """Persistent connections to one SQLite file, each used by one thread at a time"""
+
+    def __init__(self, sqlite_path: str, size: int = POOL_SIZE):
+        self.sqlite_path = sqlite_path
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.sqlite_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        con.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        con.execute("PRAGMA journal_mode = WAL")
+        con.execute("PRAGMA synchronous = NORMAL")
+        con.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+        return con
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; the block's changes are committed, or rolled back on error"""
+        with self._lock:
+            con = self._idle.pop() if self._idle else None
+        if con is None:
+            con = self._connect()
+        try:
+            yield con
+            con.commit()
+        except BaseException:
+            con.rollback()
+            raise
+        finally:
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append(con)
+                    con = None
+            if con is not None:
+                con.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for con in idle:
+            con.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(sqlite_path: str = SQLITE_PATH) -> ConnectionPool:
+    """The process-wide pool for sqlite_path, created (and the schema checked) on first use"""
+    key = os.path.abspath(sqlite_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            ensure_dirs()
+            pool = ConnectionPool(sqlite_path)
+            with pool.connection() as con:
+                _create_schema(con)
+            _pools[key] = pool
+    return pool
+
+
+def init_sqlite(sqlite_path: str = SQLITE_PATH):
     """
     Creates table if not exists.
     Also auto-migrates missing columns (so old DB won't crash).
     """
-    ensure_dirs()
-    con = sqlite3.connect(SQLITE_PATH)
+    with get_pool(sqlite_path).connection() as con:
+        _create_schema(con)
+
+
+def _create_schema(con: sqlite3.Connection):
     cur = con.cursor()
 
     # base schema
@@ -48,9 +139,25 @@ def init_sqlite():
             flow_level TEXT,
             stress_level TEXT,
             predicted_delay REAL,
+            delay_lower REAL,
+            delay_upper REAL,
             risk_level TEXT,
             interpretation TEXT,
-            notes TEXT
+            notes TEXT,
+            water_intake REAL,
+            weight REAL,
+            height REAL,
+            bmi REAL,
+            cramp_severity INTEGER,
+            has_pcos INTEGER,
+            has_endometriosis INTEGER,
+            has_thyroid INTEGER,
+            exercise_frequency TEXT,
+            diet_quality TEXT,
+            contraceptive_use TEXT,
+            mood_state TEXT,
+            actual_delay REAL,
+            outcome_seq INTEGER
         )
         """
     )
@@ -70,53 +177,74 @@ def init_sqlite():
         "flow_level": "TEXT",
         "stress_level": "TEXT",
         "predicted_delay": "REAL",
+        "delay_lower": "REAL",
+        "delay_upper": "REAL",
         "risk_level": "TEXT",
         "interpretation": "TEXT",
         "notes": "TEXT",
+        # Remaining model inputs, so saved assessments can be used for retraining
+        "water_intake": "REAL",
+        "weight": "REAL",
+        "height": "REAL",
+        "bmi": "REAL",
+        "cramp_severity": "INTEGER",
+        "has_pcos": "INTEGER",
+        "has_endometriosis": "INTEGER",
+        "has_thyroid": "INTEGER",
+        "exercise_frequency": "TEXT",
+        "diet_quality": "TEXT",
+        "contraceptive_use": "TEXT",
+        "mood_state": "TEXT",
+        # Observed delay, reported after the cycle; outcome_seq orders outcomes for
+        # incremental retraining (model/retrain.py keeps a watermark on it)
+        "actual_delay": "REAL",
+        "outcome_seq": "INTEGER",
     }
 
     for col, col_type in required_cols.items():
         if col not in existing_cols:
             cur.execute(f"ALTER TABLE patient_history ADD COLUMN {col} {col_type}")
 
-    con.commit()
-    con.close()
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_patient_history_outcome_seq ON patient_history (outcome_seq)")
 
 
-def save_to_sqlite(record: dict):
-    init_sqlite()
-    con = sqlite3.connect(SQLITE_PATH)
-    cur = con.cursor()
+RECORD_COLUMNS = [
+    "timestamp", "patient_id", "patient_name", "age",
+    "cycle_length", "period_duration", "sleep_hours",
+    "flow_level", "stress_level",
+    "predicted_delay", "delay_lower", "delay_upper",
+    "risk_level", "interpretation", "notes",
+    "water_intake", "weight", "height", "bmi", "cramp_severity",
+    "has_pcos", "has_endometriosis", "has_thyroid",
+    "exercise_frequency", "diet_quality", "contraceptive_use", "mood_state",
+]
 
-    cur.execute(
-        """
-        INSERT INTO patient_history (
-            timestamp, patient_id, patient_name, age,
-            cycle_length, period_duration, sleep_hours,
-            flow_level, stress_level,
-            predicted_delay, risk_level, interpretation, notes
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            record.get("timestamp"),
-            record.get("patient_id"),
-            record.get("patient_name"),
-            record.get("age"),
-            record.get("cycle_length"),
-            record.get("period_duration"),
-            record.get("sleep_hours"),
-            record.get("flow_level"),
-            record.get("stress_level"),
-            record.get("predicted_delay"),
-            record.get("risk_level"),
-            record.get("interpretation"),
-            record.get("notes"),
-        ),
-    )
 
-    con.commit()
-    con.close()
+INSERT_SQL = f"""
+    INSERT INTO patient_history ({", ".join(RECORD_COLUMNS)})
+    VALUES ({", ".join("?" for _ in RECORD_COLUMNS)})
+"""
+
+
+def save_to_sqlite(record: dict, sqlite_path: str = SQLITE_PATH):
+    with get_pool(sqlite_path).connection() as con:
+        con.execute(INSERT_SQL, tuple(record.get(col) for col in RECORD_COLUMNS))
+
+
+def record_outcome(record_id: int, actual_delay: float, sqlite_path: str = SQLITE_PATH):
+    """Store the observed delay for a saved assessment and queue it for retraining"""
+    with get_pool(sqlite_path).connection() as con:
+        cursor = con.execute(
+            """
+            UPDATE patient_history
+            SET actual_delay = ?,
+                outcome_seq = (SELECT COALESCE(MAX(outcome_seq), 0) + 1 FROM patient_history)
+            WHERE id = ?
+            """,
+            (float(actual_delay), int(record_id)),
+        )
+        if cursor.rowcount == 0:
+            raise ValueError(f"No saved assessment with id {record_id}")
 
 
 def save_to_csv(record: dict):
@@ -130,16 +258,14 @@ def save_to_csv(record: dict):
     df.to_csv(CSV_PATH, index=False)
 
 
-def load_history(limit=200) -> pd.DataFrame:
+def load_history(limit=200, sqlite_path: str = SQLITE_PATH) -> pd.DataFrame:
     ensure_dirs()
 
-    if os.path.exists(SQLITE_PATH):
-        con = sqlite3.connect(SQLITE_PATH)
-        df = pd.read_sql_query(
-            f"SELECT * FROM patient_history ORDER BY id DESC LIMIT {int(limit)}", con
-        )
-        con.close()
-        return df
+    if os.path.exists(sqlite_path):
+        with get_pool(sqlite_path).connection() as con:
+            return pd.read_sql_query(
+                f"SELECT * FROM patient_history ORDER BY id DESC LIMIT {int(limit)}", con
+            )
 
     if os.path.exists(CSV_PATH):
         df = pd.read_csv(CSV_PATH)
@@ -175,3 +301,146 @@ def make_report_path(patient_name: str, patient_id: str) -> str:
         if not os.path.exists(candidate3):
             return candidate3
         i += 1
+
+
+def _per_call_save(record: dict, sqlite_path: str):
+    """save_to_sqlite before the pool: a schema check and a new connection per call (benchmark baseline)"""
+    con = sqlite3.connect(sqlite_path)
+    _create_schema(con)
+    con.commit()
+    con.close()
+    con = sqlite3.connect(sqlite_path)
+    con.execute(INSERT_SQL, tuple(record.get(col) for col in RECORD_COLUMNS))
+    con.commit()
+    con.close()
+
+
+def _per_call_load(limit: int, sqlite_path: str) -> pd.DataFrame:
+    """load_history before the pool (benchmark baseline)"""
+    con = sqlite3.connect(sqlite_path)
+    df = pd.read_sql_query(f"SELECT * FROM patient_history ORDER BY id DESC LIMIT {int(limit)}", con)
+    con.close()
+    return df
+
+
+BENCH_RECORD = {
+    "timestamp": "2025-01-01 09:00:00", "patient_id": "P-BENCH", "patient_name": "Benchmark", "age": 29,
+    "cycle_length": 30, "period_duration": 5, "sleep_hours": 7.0, "flow_level": "medium",
+    "stress_level": "medium", "predicted_delay": 3.2, "delay_lower": 0.5, "delay_upper": 7.8,
+    "risk_level": "Low", "interpretation": "Benchmark row", "notes": "", "water_intake": 8, "weight": 60.0,
+    "height": 165.0, "bmi": 22.0, "cramp_severity": 4, "has_pcos": 0, "has_endometriosis": 0, "has_thyroid": 0,
+    "exercise_frequency": "moderate", "diet_quality": "good", "contraceptive_use": "none", "mood_state": "good",
+}
+
+
+def _run_sessions(n_sessions: int, seconds: float, op) -> dict:
+    """n_sessions threads calling op(i) (i counts that session's calls) until the deadline"""
+    counts = {"insert": 0, "read": 0, "errors": 0}
+    lock = threading.Lock()
+    barrier = threading.Barrier(n_sessions + 1)
+
+    def session():
+        local = {"insert": 0, "read": 0, "errors": 0}
+        barrier.wait()
+        deadline = time.perf_counter() + seconds
+        i = 0
+        while time.perf_counter() < deadline:
+            try:
+                local[op(i)] += 1
+            except sqlite3.OperationalError:
+                local["errors"] += 1
+            i += 1
+        with lock:
+            for key, value in local.items():
+                counts[key] += value
+
+    threads = [threading.Thread(target=session) for _ in range(n_sessions)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {"inserts_per_s": counts["insert"] / elapsed, "reads_per_s": counts["read"] / elapsed,
+            "errors": counts["errors"]}
+
+
+def benchmark(session_counts=(1, 8, 32), seconds: float = 2.0, limit: int = 50, seed_rows: int = 10_000,
+              reads_per_insert: int = 10) -> list:
+    """Inserts/s and reads/s (load_history(limit)) per session count, old per-call connections vs the pool
+
+    Each mode gets a fresh database with seed_rows rows: rollback journal for the
+    per-call baseline, WAL for the pool. Workloads: every session inserting, every
+    session reading, and a mix of one insert per reads_per_insert reads.
+    """
+    import shutil
+    import tempfile
+
+    workdir = tempfile.mkdtemp(prefix="db_bench_")
+    results = []
+    try:
+        modes = {
+            "per-call": (lambda path: _per_call_save(BENCH_RECORD, path),
+                         lambda path: _per_call_load(limit, path)),
+            "pooled": (lambda path: save_to_sqlite(BENCH_RECORD, path),
+                       lambda path: load_history(limit, path)),
+        }
+        for mode, (insert, read) in modes.items():
+            path = os.path.join(workdir, f"{mode}.db")
+            con = sqlite3.connect(path)
+            _create_schema(con)
+            con.executemany(INSERT_SQL, [tuple(BENCH_RECORD.get(col) for col in RECORD_COLUMNS)] * seed_rows)
+            con.commit()
+            con.close()
+
+            def do_insert(i, insert=insert, path=path):
+                insert(path)
+                return "insert"
+
+            def do_read(i, read=read, path=path):
+                read(path)
+                return "read"
+
+            def do_mixed(i):
+                return do_insert(i) if i % (reads_per_insert + 1) == 0 else do_read(i)
+
+            for n_sessions in session_counts:
+                row = {"mode": mode, "sessions": n_sessions}
+                for workload, op in (("insert", do_insert), ("read", do_read), ("mixed", do_mixed)):
+                    row[workload] = _run_sessions(n_sessions, seconds, op)
+                results.append(row)
+
+            pool = _pools.pop(os.path.abspath(path), None)
+            if pool is not None:
+                pool.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark patient_history inserts and reads under concurrent sessions")
+    parser.add_argument("--sessions", default="1,8,32", help="Comma-separated concurrent session counts")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Duration of each workload")
+    parser.add_argument("--limit", type=int, default=50, help="Rows per load_history read (the app reads 50)")
+    parser.add_argument("--seed-rows", type=int, default=10_000, help="Rows in the database before the benchmark")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print(f"PATIENT HISTORY DB BENCHMARK ({args.seconds:.0f}s per workload, load_history(limit={args.limit}), "
+          f"{args.seed_rows:,} seed rows)")
+    print("=" * 80)
+    results = benchmark([int(s) for s in args.sessions.split(",")], args.seconds, args.limit, args.seed_rows)
+
+    print(f"\n{'Mode':<9} {'Sessions':>8} {'Inserts/s':>10} {'Reads/s':>9} {'Mixed ins/s':>12} "
+          f"{'Mixed reads/s':>14} {'Errors':>7}")
+    print("-" * 80)
+    for row in results:
+        errors = sum(row[workload]["errors"] for workload in ("insert", "read", "mixed"))
+        print(f"{row['mode']:<9} {row['sessions']:>8} {row['insert']['inserts_per_s']:>10,.0f} "
+              f"{row['read']['reads_per_s']:>9,.0f} {row['mixed']['inserts_per_s']:>12,.0f} "
+              f"{row['mixed']['reads_per_s']:>14,.0f} {errors:>7}")
+    print("=" * 80)
@@ -0,0 +1,234 @@
+"""
+Process-wide inference governor.
+
+Every Streamlit session runs in its own thread of one server process. Left
+alone, concurrent predictions each start their own OpenMP/BLAS thread pools
+and the cores end up oversubscribed, which shows up as tail latency. The
+governor pins those libraries to a single thread each and admits at most
+max_concurrent model invocations at a time (one per core by default).
+
+Requests beyond the cap wait in per-session queues that are served
+round-robin, so one session firing many predictions cannot starve the
+others. Queue depth and wait times are exposed through stats().
+
+Load test with:
+    python app/inference_governor.py --sessions 1,5,10,25,50
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+DEFAULT_MAX_CONCURRENT = int(os.environ.get(
+    "INFERENCE_MAX_CONCURRENCY", len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+))
+
+
+def pin_threads(n_threads: int = 1) -> dict:
+    """Limit OpenMP/BLAS to n_threads per call; returns the limits that were applied"""
+    for var in THREAD_ENV_VARS:
+        # Only affects pools that have not started yet (and child processes)
+        os.environ.setdefault(var, str(n_threads))
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return {var: os.environ[var] for var in THREAD_ENV_VARS}
+
+    # Already-loaded libraries (numpy's BLAS, sklearn's OpenMP) are limited in place
+    threadpool_limits(limits=n_threads)
+    return {"threadpoolctl": n_threads, **{var: os.environ[var] for var in THREAD_ENV_VARS}}
+
+
+class InferenceGovernor:
+    """Caps concurrent model invocations and queues the rest fairly per session"""
+
+    def __init__(self, max_concurrent: int = DEFAULT_MAX_CONCURRENT, window: int = 10_000):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self._lock = threading.Lock()
+        self._active = 0
+        # session_id -> queued tickets; sessions rotate to the back after each grant
+        self._waiting = OrderedDict()
+        self._waits = deque(maxlen=window)
+        self.completed = 0
+        self.peak_queue_depth = 0
+
+    @property
+    def queue_depth(self) -> int:
+        with self._lock:
+            return sum(len(tickets) for tickets in self._waiting.values())
+
+    @contextmanager
+    def slot(self, session_id):
+        """Hold one inference slot for the duration of the block; yields the seconds waited"""
+        enqueued = time.perf_counter()
+        ticket = None
+        with self._lock:
+            if self._active < self.max_concurrent and not self._waiting:
+                self._active += 1
+            else:
+                ticket = threading.Event()
+                self._waiting.setdefault(session_id, deque()).append(ticket)
+                depth = sum(len(tickets) for tickets in self._waiting.values())
+                self.peak_queue_depth = max(self.peak_queue_depth, depth)
+        if ticket is not None:
+            ticket.wait()
+
+        waited = time.perf_counter() - enqueued
+        try:
+            yield waited
+        finally:
+            self._release(waited)
+
+    def _release(self, waited: float):
+        with self._lock:
+            self._waits.append(waited)
+            self.completed += 1
+            if not self._waiting:
+                self._active -= 1
+                return
+            # Round-robin: grant the longest-waiting session, then move it to the back
+            session_id, tickets = self._waiting.popitem(last=False)
+            ticket = tickets.popleft()
+            if tickets:
+                self._waiting[session_id] = tickets
+            # The slot passes straight to the next request, so _active is unchanged
+            ticket.set()
+
+    def run(self, session_id, fn, *args, **kwargs):
+        """Call fn inside a slot"""
+        with self.slot(session_id):
+            return fn(*args, **kwargs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = np.array(self._waits) * 1000
+            depth = sum(len(tickets) for tickets in self._waiting.values())
+            return {
+                "max_concurrent": self.max_concurrent,
+                "active": self._active,
+                "queue_depth": depth,
+                "waiting_sessions": len(self._waiting),
+                "peak_queue_depth": self.peak_queue_depth,
+                "completed": self.completed,
+                "wait_ms": {
+                    "p50": float(np.percentile(waits, 50)) if len(waits) else None,
+                    "p99": float(np.percentile(waits, 99)) if len(waits) else None,
+                },
+            }
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_governor(max_concurrent: int = DEFAULT_MAX_CONCURRENT) -> InferenceGovernor:
+    """Return the process-wide governor, pinning library thread pools on first use"""
+    global _governor
+    if _governor is None:
+        with _governor_lock:
+            if _governor is None:
+                pin_threads(1)
+                _governor = InferenceGovernor(max_concurrent)
+    return _governor
+
+
+def load_test(predict, session_counts=(1, 5, 10, 25, 50), requests_per_session: int = 40,
+              think_ms: float = 200.0, governor_factory=None, seed: int = 42) -> list:
+    """Closed-loop load test: each session predicts, pauses think_ms, repeats
+
+    Returns p50/p99 end-to-end latency (queue wait + model call) per session count.
+    """
+    governor_factory = governor_factory or InferenceGovernor
+    results = []
+    for n_sessions in session_counts:
+        governor = governor_factory()
+        latencies = [[] for _ in range(n_sessions)]
+        start_barrier = threading.Barrier(n_sessions)
+
+        def session(idx):
+            rng = np.random.default_rng(seed + idx)
+            start_barrier.wait()
+            # Stagger session starts like real users rather than firing in lockstep
+            time.sleep(rng.uniform(0, think_ms / 1000))
+            for _ in range(requests_per_session):
+                start = time.perf_counter()
+                governor.run(idx, predict, rng)
+                latencies[idx].append(time.perf_counter() - start)
+                time.sleep(rng.uniform(0.5, 1.5) * think_ms / 1000)
+
+        threads = [threading.Thread(target=session, args=(i,)) for i in range(n_sessions)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        all_ms = np.concatenate([np.array(l) for l in latencies]) * 1000
+        stats = governor.stats()
+        results.append({
+            "sessions": n_sessions,
+            "requests": len(all_ms),
+            "p50_ms": float(np.percentile(all_ms, 50)),
+            "p99_ms": float(np.percentile(all_ms, 99)),
+            "wait_p99_ms": stats["wait_ms"]["p99"],
+            "peak_queue_depth": stats["peak_queue_depth"],
+        })
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.append(os.path.join(BASE_DIR, "model"))
+    from feature_encoder import FeatureEncoder
+    from model_backends import load_predictor
+
+    parser = argparse.ArgumentParser(description="Load test the inference governor")
+    parser.add_argument("--sessions", default="1,5,10,25,50", help="Comma-separated concurrent session counts")
+    parser.add_argument("--requests", type=int, default=40, help="Predictions per session")
+    parser.add_argument("--think-ms", type=float, default=200.0, help="Mean pause between a session's predictions")
+    parser.add_argument("--max-concurrent", type=int, default=DEFAULT_MAX_CONCURRENT)
+    args = parser.parse_args()
+
+    pinned = pin_threads(1)
+    encoder = FeatureEncoder.load(os.path.join(BASE_DIR, "model", "feature_encoder.joblib"))
+    predictor = load_predictor(os.path.join(BASE_DIR, "model", "delay_predictor_model.pkl"))
+
+    def predict(rng):
+        # The app's off-grid path: encode one row, evaluate the model with intervals
+        X = encoder.encode_row(cycle_length=int(rng.integers(20, 61)), sleep_hours=float(rng.uniform(0, 12)),
+                               stress_level=str(rng.choice(["low", "medium", "high"])))
+        return predictor.predict_interval(X)
+
+    print("=" * 80)
+    print(f"INFERENCE GOVERNOR LOAD TEST (max {args.max_concurrent} concurrent, "
+          f"{args.requests} requests/session, ~{args.think_ms:.0f} ms think time)")
+    print("=" * 80)
+    print(f"   Thread limits: {pinned}")
+    session_counts = [int(s) for s in args.sessions.split(",")]
+    governed = load_test(predict, session_counts, args.requests, args.think_ms,
+                         lambda: InferenceGovernor(args.max_concurrent))
+    # Baseline: a cap no load test reaches, i.e. every session calls the model directly
+    ungoverned = load_test(predict, session_counts, args.requests, args.think_ms,
+                           lambda: InferenceGovernor(max(session_counts) + 1))
+
+    print(f"\n{'Sessions':>9} {'Requests':>9} {'p50 (ms)':>10} {'p99 (ms)':>10} {'Wait p99 (ms)':>14} "
+          f"{'Peak queue':>11} {'Ungoverned p99':>15}")
+    print("-" * 80)
+    for row, base in zip(governed, ungoverned):
+        print(f"{row['sessions']:>9} {row['requests']:>9,} {row['p50_ms']:>10.3f} {row['p99_ms']:>10.3f} "
+              f"{row['wait_p99_ms']:>14.3f} {row['peak_queue_depth']:>11} {base['p99_ms']:>15.3f}")
+    print("=" * 80)
@@ -0,0 +1,161 @@
+"""
+Process-wide model registry.
+
+Streamlit re-executes app.py on every widget interaction and for every
+session, so loading the model at script level unpickles it again each time.
+Imported modules are only executed once per process, which makes this the
+right place to keep a single shared copy of the model.
+
+The registry stats the model file on every access (cheap) and only re-hashes
+it when its mtime or size changed. A new model is loaded off to the side and
+then swapped in with a single reference assignment, so readers always see
+either the old model or the new one, never a half-loaded state.
+"""
+
+import os
+import sys
+import threading
+import time
+
+import joblib
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "model"))
+
+from pipeline import file_sha256
+
+
+def estimate_model_nbytes(model) -> int:
+    """Approximate in-memory size of a fitted tree ensemble (node + value arrays)"""
+    estimators = getattr(model, "estimators_", None)
+    if estimators is None:
+        estimators = [model]
+
+    total = 0
+    for est in estimators:
+        tree = getattr(est, "tree_", None)
+        if tree is None:
+            continue
+        state = tree.__getstate__()
+        total += state["nodes"].nbytes + state["values"].nbytes
+    return total
+
+
+class LoadedModel:
+    """One loaded model version and the file state it was loaded from"""
+
+    def __init__(self, model, path, sha256, mtime, size, load_seconds, memory_bytes):
+        self.model = model
+        self.path = path
+        self.sha256 = sha256
+        self.mtime = mtime
+        self.size = size
+        self.load_seconds = load_seconds
+        self.memory_bytes = memory_bytes
+        self.loaded_at = time.time()
+        self._derived = {}
+        self._derived_lock = threading.Lock()
+
+    def derived(self, name: str, build):
+        """
+        Return an artifact computed from this model version, building it once.
+        Derived artifacts belong to the snapshot, so a hot swap drops them too.
+        """
+        value = self._derived.get(name)
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(name)
+                if value is None:
+                    value = build(self)
+                    self._derived[name] = value
+        return value
+
+
+class ModelRegistry:
+    """Loads a model once per process and hot-swaps it when the file changes"""
+
+    def __init__(self, path: str, loader=joblib.load):
+        self.path = path
+        self.loader = loader
+        self.reloads = 0
+        self._current = None
+        self._lock = threading.Lock()
+
+    def _load(self, stat, sha256) -> LoadedModel:
+        start = time.perf_counter()
+        model = self.loader(self.path)
+        load_seconds = time.perf_counter() - start
+
+        memory_bytes = estimate_model_nbytes(model) or stat.st_size
+        return LoadedModel(
+            model, self.path, sha256, stat.st_mtime, stat.st_size, load_seconds, memory_bytes
+        )
+
+    def current(self) -> LoadedModel:
+        """Return the current snapshot, reloading first if the file changed on disk"""
+        snapshot = self._current
+        stat = os.stat(self.path)
+        if snapshot is not None and (stat.st_mtime, stat.st_size) == (snapshot.mtime, snapshot.size):
+            return snapshot
+
+        with self._lock:
+            # Another thread may have finished the reload while we waited
+            snapshot = self._current
+            stat = os.stat(self.path)
+            if snapshot is not None and (stat.st_mtime, stat.st_size) == (snapshot.mtime, snapshot.size):
+                return snapshot
+
+            sha256 = file_sha256(self.path)
+            if snapshot is not None and sha256 == snapshot.sha256:
+                # Touched but identical content: keep the loaded model
+                snapshot.mtime, snapshot.size = stat.st_mtime, stat.st_size
+                return snapshot
+
+            try:
+                new_snapshot = self._load(stat, sha256)
+            except Exception:
+                # A half-written file must not take the app down: keep serving
+                # the previous version and retry on the next access
+                if snapshot is None:
+                    raise
+                return snapshot
+            if snapshot is not None:
+                self.reloads += 1
+            self._current = new_snapshot
+            return new_snapshot
+
+    def get(self):
+        """Return the current model object"""
+        return self.current().model
+
+    def derived(self, name: str, build):
+        """Return a cached artifact of the current model, see LoadedModel.derived"""
+        return self.current().derived(name, build)
+
+    def stats(self) -> dict:
+        """Load time and memory footprint of the currently served model"""
+        snapshot = self.current()
+        return {
+            "path": snapshot.path,
+            "sha256": snapshot.sha256,
+            "file_bytes": snapshot.size,
+            "memory_bytes": snapshot.memory_bytes,
+            "load_seconds": snapshot.load_seconds,
+            "loaded_at": snapshot.loaded_at,
+            "reloads": self.reloads,
+        }
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(path: str, loader=joblib.load) -> ModelRegistry:
+    """Return the process-wide registry for an artifact path"""
+    path = os.path.abspath(path)
+    registry = _registries.get(path)
+    if registry is None:
+        with _registries_lock:
+            registry = _registries.get(path)
+            if registry is None:
+                registry = _registries[path] = ModelRegistry(path, loader)
+    return registry
@@ -0,0 +1,86 @@
+"""
+Client for the local prediction server (model/prediction_server.py).
+
+When the server is not running the client transparently calls a stand-in
+predictor (the in-process model) instead, and only re-probes the server
+after a back-off period, so a missing server never slows the app down.
+"""
+
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+
+DEFAULT_SERVER_URL = os.environ.get("PREDICTION_SERVER_URL", "http://127.0.0.1:8765")
+
+
+class PredictionClient:
+    """Calls the prediction server, falling back to a local predictor when it is absent"""
+
+    def __init__(self, fallback, url: str = DEFAULT_SERVER_URL, timeout: float = 2.0, retry_after: float = 30.0):
+        self.fallback = fallback
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def server_available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def _post(self, payload: dict) -> dict:
+        request = urllib.request.Request(
+            f"{self.url}/predict",
+            data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def predict(self, features: dict) -> tuple:
+        """Predict ((delay, lower, upper), source) on the server, or with the stand-in if it is unreachable
+
+        source is "server" or "in-process". It is returned with the prediction
+        because the client is shared by every session of the app process.
+        """
+        if self.server_available:
+            try:
+                response = self._post({"features": features})
+                pred = tuple(float(response[key]) for key in ("predicted_delay", "delay_lower", "delay_upper"))
+                return pred, "server"
+            except urllib.error.HTTPError as e:
+                if e.code == 400:
+                    # The server is up but rejected these features; falling back would not help
+                    raise ValueError(json.loads(e.read()).get("error", "bad request")) from None
+                with self._lock:
+                    self._down_until = time.monotonic() + self.retry_after
+            except (urllib.error.URLError, OSError, ValueError, KeyError):
+                with self._lock:
+                    self._down_until = time.monotonic() + self.retry_after
+        return self.fallback(features), "in-process"
+
+    def metrics(self):
+        """Server-side latency and batch-size metrics, or None if the server is absent"""
+        try:
+            with urllib.request.urlopen(f"{self.url}/metrics", timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except (urllib.error.URLError, OSError, ValueError):
+            return None
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(fallback, url: str = DEFAULT_SERVER_URL) -> PredictionClient:
+    """Return the process-wide client for a server URL"""
+    with _clients_lock:
+        client = _clients.get(url)
+        if client is None:
+            client = _clients[url] = PredictionClient(fallback, url)
+        # Streamlit redefines app functions on every rerun; always use the latest
+        client.fallback = fallback
+    return client
@@ -0,0 +1,194 @@
+"""
+Dense precomputed prediction table for the sidebar input space.
+
+The cycle, sleep, flow and stress inputs are all discrete, so their whole
+space (41 x 10 x 25 x 3 x 3 = 92,250 points) can be evaluated in a single
+vectorized batch. The remaining model inputs are pinned to the sidebar's
+initial values (GRID_CONTEXT); an assessment that changes any of them is
+off-grid and goes to the live model instead.
+
+Each cell holds the point prediction and the tree-percentile interval
+(prediction, lower, upper). The table is stored next to the model pickle as a
+float32 .npy file and memory-mapped at serve time, turning "Run Prediction"
+into an index lookup.
+A JSON sidecar records the model and encoder hashes the table was built
+from; a table built for another model version is rebuilt automatically.
+
+Build offline with:
+    python app/prediction_grid.py
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_DIR = os.path.join(BASE_DIR, "model")
+sys.path.append(MODEL_DIR)
+
+from model_backends import load_model, predictor_for
+from pipeline import file_sha256
+
+MODEL_PATH = os.path.join(MODEL_DIR, "delay_predictor_model.pkl")
+ENCODER_PATH = os.path.join(MODEL_DIR, "feature_encoder.joblib")
+GRID_PATH = os.path.join(MODEL_DIR, "delay_predictor_grid.npy")
+GRID_META_PATH = os.path.join(MODEL_DIR, "delay_predictor_grid.json")
+
+# Grid axes, matching the sidebar widgets in app.py
+CYCLE_LENGTH_MIN, CYCLE_LENGTH_MAX = 20, 60
+PERIOD_DURATION_MIN, PERIOD_DURATION_MAX = 1, 10
+SLEEP_HOURS_MAX, SLEEP_HOURS_STEP = 12.0, 0.5
+FLOW_LEVELS = ["light", "medium", "heavy"]
+STRESS_LEVELS = ["low", "medium", "high"]
+
+# Sidebar initial values for every model input that is not a grid axis
+GRID_CONTEXT = {
+    "age": 22,
+    "weight": 60.0,
+    "height": 165.0,
+    "bmi": 60.0 / ((165.0 / 100) ** 2),
+    "water_intake": 6,
+    "cramp_severity": 3,
+    "has_pcos": 0,
+    "has_endometriosis": 0,
+    "has_thyroid": 0,
+    "exercise_frequency": "light",
+    "diet_quality": "good",
+    "contraceptive_use": "none",
+    "mood_state": "good",
+}
+
+GRID_SHAPE = (
+    CYCLE_LENGTH_MAX - CYCLE_LENGTH_MIN + 1,
+    PERIOD_DURATION_MAX - PERIOD_DURATION_MIN + 1,
+    int(SLEEP_HOURS_MAX / SLEEP_HOURS_STEP) + 1,
+    len(FLOW_LEVELS),
+    len(STRESS_LEVELS),
+)
+# Last axis of the stored table: point prediction, interval lower and upper bound
+GRID_VALUES = ("prediction", "lower", "upper")
+
+
+def grid_inputs() -> dict:
+    """Return the full grid as encoder inputs, axes flattened in C order of GRID_SHAPE"""
+    cycle, period, sleep, flow, stress = np.meshgrid(
+        np.arange(CYCLE_LENGTH_MIN, CYCLE_LENGTH_MAX + 1),
+        np.arange(PERIOD_DURATION_MIN, PERIOD_DURATION_MAX + 1),
+        np.arange(GRID_SHAPE[2]) * SLEEP_HOURS_STEP,
+        np.arange(len(FLOW_LEVELS)),
+        np.arange(len(STRESS_LEVELS)),
+        indexing="ij",
+    )
+    inputs = dict(GRID_CONTEXT)
+    inputs.update({
+        "cycle_length": cycle.ravel(),
+        "period_duration": period.ravel(),
+        "sleep_hours": sleep.ravel(),
+        "flow_level": np.asarray(FLOW_LEVELS, dtype=object)[flow.ravel()],
+        "stress_level": np.asarray(STRESS_LEVELS, dtype=object)[stress.ravel()],
+    })
+    return inputs
+
+
+def _meta(model_sha256: str, encoder_sha256: str) -> dict:
+    return {
+        "model_sha256": model_sha256,
+        "encoder_sha256": encoder_sha256,
+        "shape": list(GRID_SHAPE) + [len(GRID_VALUES)],
+        "context": GRID_CONTEXT,
+    }
+
+
+def build_grid(model, encoder, model_sha256: str, encoder_sha256: str,
+               path: str = GRID_PATH, meta_path: str = GRID_META_PATH):
+    """Evaluate the model and its intervals over the whole grid in one batch and save it"""
+    X = encoder.encode(grid_inputs())
+    pred, lower, upper = predictor_for(model).predict_interval(X)
+    values = np.stack([pred, lower, upper], axis=-1).astype(np.float32).reshape(GRID_SHAPE + (len(GRID_VALUES),))
+
+    # Write to temporary files first so a concurrent reader never maps a partial table
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, values)
+    os.replace(tmp_path, path)
+
+    tmp_meta_path = meta_path + ".tmp"
+    with open(tmp_meta_path, "w") as f:
+        json.dump(_meta(model_sha256, encoder_sha256), f)
+    os.replace(tmp_meta_path, meta_path)
+
+    return PredictionGrid(np.load(path, mmap_mode="r"))
+
+
+def _grid_index(values, start, step, size):
+    """Map a value onto its grid axis position, or None if it is off-grid"""
+    pos = (float(values) - start) / step
+    idx = int(round(pos))
+    if abs(pos - idx) > 1e-9 or not 0 <= idx < size:
+        return None
+    return idx
+
+
+class PredictionGrid:
+    """Memory-mapped table of model predictions over the sidebar inputs"""
+
+    def __init__(self, values):
+        self.values = values
+
+    @classmethod
+    def load(cls, model_sha256: str, encoder_sha256: str,
+             path: str = GRID_PATH, meta_path: str = GRID_META_PATH):
+        """Map a saved table, or return None if it is missing or built for another model"""
+        if not (os.path.exists(path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta != json.loads(json.dumps(_meta(model_sha256, encoder_sha256))):
+            return None
+        return cls(np.load(path, mmap_mode="r"))
+
+    def lookup(self, features: dict):
+        """Return the precomputed (prediction, lower, upper), or None for inputs outside the grid"""
+        for col, value in GRID_CONTEXT.items():
+            if features.get(col) != value:
+                return None
+
+        flow_level, stress_level = features.get("flow_level"), features.get("stress_level")
+        if flow_level not in FLOW_LEVELS or stress_level not in STRESS_LEVELS:
+            return None
+        index = (
+            _grid_index(features["cycle_length"], CYCLE_LENGTH_MIN, 1, GRID_SHAPE[0]),
+            _grid_index(features["period_duration"], PERIOD_DURATION_MIN, 1, GRID_SHAPE[1]),
+            _grid_index(features["sleep_hours"], 0.0, SLEEP_HOURS_STEP, GRID_SHAPE[2]),
+            FLOW_LEVELS.index(flow_level),
+            STRESS_LEVELS.index(stress_level),
+        )
+        if None in index:
+            return None
+        pred, lower, upper = (float(v) for v in self.values[index])
+        return pred, lower, upper
+
+
+def load_or_build_grid(snapshot, encoder_snapshot):
+    """Reuse the table on disk if it matches the model and encoder, else rebuild it"""
+    grid = PredictionGrid.load(snapshot.sha256, encoder_snapshot.sha256)
+    if grid is None:
+        grid = build_grid(snapshot.model, encoder_snapshot.model, snapshot.sha256, encoder_snapshot.sha256)
+    return grid
+
+
+if __name__ == "__main__":
+    import time
+
+    from feature_encoder import FeatureEncoder
+
+    print(f"🔄 Building prediction grid for: {MODEL_PATH}")
+    start = time.perf_counter()
+    grid = build_grid(
+        load_model(MODEL_PATH), FeatureEncoder.load(ENCODER_PATH),
+        file_sha256(MODEL_PATH), file_sha256(ENCODER_PATH),
+    )
+    elapsed = time.perf_counter() - start
+    print(f"   Grid shape: {GRID_SHAPE} ({int(np.prod(GRID_SHAPE)):,} predictions with intervals)")
+    print(f"   Built in {elapsed:.2f}s → {GRID_PATH}")
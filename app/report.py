@@ -279,7 +279,10 @@ def generate_pdf_report(out_path: str, patient: dict, inputs: dict, prediction:
     c.setFillColorRGB(0.1, 0.1, 0.1)
     c.drawString(2.5 * cm, y - 2.5 * cm, "Predicted Cycle Delay:")
     c.setFont("Helvetica", 11)
-    c.drawString(7.5 * cm, y - 2.5 * cm, f"{pred_delay:.1f} days")
+    delay_text = f"{pred_delay:.1f} days"
+    if prediction.get('delay_lower') is not None and prediction.get('delay_upper') is not None:
+        delay_text += f"  (likely range {prediction['delay_lower']:.1f} - {prediction['delay_upper']:.1f} days)"
+    c.drawString(7.5 * cm, y - 2.5 * cm, delay_text)
     
     if pred_delay >= 30:
         months = pred_delay / 30
@@ -0,0 +1,122 @@
+"""
+Forest compaction: the smallest tree count and depth within an MAE tolerance.
+
+For each candidate depth one forest is grown with warm_start, adding trees in
+steps and scoring the out-of-bag predictions after each step, so a depth's
+whole tree-count curve costs a single 100-tree fit. The candidate with the
+fewest nodes whose OOB MAE stays within the tolerance of the reference
+forest is selected, then gated on the held-out test MAE before it is used.
+
+Each candidate is also exported as a compact artifact (float32 thresholds and
+leaf values, compressed .npz) and timed for loading and single-row latency.
+
+Used by model/delay_predictor.py.
+"""
+
+import copy
+import io
+import os
+import time
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error
+
+from flat_forest import FlatForest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMPACT_PATH = os.path.join(BASE_DIR, "model", "delay_predictor_compact.npz")
+
+# Search grid; the largest depth and tree count are the full (reference) forest
+DEPTH_CANDIDATES = (4, 6, 8, 10, 12, 20)
+TREE_STEPS = (25, 50, 75, 100)
+MIN_SAMPLES_SPLIT = 5
+
+# Largest MAE increase (in days) accepted over the reference forest
+MAE_TOLERANCE_DAYS = 0.02
+
+
+def _best_of(fn, repeats: int = 5):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def artifact_stats(flat: FlatForest, row: np.ndarray) -> dict:
+    """Compressed size, load time and single-row latency of a compact artifact"""
+    buffer = io.BytesIO()
+    flat.save(buffer, compress=True)
+    data = buffer.getvalue()
+    return {
+        "size_kb": len(data) / 1e3,
+        "load_ms": _best_of(lambda: FlatForest.load(io.BytesIO(data))) * 1000,
+        "latency_us": _best_of(lambda: flat.predict(row), repeats=50) * 1e6,
+    }
+
+
+def pickle_stats(model) -> dict:
+    """Size and load time of a model saved as the regular joblib pickle"""
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    data = buffer.getvalue()
+    return {
+        "size_kb": len(data) / 1e3,
+        "load_ms": _best_of(lambda: joblib.load(io.BytesIO(data)), repeats=3) * 1000,
+    }
+
+
+def search_candidates(X_train, y_train, X_test, y_test, depths=DEPTH_CANDIDATES,
+                      tree_steps=TREE_STEPS, min_samples_split: int = MIN_SAMPLES_SPLIT,
+                      random_state: int = 42, **forest_params) -> list:
+    """Grow one warm-started forest per depth and score every tree-count step
+
+    forest_params (e.g. min_samples_leaf, max_features) are passed to every forest.
+    """
+    candidates = []
+    for depth in depths:
+        model = RandomForestRegressor(
+            n_estimators=tree_steps[0], max_depth=depth, min_samples_split=min_samples_split,
+            oob_score=True, warm_start=True, random_state=random_state, **forest_params,
+        )
+        for n_trees in tree_steps:
+            # warm_start keeps the fitted trees and only grows the new ones
+            model.set_params(n_estimators=n_trees)
+            model.fit(X_train, y_train)
+
+            compact = FlatForest.from_sklearn(model).compact()
+            candidates.append({
+                "max_depth": depth,
+                "n_trees": n_trees,
+                "n_nodes": compact.n_nodes,
+                "oob_mae": mean_absolute_error(y_train, model.oob_prediction_),
+                "test_mae": mean_absolute_error(y_test, compact.predict(X_test)),
+                **artifact_stats(compact, X_test[:1]),
+                "model": copy.deepcopy(model),
+                "compact": compact,
+            })
+    return candidates
+
+
+def select_candidate(candidates: list, tolerance: float = MAE_TOLERANCE_DAYS):
+    """Return (selected, reference): the fewest-node candidate within tolerance of the reference"""
+    reference = candidates[-1]
+    eligible = [c for c in candidates if c["oob_mae"] <= reference["oob_mae"] + tolerance]
+    selected = min(eligible, key=lambda c: (c["n_nodes"], c["n_trees"]))
+
+    # Accuracy gate: the choice must also hold up on data it was not selected on
+    if selected["test_mae"] > reference["test_mae"] + tolerance:
+        selected = reference
+    return selected, reference
+
+
+def finalize(model) -> RandomForestRegressor:
+    """Drop search-only state so the saved pickle is a plain fitted forest"""
+    model.set_params(warm_start=False, oob_score=False)
+    for attr in ("oob_score_", "oob_prediction_"):
+        if hasattr(model, attr):
+            delattr(model, attr)
+    return model
@@ -0,0 +1,312 @@
+"""
+Typed columnar storage for the training dataset.
+
+pd.read_csv infers every column: integers come back as int64, measurements as
+float64 and categoricals as object-dtype Python strings, so a 10M-row
+dataset takes gigabytes and most of the load is spent parsing text. This
+module fixes one schema for the dataset's columns: small integers as
+int8/int16, measurements as float32, and the categoricals as pandas
+Categoricals over the encoder's fixed vocabularies. In Parquet and Feather
+the categoricals are stored dictionary-encoded (int8 codes plus the
+vocabulary), so reading them back needs no string parsing at all.
+
+read_dataset / iter_dataset pick the reader from the file extension (.csv,
+.parquet/.pq, .feather/.arrow), and CSV input is parsed with the same
+dtypes, so every consumer gets identical frames whatever the format. A
+categorical value outside the vocabulary raises ValueError rather than being
+read as missing.
+
+Convert the dataset, or compare load time and memory across formats:
+    python model/dataset_io.py data/women_health_dataset.csv data/women_health_dataset.parquet
+    python model/dataset_io.py --bench-rows 10000000
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from feature_encoder import CATEGORICAL_FEATURES
+from pipeline import PeakRSSSampler, current_rss_bytes
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(BASE_DIR, "data", "women_health_dataset.csv")
+
+CHUNKSIZE = 1_000_000
+FORMATS = {".csv": "csv", ".parquet": "parquet", ".pq": "parquet", ".feather": "feather", ".arrow": "feather"}
+
+# Column order of data/women_health_dataset.csv
+SCHEMA = {
+    "user_id": np.int32,
+    "age": np.int8,
+    "cycle_length": np.int16,
+    "period_duration": np.int8,
+    "flow_level": pd.CategoricalDtype(CATEGORICAL_FEATURES["flow_level"]),
+    "stress_level": pd.CategoricalDtype(CATEGORICAL_FEATURES["stress_level"]),
+    "sleep_hours": np.float32,
+    "exercise_frequency": pd.CategoricalDtype(CATEGORICAL_FEATURES["exercise_frequency"]),
+    "water_intake": np.int8,
+    "diet_quality": pd.CategoricalDtype(CATEGORICAL_FEATURES["diet_quality"]),
+    "weight": np.float32,
+    "height": np.float32,
+    "bmi": np.float32,
+    "contraceptive_use": pd.CategoricalDtype(CATEGORICAL_FEATURES["contraceptive_use"]),
+    "has_pcos": np.int8,
+    "has_endometriosis": np.int8,
+    "has_thyroid": np.int8,
+    "mood_state": pd.CategoricalDtype(CATEGORICAL_FEATURES["mood_state"]),
+    "cramp_severity": np.int8,
+    "hormonal_imbalance": np.int8,
+    "delay_days": np.int16,
+}
+
+
+def file_format(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f"Unsupported dataset file type '{ext}' for {path} (use .csv, .parquet or .feather)")
+    return FORMATS[ext]
+
+
+def _dtypes(columns) -> dict:
+    return {col: SCHEMA[col] for col in columns if col in SCHEMA}
+
+
+def _csv_dtypes(columns) -> dict:
+    # Categoricals are parsed with the categories found in the file, so apply_schema
+    # can reject values outside the vocabulary instead of the parser dropping them
+    return {col: "category" if isinstance(dtype, pd.CategoricalDtype) else dtype
+            for col, dtype in _dtypes(columns).items()}
+
+
+def vocab_codes(values: pd.Series, vocab: list) -> np.ndarray:
+    """Category codes in vocabulary order, -1 for missing or unknown values"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Unordered categoricals compare equal whatever their category order, so
+        # astype() would keep the old order; set_categories recodes by label
+        if list(values.cat.categories) != list(vocab):
+            values = values.cat.set_categories(vocab)
+        return values.cat.codes.to_numpy()
+    return pd.Categorical(values, categories=vocab).codes
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast the dataset's columns to their fixed dtypes; other columns are left alone
+
+    Raises ValueError if a categorical column holds a value outside its vocabulary.
+    """
+    casts, recoded = {}, {}
+    for col, dtype in _dtypes(df.columns).items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            values = df[col] if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col].astype("category")
+            # A file's dictionary is not necessarily in vocabulary order (see vocab_codes)
+            if list(values.cat.categories) != list(dtype.categories):
+                # Recoding turns unknown labels into NaN; only the labels rows actually use count
+                unknown = np.flatnonzero(~values.cat.categories.isin(dtype.categories))
+                used = unknown[np.isin(unknown, values.cat.codes.to_numpy())]
+                if len(used):
+                    raise ValueError(f"Column '{col}' has values outside the vocabulary: "
+                                     f"{sorted(map(str, values.cat.categories[used]))[:10]}")
+                recoded[col] = values.cat.set_categories(dtype.categories)
+        elif df[col].dtype != dtype:
+            casts[col] = dtype
+    if recoded:
+        df = df.assign(**recoded)
+    return df.astype(casts) if casts else df
+
+
+def to_arrow(df: pd.DataFrame) -> pa.Table:
+    """An Arrow table with the fixed schema; categoricals become dictionary<int8, string>"""
+    return pa.Table.from_pandas(apply_schema(df), preserve_index=False)
+
+
+def _from_arrow(table: pa.Table) -> pd.DataFrame:
+    # Each Arrow column is released as soon as it is converted, so the table and
+    # the frame are never both fully resident
+    return apply_schema(table.to_pandas(split_blocks=True, self_destruct=True))
+
+
+def read_dataset(path: str, columns=None) -> pd.DataFrame:
+    """Load a dataset file with the fixed schema, reading only the given columns"""
+    kind = file_format(path)
+    if kind == "parquet":
+        return _from_arrow(pq.read_table(path, columns=columns))
+    if kind == "feather":
+        return _from_arrow(feather.read_table(path, columns=columns))
+    header = pd.read_csv(path, nrows=0).columns
+    return apply_schema(pd.read_csv(path, usecols=columns, dtype=_csv_dtypes(columns or header)))
+
+
+def iter_dataset(path: str, chunksize: int = CHUNKSIZE, columns=None):
+    """Yield the dataset as typed DataFrame chunks of at most chunksize rows"""
+    kind = file_format(path)
+    if kind == "parquet":
+        # pre_buffer keeps every column chunk read so far cached; without it memory stays flat
+        for batch in pq.ParquetFile(path, pre_buffer=False).iter_batches(batch_size=chunksize, columns=columns):
+            yield _from_arrow(pa.Table.from_batches([batch]))
+    elif kind == "feather":
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        for start in range(0, table.num_rows, chunksize):
+            yield _from_arrow(table.slice(start, chunksize))
+    else:
+        header = pd.read_csv(path, nrows=0).columns
+        for chunk in pd.read_csv(path, usecols=columns, dtype=_csv_dtypes(columns or header), chunksize=chunksize):
+            yield apply_schema(chunk)
+
+
+def write_dataset(df: pd.DataFrame, path: str):
+    kind = file_format(path)
+    if kind == "parquet":
+        pq.write_table(to_arrow(df), path)
+    elif kind == "feather":
+        feather.write_feather(to_arrow(df), path)
+    else:
+        df.to_csv(path, index=False)
+
+
+class DatasetWriter:
+    """Appends DataFrame chunks to one CSV, Parquet (a row group per chunk) or Feather file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.kind = file_format(path)
+        self.rows = 0
+        # Written under a temporary name, so readers never see a partial file
+        self._tmp_path = path + ".tmp"
+        self._writer = None
+
+    def write(self, chunk: pd.DataFrame):
+        if self.kind == "csv":
+            chunk.to_csv(self._tmp_path, mode="w" if self.rows == 0 else "a", header=self.rows == 0, index=False)
+        else:
+            table = to_arrow(chunk)
+            if self._writer is None:
+                self._writer = (pq.ParquetWriter(self._tmp_path, table.schema) if self.kind == "parquet"
+                                else pa.ipc.new_file(self._tmp_path, table.schema))
+            self._writer.write_table(table)
+        self.rows += len(chunk)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        os.replace(self._tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+            return
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def convert(input_path: str, output_path: str, chunksize: int = CHUNKSIZE) -> int:
+    """Rewrite a dataset in another format one chunk at a time; returns the row count"""
+    with DatasetWriter(output_path) as writer:
+        for chunk in iter_dataset(input_path, chunksize):
+            writer.write(chunk)
+    return writer.rows
+
+
+def _measure_load(reader: str, path: str) -> dict:
+    """Load one file in a fresh process, so each format starts from the same RSS"""
+    baseline = current_rss_bytes() or 0
+    with PeakRSSSampler() as memory:
+        start = time.perf_counter()
+        df = pd.read_csv(path) if reader == "inferred" else read_dataset(path)
+        seconds = time.perf_counter() - start
+    return {
+        "seconds": seconds,
+        "frame_mb": df.memory_usage(deep=True).sum() / 1e6,
+        "peak_mb": (memory.peak - baseline) / 1e6,
+    }
+
+
+def benchmark(n_rows: int, source_path: str = DATA_PATH, seed: int = 42, work_dir: str = None) -> list:
+    """Load time and memory of one n_rows dataset stored as CSV, Parquet and Feather"""
+    source = read_dataset(source_path)
+    rng = np.random.default_rng(seed)
+    work_dir = work_dir or tempfile.mkdtemp(prefix="dataset_io_bench_")
+    paths = {kind: os.path.join(work_dir, f"dataset.{kind}") for kind in ("csv", "parquet", "feather")}
+    try:
+        df = source.iloc[rng.integers(0, len(source), n_rows)].reset_index(drop=True)
+        df["user_id"] = np.arange(1, n_rows + 1, dtype=np.int32)
+        table = to_arrow(df)
+        del df
+        pq.write_table(table, paths["parquet"])
+        feather.write_feather(table, paths["feather"])
+        # Written by pyarrow for speed; plain strings, unquoted, like the shipped CSV
+        plain = table.cast(pa.schema([pa.field(f.name, pa.string()) if pa.types.is_dictionary(f.type) else f
+                                      for f in table.schema]))
+        pa_csv.write_csv(plain, paths["csv"], pa_csv.WriteOptions(quoting_style="none"))
+        del table, plain
+
+        runs = [("CSV, inferred dtypes", "inferred", paths["csv"]),
+                ("CSV, fixed schema", "typed", paths["csv"]),
+                ("Parquet", "typed", paths["parquet"]),
+                ("Feather", "typed", paths["feather"])]
+        # Spawned, not forked: a forked child inherits this process's allocator pools and would hide allocations
+        ctx = multiprocessing.get_context("spawn")
+        results = []
+        for name, reader, path in runs:
+            with ProcessPoolExecutor(1, mp_context=ctx) as pool:
+                result = pool.submit(_measure_load, reader, path).result()
+            results.append({"format": name, "file_mb": os.path.getsize(path) / 1e6, **result})
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def print_benchmark(results: list, n_rows: int):
+    print("\n" + "=" * 80)
+    print(f"DATASET LOAD BENCHMARK ({n_rows:,} rows)")
+    print("=" * 80)
+    print(f"{'Format':<24} {'File (MB)':>10} {'Load (s)':>10} {'Frame (MB)':>11} {'Peak RSS (MB)':>14}")
+    print("-" * 80)
+    for row in results:
+        print(f"{row['format']:<24} {row['file_mb']:>10,.0f} {row['seconds']:>10.2f} "
+              f"{row['frame_mb']:>11,.0f} {row['peak_mb']:>14,.0f}")
+    print("-" * 80)
+    base = results[0]
+    for row in results[1:]:
+        print(f"   {row['format']}: {base['seconds'] / row['seconds']:.1f}x faster, "
+              f"{base['frame_mb'] / row['frame_mb']:.1f}x less frame memory than {base['format']}")
+    print("=" * 80)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the dataset between CSV, Parquet and Feather")
+    parser.add_argument("input", nargs="?", help="Input .csv, .parquet or .feather file")
+    parser.add_argument("output", nargs="?", help="Output .csv, .parquet or .feather file")
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE, help="Rows converted per chunk")
+    parser.add_argument("--bench-rows", type=int, help="Benchmark loading a dataset of this many rows")
+    args = parser.parse_args(argv)
+
+    if args.bench_rows:
+        print_benchmark(benchmark(args.bench_rows, args.input or DATA_PATH), args.bench_rows)
+        return
+    if not args.input or not args.output:
+        parser.error("input and output are required (or use --bench-rows)")
+
+    start = time.perf_counter()
+    n_rows = convert(args.input, args.output, args.chunksize)
+    print(f"✅ {args.output}: {n_rows:,} rows, {os.path.getsize(args.output) / 1e6:,.1f} MB "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
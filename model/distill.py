@@ -0,0 +1,287 @@
+"""
+Distill the served model into a single shallow tree for the live preview.
+
+The dashboard's sidebar previews the delay while sliders move, so it runs on
+every rerun of the script. That path does not need the whole ensemble: a
+single regression tree is fitted to the served model's own predictions on a
+dense random sample of the sidebar's input space (INPUT_SPACE, matching the
+widgets in app.py), at the shallowest depth whose mean absolute difference
+from the model on a fresh sample stays within --fidelity-tolerance days.
+"Run Prediction" still uses the full model; the preview only has to agree
+with it.
+
+The tree is saved as a compact .npz (flat_forest format) with a JSON sidecar
+recording the model and encoder it was distilled from, so the app shows no
+preview from a surrogate that no longer matches the served model.
+delay_predictor.py and retrain.py refresh it whenever they export a model.
+
+Run with:
+    python model/distill.py
+    python model/distill.py --samples 500000 --fidelity-tolerance 0.02
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.tree import DecisionTreeRegressor
+
+from dataset_io import read_dataset
+from feature_encoder import FeatureEncoder, TARGET
+from flat_forest import FlatForest
+from model_backends import load_model, predictor_for
+from pipeline import file_sha256
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(BASE_DIR, "data", "women_health_dataset.csv")
+MODEL_PATH = os.path.join(BASE_DIR, "model", "delay_predictor_model.pkl")
+ENCODER_PATH = os.path.join(BASE_DIR, "model", "feature_encoder.joblib")
+SURROGATE_PATH = os.path.join(BASE_DIR, "model", "delay_surrogate.npz")
+
+# Sidebar widgets in app.py: (min, max, step) for numeric inputs, options for the rest.
+# bmi is derived from weight and height, as in the app.
+INPUT_SPACE = {
+    "age": (10, 80, 1),
+    "cycle_length": (20, 60, 1),
+    "period_duration": (1, 10, 1),
+    "sleep_hours": (0.0, 12.0, 0.5),
+    "water_intake": (0, 15, 1),
+    "weight": (30.0, 200.0, 0.1),
+    "height": (100.0, 220.0, 0.1),
+    "cramp_severity": (0, 10, 1),
+    "has_pcos": (0, 1, 1),
+    "has_endometriosis": (0, 1, 1),
+    "has_thyroid": (0, 1, 1),
+    "flow_level": ["light", "medium", "heavy"],
+    "stress_level": ["low", "medium", "high"],
+    "exercise_frequency": ["sedentary", "light", "moderate", "active"],
+    "diet_quality": ["poor", "fair", "good", "excellent"],
+    "contraceptive_use": ["none", "oral contraceptive", "IUD", "implant"],
+    "mood_state": ["excellent", "good", "neutral", "anxious", "depressed"],
+}
+
+N_SAMPLES = 200_000
+N_HOLDOUT = 20_000
+DEPTH_CANDIDATES = (4, 5, 6, 7, 8, 10, 12, 14)
+MIN_SAMPLES_LEAF = 20
+# Largest mean absolute difference (days) from the served model on the holdout sample
+FIDELITY_TOLERANCE_DAYS = 0.05
+
+
+def sample_inputs(n_rows: int, rng: np.random.Generator) -> dict:
+    """Uniform random sidebar inputs, as encoder input columns"""
+    inputs = {}
+    for col, space in INPUT_SPACE.items():
+        if isinstance(space, list):
+            inputs[col] = np.asarray(space, dtype=object)[rng.integers(0, len(space), n_rows)]
+        else:
+            low, high, step = space
+            inputs[col] = low + rng.integers(0, round((high - low) / step) + 1, n_rows) * step
+    inputs["bmi"] = inputs["weight"] / ((inputs["height"] / 100) ** 2)
+    return inputs
+
+
+def in_input_space(df: pd.DataFrame) -> np.ndarray:
+    """Rows whose numeric inputs the sidebar can actually enter"""
+    mask = np.ones(len(df), dtype=bool)
+    for col, space in INPUT_SPACE.items():
+        if not isinstance(space, list) and col in df:
+            mask &= df[col].between(space[0], space[1]).to_numpy()
+    return mask
+
+
+class Surrogate:
+    """A distilled tree, with a plain-Python walk for single rows"""
+
+    def __init__(self, flat: FlatForest, meta: dict):
+        self.flat = flat
+        self.meta = meta
+        # Python lists: indexing them per node is far cheaper than NumPy scalar access
+        self._feature = flat.feature.tolist()
+        self._threshold = flat.threshold.tolist()
+        self._left = flat.left.tolist()
+        self._right = flat.right.tolist()
+        self._missing_left = flat.missing_left.tolist()
+        self._value = flat.value.tolist()
+
+    @property
+    def n_nodes(self) -> int:
+        return self.flat.n_nodes
+
+    def predict_row(self, x) -> float:
+        """Prediction for one encoded row (a 1-D sequence of features)"""
+        x = x.tolist() if hasattr(x, "tolist") else x
+        node = 0
+        # Leaves point at themselves in the flattened layout
+        while self._left[node] != node:
+            value = x[self._feature[node]]
+            # NaN (an unknown category under ordinal encoding) fails both comparisons
+            go_left = value <= self._threshold[node] or (value != value and self._missing_left[node])
+            node = self._left[node] if go_left else self._right[node]
+        return self._value[node]
+
+    def predict(self, X) -> np.ndarray:
+        return self.flat.predict(X)
+
+    def matches(self, model_sha256: str, encoder_sha256: str) -> bool:
+        """True if distilled from exactly this model and encoder"""
+        return (self.meta.get("model_sha256"), self.meta.get("encoder_sha256")) == (model_sha256, encoder_sha256)
+
+    def save(self, path: str = SURROGATE_PATH):
+        # Sidecar first: readers reload when the .npz changes and expect matching metadata
+        meta_path = surrogate_metadata_path(path)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(meta_path + ".tmp", meta_path)
+        tmp_path = path + ".tmp.npz"
+        self.flat.save(tmp_path, compress=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = SURROGATE_PATH) -> "Surrogate":
+        with open(surrogate_metadata_path(path)) as f:
+            meta = json.load(f)
+        return cls(FlatForest.load(path), meta)
+
+
+def surrogate_metadata_path(path: str = SURROGATE_PATH) -> str:
+    return os.path.splitext(path)[0] + ".json"
+
+
+def _best_of(fn, repeats: int = 200) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def distill(model, encoder: FeatureEncoder, n_samples: int = N_SAMPLES,
+            tolerance: float = FIDELITY_TOLERANCE_DAYS, random_state: int = 42, data_path: str = DATA_PATH) -> dict:
+    """Fit the surrogate; returns it with the per-depth search table and a fidelity report"""
+    rng = np.random.default_rng(random_state)
+    teacher = predictor_for(model)
+
+    start = time.perf_counter()
+    X = encoder.encode(sample_inputs(n_samples, rng))
+    y = teacher.predict(X)
+    X_holdout = encoder.encode(sample_inputs(N_HOLDOUT, rng))
+    y_holdout = teacher.predict(X_holdout)
+    label_seconds = time.perf_counter() - start
+
+    table = []
+    for depth in DEPTH_CANDIDATES:
+        tree = DecisionTreeRegressor(max_depth=depth, min_samples_leaf=MIN_SAMPLES_LEAF, random_state=random_state)
+        tree.fit(X, y)
+        table.append({
+            "depth": depth,
+            "n_nodes": int(tree.tree_.node_count),
+            "fidelity_mae": float(np.mean(np.abs(tree.predict(X_holdout) - y_holdout))),
+            "tree": tree,
+        })
+        if table[-1]["fidelity_mae"] <= tolerance:
+            break
+    # The shallowest depth within tolerance, else the most faithful one tried
+    selected = next((row for row in table if row["fidelity_mae"] <= tolerance),
+                    min(table, key=lambda row: row["fidelity_mae"]))
+
+    flat = FlatForest.from_sklearn(selected["tree"]).compact()
+    surrogate = Surrogate(flat, {})
+    errors = np.abs(surrogate.predict(X_holdout) - y_holdout)
+
+    report = {
+        "depth": selected["depth"],
+        "n_nodes": selected["n_nodes"],
+        "n_samples": n_samples,
+        "tolerance": tolerance,
+        "label_seconds": label_seconds,
+        "fidelity_mae": float(errors.mean()),
+        "fidelity_p99": float(np.percentile(errors, 99)),
+        "fidelity_max": float(errors.max()),
+    }
+    # The real patients the sidebar can represent, against their recorded delays
+    if data_path and os.path.exists(data_path):
+        df = read_dataset(data_path)
+        df = df[in_input_space(df)]
+        X_real = encoder.encode(df)
+        teacher_real = teacher.predict(X_real)
+        surrogate_real = surrogate.predict(X_real)
+        report.update({
+            "real_rows": len(df),
+            "real_fidelity_mae": float(np.mean(np.abs(surrogate_real - teacher_real))),
+            "real_model_mae": float(np.mean(np.abs(teacher_real - df[TARGET]))),
+            "real_surrogate_mae": float(np.mean(np.abs(surrogate_real - df[TARGET]))),
+        })
+
+    row = X_holdout[0]
+    report["surrogate_row_us"] = _best_of(lambda: surrogate.predict_row(row)) * 1e6
+    # The app's off-grid path: the model's evaluator with intervals, one row
+    report["model_row_us"] = _best_of(lambda: teacher.predict_interval(X_holdout[:1])) * 1e6
+
+    return {
+        "surrogate": surrogate,
+        "table": [{k: v for k, v in row.items() if k != "tree"} for row in table],
+        "report": report,
+    }
+
+
+def export(distilled: dict, model_path: str, encoder_path: str, path: str = SURROGATE_PATH) -> Surrogate:
+    """Stamp the surrogate with the model and encoder it was distilled from and save it"""
+    surrogate = distilled["surrogate"]
+    surrogate.meta = {
+        "model_sha256": file_sha256(model_path),
+        "encoder_sha256": file_sha256(encoder_path),
+        **distilled["report"],
+    }
+    surrogate.save(path)
+    return surrogate
+
+
+def print_distillation(distilled: dict):
+    report = distilled["report"]
+    print(f"\n" + "=" * 80)
+    print("SURROGATE DISTILLATION (LIVE PREVIEW)")
+    print("=" * 80)
+    print(f"   {report['n_samples']:,} sidebar inputs labelled by the served model in {report['label_seconds']:.2f}s")
+    print(f"\n{'Depth':>6} {'Nodes':>7} {'Fidelity MAE':>13}")
+    print("-" * 80)
+    for row in distilled["table"]:
+        marker = " ◀ selected" if row["depth"] == report["depth"] else ""
+        print(f"{row['depth']:>6} {row['n_nodes']:>7,} {row['fidelity_mae']:>13.3f}{marker}")
+    print("-" * 80)
+    print(f"   Fidelity to the model: MAE {report['fidelity_mae']:.3f} days, p99 {report['fidelity_p99']:.2f}, "
+          f"max {report['fidelity_max']:.2f} (tolerance {report['tolerance']:.3f})")
+    if "real_rows" in report:
+        print(f"   On {report['real_rows']:,} dataset rows in the sidebar's range: fidelity MAE "
+              f"{report['real_fidelity_mae']:.3f}; vs actual delay, model {report['real_model_mae']:.3f}, "
+              f"surrogate {report['real_surrogate_mae']:.3f}")
+    print(f"   1-row latency: surrogate {report['surrogate_row_us']:.1f} µs, "
+          f"model with interval {report['model_row_us']:.0f} µs")
+    print("=" * 80)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distill the served model into a live-preview surrogate tree")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--encoder", default=ENCODER_PATH)
+    parser.add_argument("--output", default=SURROGATE_PATH)
+    parser.add_argument("--data", default=DATA_PATH, help="Dataset for the real-row fidelity check")
+    parser.add_argument("--samples", type=int, default=N_SAMPLES, help="Dense input samples to distill on")
+    parser.add_argument("--fidelity-tolerance", type=float, default=FIDELITY_TOLERANCE_DAYS,
+                        help="Largest mean absolute difference from the model (days)")
+    parser.add_argument("--random-state", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    distilled = distill(load_model(args.model), FeatureEncoder.load(args.encoder), args.samples,
+                        args.fidelity_tolerance, args.random_state, args.data)
+    print_distillation(distilled)
+    export(distilled, args.model, args.encoder, args.output)
+    print(f"✅ Surrogate saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Schema-driven feature encoder shared by training and serving.
+
+The encoder owns the fixed category vocabularies and the model's column order,
+and writes one row or millions of rows straight into a preallocated float32
+matrix. Categoricals are one-hot encoded with the first category of each
+vocabulary dropped, which is the same layout pd.get_dummies(drop_first=True)
+produced for the original model.
+
+With categorical_encoding="ordinal" each categorical is instead a single
+column holding its vocabulary index, for learners that split on categories
+natively (the hist_gb backend).
+
+Inputs that a caller does not supply, or supplies as missing (e.g. weight for
+records in the patient history table), fall back to the training-set median /
+most frequent category, stored with the encoder. A category outside the
+vocabulary raises ValueError: neither encoding has a column for it, and
+quietly encoding it as the baseline category would feed the model a wrong
+input.
+"""
+
+import joblib
+import numpy as np
+import pandas as pd
+
+TARGET = "delay_days"
+
+# hormonal_imbalance is deliberately absent: the app never collects it, so a
+# model trained on it would always be served a made-up value
+NUMERIC_FEATURES = [
+    "age",
+    "cycle_length",
+    "period_duration",
+    "sleep_hours",
+    "water_intake",
+    "weight",
+    "height",
+    "bmi",
+    "has_pcos",
+    "has_endometriosis",
+    "has_thyroid",
+    "cramp_severity",
+]
+
+# Sorted vocabularies; the first entry of each is the dropped baseline
+CATEGORICAL_FEATURES = {
+    "flow_level": ["heavy", "light", "medium"],
+    "stress_level": ["high", "low", "medium"],
+    "exercise_frequency": ["active", "light", "moderate", "sedentary"],
+    "diet_quality": ["excellent", "fair", "good", "poor"],
+    "contraceptive_use": ["IUD", "implant", "none", "oral contraceptive"],
+    "mood_state": ["anxious", "depressed", "excellent", "good", "neutral"],
+}
+
+
+CATEGORICAL_ENCODINGS = ("onehot", "ordinal")
+
+
+class FeatureEncoder:
+    """Encodes raw patient inputs into the model's float32 feature matrix"""
+
+    def __init__(self, numeric=None, categorical=None, defaults=None, categorical_encoding: str = "onehot"):
+        if categorical_encoding not in CATEGORICAL_ENCODINGS:
+            raise ValueError(f"Unknown categorical encoding '{categorical_encoding}'")
+        self.numeric = list(numeric or NUMERIC_FEATURES)
+        self.categorical = {col: list(vocab) for col, vocab in (categorical or CATEGORICAL_FEATURES).items()}
+        self.defaults = dict(defaults or {})
+        self.categorical_encoding = categorical_encoding
+
+        self.feature_names_ = list(self.numeric)
+        self._offsets = {}
+        for col, vocab in self.categorical.items():
+            self._offsets[col] = len(self.feature_names_)
+            if categorical_encoding == "ordinal":
+                self.feature_names_.append(col)
+            else:
+                self.feature_names_.extend(f"{col}_{cat}" for cat in vocab[1:])
+        self._indexers = {col: pd.Index(vocab) for col, vocab in self.categorical.items()}
+
+    @property
+    def columns(self) -> list:
+        """Raw input columns the encoder reads"""
+        return self.numeric + list(self.categorical)
+
+    @property
+    def n_features(self) -> int:
+        return len(self.feature_names_)
+
+    @property
+    def categorical_indices(self) -> list:
+        """Columns of the encoded matrix that hold category codes (ordinal encoding only)"""
+        if self.categorical_encoding != "ordinal":
+            return []
+        return [self._offsets[col] for col in self.categorical]
+
+    @property
+    def feature_groups(self) -> dict:
+        """Raw input column -> the encoded columns it produces"""
+        groups = {col: [j] for j, col in enumerate(self.numeric)}
+        for col, vocab in self.categorical.items():
+            width = 1 if self.categorical_encoding == "ordinal" else len(vocab) - 1
+            groups[col] = list(range(self._offsets[col], self._offsets[col] + width))
+        return groups
+
+    @classmethod
+    def fit(cls, df: pd.DataFrame, categorical_encoding: str = "onehot") -> "FeatureEncoder":
+        """Build the default encoder and learn fallback values from a training frame"""
+        encoder = cls(categorical_encoding=categorical_encoding)
+        for col, vocab in encoder.categorical.items():
+            unknown = set(df[col].dropna().unique()) - set(vocab)
+            if unknown:
+                raise ValueError(f"Column '{col}' has values outside the vocabulary: {sorted(unknown)}")
+
+        # Stored as the shortest decimal of the float32 value the encoder writes, so
+        # float64 (CSV) and float32 (dataset_io) training frames give the same defaults
+        defaults = {col: float(np.format_float_positional(np.float32(df[col].median())))
+                    for col in encoder.numeric}
+        defaults.update({col: df[col].mode().iloc[0] for col in encoder.categorical})
+        encoder.defaults = defaults
+        return encoder
+
+    def _column(self, data, col, n_rows):
+        if col in data:
+            values = data[col]
+            if np.ndim(values) == 0:
+                values = np.full(n_rows, values, dtype=object)
+            # Keep pandas columns as-is: Index.get_indexer is fastest on a Series
+            return values if isinstance(values, pd.Series) else np.asarray(values)
+        if col in self.defaults:
+            return np.full(n_rows, self.defaults[col], dtype=object)
+        raise KeyError(f"Missing input column '{col}' and no default is stored for it")
+
+    def _encode_scalars(self, data, out):
+        """Fast path for a single record of plain scalars"""
+        for j, col in enumerate(self.numeric):
+            value = data.get(col, self.defaults.get(col))
+            if value is None or value != value:
+                value = self.defaults[col]
+            out[0, j] = value
+        for col, vocab in self.categorical.items():
+            value = data.get(col, self.defaults.get(col))
+            if value is None or value != value:
+                value = self.defaults[col]
+            if value not in vocab:
+                raise ValueError(f"Column '{col}' has values outside the vocabulary: {[value]}")
+            code = vocab.index(value)
+            if self.categorical_encoding == "ordinal":
+                out[0, self._offsets[col]] = code
+                continue
+            if code > 0:
+                out[0, self._offsets[col] + code - 1] = 1.0
+        return out
+
+    def encode(self, data, out: np.ndarray = None) -> np.ndarray:
+        """
+        Encode a DataFrame, a dict of equal-length arrays, or a dict of scalars
+        (one row) into an (n_rows, n_features) float32 matrix.
+        """
+        scalar_row = False
+        if isinstance(data, pd.DataFrame):
+            n_rows = len(data)
+        else:
+            lengths = {len(v) for v in data.values() if np.ndim(v) > 0}
+            if len(lengths) > 1:
+                raise ValueError(f"Input columns have different lengths: {sorted(lengths)}")
+            scalar_row = not lengths
+            n_rows = lengths.pop() if lengths else 1
+
+        if out is None:
+            out = np.zeros((n_rows, self.n_features), dtype=np.float32)
+        else:
+            out[:] = 0
+
+        if scalar_row:
+            return self._encode_scalars(data, out)
+
+        for j, col in enumerate(self.numeric):
+            values = np.asarray(self._column(data, col, n_rows), dtype=np.float32)
+            missing = np.isnan(values)
+            if missing.any() and col in self.defaults:
+                values = np.where(missing, np.float32(self.defaults[col]), values)
+            out[:, j] = values
+
+        rows = np.arange(n_rows)
+        for col, indexer in self._indexers.items():
+            values = self._column(data, col, n_rows)
+            codes = indexer.get_indexer(values)
+            missing = np.asarray(pd.isna(values))
+            if col in self.defaults:
+                codes[missing] = indexer.get_loc(self.defaults[col])
+            unknown = (codes < 0) & ~missing
+            if unknown.any():
+                raise ValueError(f"Column '{col}' has values outside the vocabulary: "
+                                 f"{sorted(set(np.asarray(values, dtype=object)[unknown].tolist()), key=str)[:10]}")
+            if self.categorical_encoding == "ordinal":
+                # Missing values without a stored default stay NaN (missing) for the learner
+                out[:, self._offsets[col]] = np.where(codes >= 0, codes, np.nan)
+                continue
+            hot = codes > 0
+            out[rows[hot], self._offsets[col] + codes[hot] - 1] = 1.0
+
+        return out
+
+    def unknown_rows(self, df: pd.DataFrame) -> np.ndarray:
+        """Boolean mask of the rows holding a category outside the vocabulary (encode would reject them)"""
+        unknown = np.zeros(len(df), dtype=bool)
+        for col, indexer in self._indexers.items():
+            if col in df:
+                unknown |= (indexer.get_indexer(df[col]) < 0) & ~df[col].isna().to_numpy()
+        return unknown
+
+    def encode_row(self, **values) -> np.ndarray:
+        """Encode a single record given as keyword arguments, shape (1, n_features)"""
+        return self.encode(values)
+
+    def to_dict(self) -> dict:
+        return {
+            "numeric": self.numeric,
+            "categorical": self.categorical,
+            "defaults": self.defaults,
+            "categorical_encoding": self.categorical_encoding,
+            "feature_names": self.feature_names_,
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "FeatureEncoder":
+        # Encoders saved before ordinal encoding existed are one-hot
+        encoder = cls(state["numeric"], state["categorical"], state["defaults"],
+                      state.get("categorical_encoding", "onehot"))
+        if encoder.feature_names_ != state["feature_names"]:
+            raise ValueError("Stored feature names do not match the encoder schema")
+        return encoder
+
+    def save(self, path: str):
+        # Stored as plain data so loading never depends on this module's import path
+        joblib.dump(self.to_dict(), path)
+
+    @classmethod
+    def load(cls, path: str) -> "FeatureEncoder":
+        return cls.from_dict(joblib.load(path))
@@ -0,0 +1,307 @@
+"""
+Array-backed evaluator for the random forest.
+
+sklearn's RandomForestRegressor.predict pays a fixed cost per call (input
+validation, feature-name checks, joblib dispatch over 100 estimators) that
+dominates when scoring a single row. FlatForest flattens every tree into one
+set of contiguous NumPy arrays and walks all trees for a whole batch of rows
+at once, one tree level per step.
+
+The result is bit-for-bit identical to sklearn: inputs are cast to float32 and
+compared against the float64 thresholds exactly as sklearn's tree does, and the
+per-tree outputs are summed in estimator order before dividing by the tree count.
+
+compact() narrows the arrays for storage: thresholds are rounded down to
+float32 (for float32 inputs, x <= t and x <= round_down32(t) always agree, so
+every decision is unchanged) and leaf values become float32, which moves
+predictions by well under 1e-5 days.
+
+predict_interval() reuses the same single pass over all trees: the per-tree
+outputs give both the mean and the spread of the ensemble, so an interval
+costs one percentile reduction on top of the point prediction.
+
+Check parity with sklearn and benchmark 1 / 100 / 100k-row batches (nothing
+is written unless --export is given):
+    python model/flat_forest.py
+    python model/flat_forest.py --export
+"""
+
+import os
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_PATH = os.path.join(BASE_DIR, "model", "delay_predictor_model.pkl")
+FLAT_PATH = os.path.join(BASE_DIR, "model", "delay_predictor_flat.npz")
+
+# Rows evaluated per step; bounds the (trees x rows) node-index matrix
+CHUNK_ROWS = 2048
+
+# Default prediction interval: 10th to 90th percentile of the per-tree outputs
+INTERVAL_PERCENTILES = (10, 90)
+
+ARRAY_FIELDS = ("feature", "threshold", "missing_left", "left", "right", "value", "roots")
+
+
+class FlatForest:
+    """A tree ensemble stored as flat node arrays, evaluated with vectorized NumPy"""
+
+    def __init__(self, feature, threshold, missing_left, left, right, value, roots,
+                 max_depth, n_features, feature_names=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.missing_left = missing_left
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = int(n_features)
+        if feature_names is not None:
+            self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    @classmethod
+    def from_sklearn(cls, model) -> "FlatForest":
+        """Flatten a fitted RandomForestRegressor (or a single tree regressor)"""
+        estimators = getattr(model, "estimators_", [model])
+
+        feature, threshold, missing_left, left, right, value, roots = [], [], [], [], [], [], []
+        offset = 0
+        for est in estimators:
+            tree = est.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left == -1
+            own = np.arange(offset, offset + n)
+
+            # Leaves point at themselves so every row can take the same number of steps
+            left.append(np.where(is_leaf, own, tree.children_left + offset))
+            right.append(np.where(is_leaf, own, tree.children_right + offset))
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+            missing = getattr(tree, "missing_go_to_left", np.zeros(n, dtype=np.uint8))
+            missing_left.append(np.asarray(missing, dtype=bool))
+            value.append(tree.value[:, 0, 0])
+            roots.append(offset)
+            offset += n
+
+        return cls(
+            feature=np.concatenate(feature).astype(np.int32),
+            threshold=np.concatenate(threshold).astype(np.float64),
+            missing_left=np.concatenate(missing_left),
+            left=np.concatenate(left).astype(np.int32),
+            right=np.concatenate(right).astype(np.int32),
+            value=np.concatenate(value).astype(np.float64),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max(est.tree_.max_depth for est in estimators),
+            n_features=model.n_features_in_,
+            feature_names=getattr(model, "feature_names_in_", None),
+        )
+
+    @classmethod
+    def from_model(cls, model) -> "FlatForest":
+        """Return model itself if it is already flat, else flatten it"""
+        return model if isinstance(model, cls) else cls.from_sklearn(model)
+
+    def compact(self) -> "FlatForest":
+        """Copy with float32 thresholds/values and a small feature index dtype"""
+        threshold = self.threshold.astype(np.float32)
+        # Round down so no float32 input flips sides of a split
+        rounded_up = threshold > self.threshold
+        threshold[rounded_up] = np.nextafter(threshold[rounded_up], np.float32(-np.inf))
+        return FlatForest(
+            feature=self.feature.astype(np.int16 if self.n_features_in_ < 2 ** 15 else np.int32),
+            threshold=threshold,
+            missing_left=self.missing_left,
+            left=self.left,
+            right=self.right,
+            value=self.value.astype(np.float32),
+            roots=self.roots,
+            max_depth=self.max_depth,
+            n_features=self.n_features_in_,
+            feature_names=getattr(self, "feature_names_in_", None),
+        )
+
+    def save(self, path: str = FLAT_PATH, compress: bool = False):
+        arrays = {name: getattr(self, name) for name in ARRAY_FIELDS}
+        arrays["meta"] = np.array([self.max_depth, self.n_features_in_], dtype=np.int64)
+        if hasattr(self, "feature_names_in_"):
+            arrays["feature_names"] = self.feature_names_in_.astype(str)
+        (np.savez_compressed if compress else np.savez)(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str = FLAT_PATH) -> "FlatForest":
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in ARRAY_FIELDS}
+            max_depth, n_features = data["meta"]
+            names = data["feature_names"] if "feature_names" in data.files else None
+        return cls(**arrays, max_depth=max_depth, n_features=n_features, feature_names=names)
+
+    @property
+    def children(self) -> np.ndarray:
+        """Interleaved [left, right] child indices, so one gather picks the next node"""
+        children = getattr(self, "_children", None)
+        if children is None:
+            children = np.stack([self.left, self.right], axis=1).ravel()
+            self._children = children
+        return children
+
+    def _leaf_values(self, X) -> np.ndarray:
+        """Per-tree outputs for one chunk of rows, shape (n_trees, n_rows)"""
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        row_offsets = np.arange(n_rows, dtype=np.int64) * n_features
+        node = np.repeat(self.roots[:, None], n_rows, axis=1)
+        check_missing = np.isnan(flat_X).any()
+        children = self.children
+
+        for _ in range(self.max_depth):
+            x = flat_X[row_offsets + self.feature[node]]
+            go_right = ~(x <= self.threshold[node])
+            if check_missing:
+                go_right &= ~(np.isnan(x) & self.missing_left[node])
+            node = children[2 * node + go_right]
+
+        return self.value[node]
+
+    def tree_predictions(self, X) -> np.ndarray:
+        """Return every tree's prediction, shape (n_trees, n_rows)"""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, but the forest expects {self.n_features_in_}")
+
+        return np.concatenate(
+            [self._leaf_values(X[i:i + CHUNK_ROWS]) for i in range(0, max(len(X), 1), CHUNK_ROWS)],
+            axis=1,
+        )
+
+    def predict(self, X) -> np.ndarray:
+        """Mean over trees, summed in estimator order to match sklearn exactly"""
+        per_tree = self.tree_predictions(X)
+        # cumsum is strictly sequential, unlike sum() which uses pairwise summation
+        return np.cumsum(per_tree, axis=0, dtype=np.float64)[-1] / self.n_estimators
+
+    def predict_interval(self, X, lower: float = INTERVAL_PERCENTILES[0],
+                         upper: float = INTERVAL_PERCENTILES[1]):
+        """Return (mean, lower, upper) arrays from a single evaluation of all trees"""
+        per_tree = self.tree_predictions(X)
+        mean = np.cumsum(per_tree, axis=0, dtype=np.float64)[-1] / self.n_estimators
+        lo, hi = np.percentile(per_tree, [lower, upper], axis=0)
+        return mean, lo, hi
+
+
+def load_forest(path: str = MODEL_PATH) -> FlatForest:
+    """Load a model pickle or a saved .npz artifact (flat or compact) as a FlatForest"""
+    if path.endswith(".npz"):
+        return FlatForest.load(path)
+    import joblib
+
+    return FlatForest.from_model(joblib.load(path))
+
+
+def sample_rows(flat: FlatForest, n: int, seed: int = 42) -> np.ndarray:
+    """Random rows spanning every feature's split range; a quarter of the values sit exactly on a threshold"""
+    rng = np.random.default_rng(seed)
+    finite = np.isfinite(flat.threshold)
+    thresholds = [flat.threshold[finite & (flat.feature == f)] for f in range(flat.n_features_in_)]
+    lo = np.array([t.min(initial=0.0) for t in thresholds])
+    hi = np.array([t.max(initial=1.0) for t in thresholds])
+    X = rng.uniform(lo - 1, hi + 1, size=(n, flat.n_features_in_))
+    # x == threshold is where a float32/float64 slip would send a row down the wrong branch
+    for f, t in enumerate(thresholds):
+        on_split = rng.random(n) < 0.25
+        if len(t) and on_split.any():
+            X[on_split, f] = rng.choice(t, on_split.sum())
+    return X
+
+
+def assert_identical(model, flat: FlatForest, X: np.ndarray):
+    """Raise AssertionError unless flat predicts exactly what sklearn predicts on X"""
+    import pandas as pd
+
+    columns = getattr(model, "feature_names_in_", None)
+    expected = model.predict(pd.DataFrame(X, columns=columns) if columns is not None else X)
+    actual = flat.predict(X)
+    differ = np.flatnonzero(expected != actual)
+    assert not len(differ), (f"{len(differ):,} of {len(X):,} rows differ from sklearn "
+                             f"(max {np.abs(expected - actual).max():.3g})")
+
+
+def benchmark(model, flat: FlatForest, sizes=(1, 100, 100_000), repeats: int = 5, seed: int = 42):
+    """Compare sklearn and FlatForest latency on sample_rows; every size is checked with assert_identical"""
+    import pandas as pd
+
+    columns = getattr(model, "feature_names_in_", None)
+    results = []
+    for size in sizes:
+        X = sample_rows(flat, size, seed)
+        X_df = pd.DataFrame(X, columns=columns) if columns is not None else X
+        assert_identical(model, flat, X)
+
+        def best_of(fn):
+            best = float("inf")
+            for _ in range(repeats):
+                start = time.perf_counter()
+                fn()
+                best = min(best, time.perf_counter() - start)
+            return best
+
+        sk_time = best_of(lambda: model.predict(X_df))
+        flat_time = best_of(lambda: flat.predict(X))
+        interval_time = best_of(lambda: flat.predict_interval(X))
+        results.append({
+            "rows": size,
+            "sklearn_ms": sk_time * 1000,
+            "flat_ms": flat_time * 1000,
+            "speedup": sk_time / flat_time,
+            "interval_ms": interval_time * 1000,
+        })
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Check FlatForest against sklearn and compare their latency")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--sizes", default="1,100,100000", help="Comma-separated batch sizes")
+    parser.add_argument("--export", nargs="?", const=FLAT_PATH, default=None, metavar="PATH",
+                        help=f"Also save the flattened forest (default path: {FLAT_PATH})")
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    flat = FlatForest.from_sklearn(model)
+    print("=" * 80)
+    print("FLAT FOREST")
+    print("=" * 80)
+    print(f"   Trees: {flat.n_estimators}, nodes: {flat.n_nodes:,}, max depth: {flat.max_depth}")
+    if args.export:
+        flat.save(args.export)
+        print(f"   ✅ Saved to: {args.export} ({os.path.getsize(args.export) / 1e3:.0f} KB)")
+
+    results = benchmark(model, flat, [int(size) for size in args.sizes.split(",")])
+    print("   ✅ Predictions identical to sklearn at every size")
+    print(f"\n{'Rows':>10} {'sklearn (ms)':>14} {'flat (ms)':>12} {'speedup':>9} {'interval (ms)':>14}")
+    print("-" * 80)
+    for row in results:
+        print(f"{row['rows']:>10,} {row['sklearn_ms']:>14.3f} {row['flat_ms']:>12.3f} "
+              f"{row['speedup']:>8.1f}x {row['interval_ms']:>14.3f}")
+    print("-" * 80)
+    # The flat walk removes per-call overhead; it does not beat sklearn's compiled walk on throughput
+    slower = [row["rows"] for row in results if row["speedup"] < 1]
+    if slower:
+        print(f"   Flat is slower than sklearn at {', '.join(f'{rows:,}' for rows in slower)} rows; the served")
+        print("   predictor (model_backends.predictor_for) uses sklearn's trees above FOREST_FLAT_MAX_ROWS")
+    print("=" * 80)
@@ -0,0 +1,450 @@
+"""
+Model backends for the delay predictor and the metadata that names them.
+
+- random_forest: RandomForestRegressor on one-hot categoricals, served
+  through the flattened forest up to FOREST_FLAT_MAX_ROWS rows and through
+  sklearn's trees above that; intervals are percentiles across its trees.
+- hist_gb: HistGradientBoostingRegressor on ordinal categoricals, which it
+  splits natively, so there is no one-hot expansion. Intervals add the 10th
+  and 90th percentile of out-of-fold residuals to the point prediction, so
+  serving evaluates a single boosted model.
+
+Training writes delay_predictor_model.json next to the pickle with the
+backend and the encoder's categorical encoding. load_model() checks the
+pickle against it, and predictor_for() returns the object that serves
+predict_interval() for that backend, so the app, the prediction server and
+batch scoring never branch on the model type themselves.
+
+Compare the backends on the same split with:
+    python model/model_backends.py
+"""
+
+import io
+import json
+import os
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import cross_val_predict, train_test_split
+
+from dataset_io import read_dataset
+from feature_encoder import FeatureEncoder, TARGET
+from flat_forest import INTERVAL_PERCENTILES, FlatForest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(BASE_DIR, "data", "women_health_dataset.csv")
+MODEL_PATH = os.path.join(BASE_DIR, "model", "delay_predictor_model.pkl")
+
+# Backend -> categorical encoding its encoder must use
+BACKENDS = {
+    "random_forest": "onehot",
+    "hist_gb": "ordinal",
+}
+DEFAULT_BACKEND = "random_forest"
+
+HIST_GB_PARAMS = {"max_iter": 200, "learning_rate": 0.1, "max_leaf_nodes": 31}
+# Folds for the out-of-fold residuals behind the hist_gb interval
+RESIDUAL_FOLDS = 5
+
+
+# Rows evaluated per step; bounds the (trees x rows) node-index matrix
+CHUNK_ROWS = 2048
+# Up to this many rows the flattened trees beat sklearn's per-tree loop; above it
+# sklearn's compiled evaluator wins
+FLAT_MAX_ROWS = 128
+# The same crossover for the random forest's per-tree matrix (flat walk vs sklearn's
+# compiled per-tree predict); measured between 256 and 512 rows with 50 trees of depth 8
+FOREST_FLAT_MAX_ROWS = 256
+
+
+def _bitset64(words) -> np.ndarray:
+    """Low 64 bits of sklearn's 256-bit category bitsets (uint32 words)"""
+    words = np.asarray(words, dtype=np.uint64)
+    if words[..., 2:].any():
+        raise ValueError("Category codes above 63 are not supported by the flattened evaluator")
+    return words[..., 0] | (words[..., 1] << np.uint64(32))
+
+
+class FlatBoosting:
+    """Several HistGradientBoostingRegressors flattened into one set of node arrays
+
+    sklearn evaluates a boosted model one tree at a time from Python, which
+    costs tens of microseconds per tree on a single row. Here every tree of
+    every model is walked for a whole batch at once, one level per step, and
+    each model's trees are summed in boosting order onto its baseline, which
+    reproduces sklearn's raw predictions exactly. The models must have been
+    fitted on the same inputs, so they share one input preprocessing.
+    """
+
+    def __init__(self, models):
+        self._init_preprocessing(models[0])
+        fields = {name: [] for name in ("feature", "threshold", "missing_left", "categorical",
+                                        "left_mask", "is_leaf", "left", "right", "value")}
+        roots, owner = [], []
+        offset = 0
+        for k, model in enumerate(models):
+            for (predictor,) in model._predictors:
+                nodes = predictor.nodes
+                n = len(nodes)
+                own = np.arange(offset, offset + n)
+                is_leaf = nodes["is_leaf"].astype(bool)
+                categorical = nodes["is_categorical"].astype(bool)
+                left_bitsets = _bitset64(predictor.raw_left_cat_bitsets) if categorical.any() else None
+
+                fields["left"].append(np.where(is_leaf, own, nodes["left"].astype(np.int64) + offset))
+                fields["right"].append(np.where(is_leaf, own, nodes["right"].astype(np.int64) + offset))
+                fields["feature"].append(np.where(is_leaf, 0, nodes["feature_idx"]))
+                fields["threshold"].append(np.where(is_leaf, np.inf, nodes["num_threshold"]))
+                fields["missing_left"].append(nodes["missing_go_to_left"].astype(bool))
+                fields["categorical"].append(categorical & ~is_leaf)
+                fields["is_leaf"].append(is_leaf)
+                left_mask = np.zeros(n, dtype=np.uint64)
+                for i in np.flatnonzero(categorical & ~is_leaf):
+                    left_mask[i] = left_bitsets[nodes["bitset_idx"][i]]
+                # Categories outside the training set never reach a split: preprocessing makes them NaN
+                fields["left_mask"].append(left_mask)
+                fields["value"].append(np.where(is_leaf, nodes["value"], 0.0))
+                roots.append(offset)
+                owner.append(k)
+                offset += n
+
+        for name, parts in fields.items():
+            setattr(self, name, np.concatenate(parts))
+        self.feature = self.feature.astype(np.int64)
+        self.children = np.stack([self.left, self.right], axis=1).ravel().astype(np.int64)
+        self.roots = np.asarray(roots, dtype=np.int64)
+        self.owner = np.asarray(owner)
+        self.baselines = np.array([float(np.ravel(model._baseline_prediction)[0]) for model in models])
+        self.has_categorical = bool(self.categorical.any())
+
+    def _init_preprocessing(self, model):
+        """Mirror the model's input preprocessing: categoricals first, category values to codes"""
+        self.n_features_in_ = model.n_features_in_
+        preprocessor = model._preprocessor
+        if preprocessor is None:
+            self.column_order = np.arange(self.n_features_in_)
+            self.category_maps = {}
+            return
+        categorical = np.asarray(model.is_categorical_, dtype=bool)
+        self.column_order = np.concatenate([np.flatnonzero(categorical), np.flatnonzero(~categorical)])
+        # Per categorical output column: raw value (0..63) -> code, NaN for unknown values
+        self.category_maps = {}
+        for col, categories in enumerate(preprocessor.named_transformers_["encoder"].categories_):
+            if len(categories) and (categories.min() < 0 or categories.max() > 63 or
+                                    np.any(categories != np.round(categories))):
+                raise ValueError("Only integer category values 0-63 are supported by the flattened evaluator")
+            table = np.full(64, np.nan)
+            table[categories.astype(np.int64)] = np.arange(len(categories))
+            self.category_maps[col] = table
+
+    def _preprocess(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, but the model expects {self.n_features_in_}")
+        X = np.ascontiguousarray(X[:, self.column_order])
+        for col, table in self.category_maps.items():
+            x = X[:, col]
+            valid = (x >= 0) & (x <= 63) & (x == np.round(x))
+            X[:, col] = np.where(valid, table[np.where(valid, x, 0).astype(np.int64)], np.nan)
+        return X
+
+    def _leaf_values(self, X) -> np.ndarray:
+        """Per-tree outputs for one chunk of rows, shape (n_trees, n_rows)"""
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        node = np.repeat(self.roots[:, None], n_rows, axis=1).ravel()
+        row_offsets = np.tile(np.arange(n_rows, dtype=np.int64) * n_features, len(self.roots))
+        # Boosted trees are unbalanced: only (tree, row) pairs still at a split take another step
+        active = np.flatnonzero(~self.is_leaf[node])
+
+        while len(active):
+            current = node[active]
+            x = flat_X[row_offsets[active] + self.feature[current]]
+            missing = np.isnan(x)
+            go_left = x <= self.threshold[current]
+            if self.has_categorical:
+                # After preprocessing a categorical value is its code (0-63) or NaN
+                code = np.where(missing, 0, x).astype(np.uint64)
+                in_left = (self.left_mask[current] >> code) & np.uint64(1) == 1
+                go_left = np.where(self.categorical[current], in_left, go_left)
+            go_left = np.where(missing, self.missing_left[current], go_left)
+            current = self.children[2 * current + ~go_left]
+            node[active] = current
+            active = active[~self.is_leaf[current]]
+
+        return self.value[node].reshape(len(self.roots), n_rows)
+
+    def predict_all(self, X) -> np.ndarray:
+        """Raw prediction of every flattened model, shape (n_models, n_rows)"""
+        X = self._preprocess(X)
+        per_tree = np.concatenate(
+            [self._leaf_values(X[i:i + CHUNK_ROWS]) for i in range(0, max(len(X), 1), CHUNK_ROWS)],
+            axis=1,
+        )
+        out = np.empty((len(self.baselines), per_tree.shape[1]))
+        for k, baseline in enumerate(self.baselines):
+            trees = per_tree[self.owner == k]
+            # Sequential sum in boosting order, as sklearn accumulates raw predictions
+            out[k] = np.cumsum(np.vstack([np.full((1, trees.shape[1]), baseline), trees]), axis=0)[-1]
+        return out
+
+
+class ForestPredictor:
+    """Serves a RandomForestRegressor: flattened for small batches, sklearn's trees for large ones
+
+    Both paths produce the same (n_trees, n_rows) matrix of per-tree outputs, so
+    the mean and the percentile interval come out identical whichever is used.
+    """
+
+    def __init__(self, model, flat: FlatForest = None):
+        self.model = model
+        self.flat = flat or FlatForest.from_sklearn(model)
+        self.n_features_in_ = self.flat.n_features_in_
+
+    @property
+    def n_estimators(self) -> int:
+        return self.flat.n_estimators
+
+    def tree_predictions(self, X) -> np.ndarray:
+        """Every tree's prediction, shape (n_trees, n_rows)"""
+        if len(X) <= FOREST_FLAT_MAX_ROWS:
+            return self.flat.tree_predictions(X)
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, but the forest expects {self.n_features_in_}")
+        return np.stack([tree.predict(X, check_input=False) for tree in self.model.estimators_])
+
+    def predict(self, X) -> np.ndarray:
+        # Sequential sum in estimator order, as sklearn accumulates the trees
+        return np.cumsum(self.tree_predictions(X), axis=0, dtype=np.float64)[-1] / self.n_estimators
+
+    def predict_interval(self, X, lower: float = INTERVAL_PERCENTILES[0],
+                         upper: float = INTERVAL_PERCENTILES[1]):
+        """Return (mean, lower, upper) arrays from a single evaluation of all trees"""
+        per_tree = self.tree_predictions(X)
+        mean = np.cumsum(per_tree, axis=0, dtype=np.float64)[-1] / self.n_estimators
+        lo, hi = np.percentile(per_tree, [lower, upper], axis=0)
+        return mean, lo, hi
+
+
+class HistGBIntervalRegressor:
+    """HistGradientBoostingRegressor with a residual-percentile interval
+
+    Quantile-loss boosting barely moves off its baseline here (a third of the
+    targets are exactly 0), so the interval is split-conformal instead: the
+    lower/upper percentiles of residuals the model made on rows it did not
+    train on (cross_val_predict), added to the prediction.
+    """
+
+    def __init__(self, categorical_features=(), lower: float = 10, upper: float = 90, **params):
+        self.categorical_features = list(categorical_features)
+        self.lower = lower
+        self.upper = upper
+        self.params = params
+
+    def _regressor(self) -> HistGradientBoostingRegressor:
+        return HistGradientBoostingRegressor(categorical_features=self.categorical_features or None, **self.params)
+
+    def fit(self, X, y) -> "HistGBIntervalRegressor":
+        residuals = y - cross_val_predict(self._regressor(), X, y, cv=RESIDUAL_FOLDS)
+        self.residual_lower_, self.residual_upper_ = np.percentile(residuals, [self.lower, self.upper])
+        self.point_ = self._regressor().fit(X, y)
+        self.n_features_in_ = X.shape[1]
+        return self
+
+    @property
+    def flat(self) -> FlatBoosting:
+        flat = getattr(self, "_flat", None)
+        if flat is None:
+            flat = self._flat = FlatBoosting([self.point_])
+        return flat
+
+    def __getstate__(self):
+        # The flattened copy is rebuilt on first use rather than pickled twice
+        return {k: v for k, v in self.__dict__.items() if k != "_flat"}
+
+    def predict(self, X) -> np.ndarray:
+        return self.flat.predict_all(X)[0] if len(X) <= FLAT_MAX_ROWS else self.point_.predict(X)
+
+    def predict_interval(self, X):
+        """Return (prediction, lower, upper)"""
+        pred = self.predict(X)
+        return pred, pred + self.residual_lower_, pred + self.residual_upper_
+
+    def get_params(self) -> dict:
+        return {"lower": self.lower, "upper": self.upper, **self.params}
+
+
+def backend_of(model) -> str:
+    return "hist_gb" if isinstance(model, HistGBIntervalRegressor) else "random_forest"
+
+
+def metadata_path(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + ".json"
+
+
+def read_metadata(model_path: str) -> dict:
+    """Artifact metadata; models trained before backends existed are random forests"""
+    path = metadata_path(model_path)
+    if not os.path.exists(path):
+        return {"backend": DEFAULT_BACKEND, "categorical_encoding": BACKENDS[DEFAULT_BACKEND]}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_metadata(model_path: str, model, encoder: FeatureEncoder, **extra) -> str:
+    path = metadata_path(model_path)
+    metadata = {
+        "backend": backend_of(model),
+        "categorical_encoding": encoder.categorical_encoding,
+        "n_features": encoder.n_features,
+        "params": {k: v for k, v in model.get_params().items() if isinstance(v, (int, float, str, type(None)))},
+        "trained_at": datetime.now().isoformat(timespec="seconds"),
+        **extra,
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_model(path: str = MODEL_PATH):
+    """Load the model pickle, refusing one that does not match its metadata"""
+    model = joblib.load(path)
+    expected = read_metadata(path)["backend"]
+    if backend_of(model) != expected:
+        # e.g. the pickle was replaced but its metadata not yet; the registry retries later
+        raise ValueError(f"{path} holds a {backend_of(model)} model but its metadata says {expected}")
+    return model
+
+
+def predictor_for(model, backend: str = None):
+    """The object that serves predict_interval() for this model"""
+    backend = backend or backend_of(model)
+    if backend == "hist_gb":
+        return model
+    if not hasattr(model, "estimators_"):
+        # Already flat (a .npz artifact) or a single tree
+        return FlatForest.from_model(model)
+    # Flattened for the app's single rows, which skips sklearn's per-call overhead;
+    # sklearn's compiled trees for batch scoring
+    return ForestPredictor(model)
+
+
+def load_predictor(path: str = MODEL_PATH):
+    """Load a model pickle or a compact .npz forest as a predictor"""
+    if path.endswith(".npz"):
+        return FlatForest.load(path)
+    return predictor_for(load_model(path))
+
+
+def _median_seconds(fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def benchmark_backends(data_path: str = DATA_PATH, rf_params: dict = None, hist_gb_params: dict = None,
+                       test_size: float = 0.2, random_state: int = 42, batch_rows: int = 100_000) -> list:
+    """Train both backends on the same split and measure what serving them costs"""
+    df = read_dataset(data_path)
+    y = df[TARGET].to_numpy(dtype=float)
+    train_idx, test_idx = train_test_split(np.arange(len(df)), test_size=test_size, random_state=random_state)
+    batch_idx = np.random.default_rng(random_state).choice(test_idx, batch_rows)
+
+    builders = {
+        "random_forest": lambda encoder: RandomForestRegressor(random_state=random_state, **rf_params),
+        "hist_gb": lambda encoder: HistGBIntervalRegressor(encoder.categorical_indices, random_state=random_state,
+                                                           **hist_gb_params),
+    }
+    results = []
+    for backend, build in builders.items():
+        encoder = FeatureEncoder.fit(df.iloc[train_idx], BACKENDS[backend])
+        X = encoder.encode(df)
+
+        model = build(encoder)
+        start = time.perf_counter()
+        model.fit(X[train_idx], y[train_idx])
+        train_seconds = time.perf_counter() - start
+
+        buffer = io.BytesIO()
+        joblib.dump(model, buffer)
+        data = buffer.getvalue()
+        load_seconds = _median_seconds(lambda: joblib.load(io.BytesIO(data)), 3)
+
+        # Timed on the serving path: predictions with intervals
+        predictor = predictor_for(joblib.load(io.BytesIO(data)))
+        row = X[test_idx[:1]]
+        _, lower, upper = predictor.predict_interval(X[test_idx])
+        results.append({
+            "backend": backend,
+            "n_features": encoder.n_features,
+            "train_s": train_seconds,
+            "size_kb": len(data) / 1e3,
+            "load_ms": load_seconds * 1000,
+            "row_us": _median_seconds(lambda: predictor.predict_interval(row), 200) * 1e6,
+            "batch_ms": _median_seconds(lambda: predictor.predict_interval(X[batch_idx]), 3) * 1000,
+            "batch_point_ms": _median_seconds(lambda: predictor.predict(X[batch_idx]), 3) * 1000,
+            "mae": mean_absolute_error(y[test_idx], model.predict(X[test_idx])),
+            # Share of test rows inside the 10th-90th percentile interval (0.80 is calibrated)
+            "coverage": float(np.mean((y[test_idx] >= lower) & (y[test_idx] <= upper))),
+        })
+    return results
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare the random_forest and hist_gb backends on one split")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--test-size", type=float, default=0.2)
+    parser.add_argument("--random-state", type=int, default=42)
+    parser.add_argument("--batch-rows", type=int, default=100_000, help="Rows in the batch latency test")
+    parser.add_argument("--max-iter", type=int, default=HIST_GB_PARAMS["max_iter"])
+    parser.add_argument("--learning-rate", type=float, default=HIST_GB_PARAMS["learning_rate"])
+    parser.add_argument("--max-leaf-nodes", type=int, default=HIST_GB_PARAMS["max_leaf_nodes"])
+    args = parser.parse_args(argv)
+
+    # Compare against the forest actually being served, when there is one
+    served = joblib.load(MODEL_PATH) if os.path.exists(MODEL_PATH) else None
+    if isinstance(served, RandomForestRegressor):
+        rf_params = {k: served.get_params()[k] for k in ("n_estimators", "max_depth", "min_samples_split")}
+    else:
+        rf_params = {"n_estimators": 100, "max_depth": 20, "min_samples_split": 5}
+    hist_gb_params = {"max_iter": args.max_iter, "learning_rate": args.learning_rate,
+                      "max_leaf_nodes": args.max_leaf_nodes}
+
+    print("=" * 80)
+    print("MODEL BACKEND BENCHMARK")
+    print("=" * 80)
+    print(f"   random_forest: {rf_params}")
+    print(f"   hist_gb:       {hist_gb_params} (+ 10th/90th percentile out-of-fold residuals)")
+    results = benchmark_backends(args.data, rf_params, hist_gb_params, args.test_size, args.random_state,
+                                 args.batch_rows)
+
+    print(f"\n{'Backend':<14} {'Features':>8} {'Train (s)':>10} {'Size (KB)':>10} {'Load (ms)':>10} "
+          f"{'1-row (µs)':>11} {f'{args.batch_rows:,} rows (ms)':>16} {'point only':>10} {'MAE':>7} {'Cover':>6}")
+    print("-" * 80)
+    for r in results:
+        print(f"{r['backend']:<14} {r['n_features']:>8} {r['train_s']:>10.2f} {r['size_kb']:>10,.0f} "
+              f"{r['load_ms']:>10.1f} {r['row_us']:>11.0f} {r['batch_ms']:>16.1f} {r['batch_point_ms']:>10.1f} "
+              f"{r['mae']:>7.3f} {r['coverage']:>6.2f}")
+    print("=" * 80)
+    print("   Latencies include the prediction interval, as served by the app, except 'point only';")
+    print("   Cover is the share of test rows inside the 10th-90th percentile interval")
+    print("   Switch with: python model/delay_predictor.py --backend hist_gb")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Staged pipeline with a content-addressed on-disk cache.
+
+Each Stage's cache key is a hash of its name, its parameters, the contents of
+any source files it reads and the keys of the stages it depends on. Keys are
+computed without running anything, so a stage whose key is already in the
+cache is loaded directly and none of its upstream stages are touched: after
+changing only a training hyperparameter, load and encode do not run at all.
+
+Every stage logs its wall time and peak resident memory, whether it ran or
+was served from the cache. Memory is sampled from /proc by a background
+thread rather than traced, which would slow tree building several-fold.
+"""
+
+import hashlib
+import json
+import os
+import resource
+import threading
+import time
+
+import joblib
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(BASE_DIR, "model", ".cache")
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Return the SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_hash(*parts) -> str:
+    """Stable SHA-256 of JSON-serializable parts"""
+    payload = json.dumps(parts, sort_keys=True, default=str).encode()
+    return hashlib.sha256(payload).hexdigest()
+
+
+def current_rss_bytes():
+    """Resident set size from /proc/self/statm, or None where it is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class PeakRSSSampler:
+    """Tracks the highest RSS seen while the block runs"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = current_rss_bytes()
+        if rss is not None:
+            self.peak = rss if self.peak is None else max(self.peak, rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        if self.peak is None:
+            # No /proc: fall back to the process high-water mark (KB on Linux)
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Stage:
+    """One pipeline step: fn(*dependency_outputs, **params)"""
+
+    def __init__(self, name: str, fn, deps=(), params: dict = None, sources=(), validate=None):
+        self.name = name
+        self.fn = fn
+        self.deps = list(deps)
+        self.params = params or {}
+        self.sources = list(sources)
+        # Optional check of a cached output (e.g. files still on disk); False forces a rerun
+        self.validate = validate
+        self._key = None
+
+    @property
+    def key(self) -> str:
+        if self._key is None:
+            self._key = content_hash(
+                self.name,
+                self.params,
+                {os.path.basename(path): file_sha256(path) for path in self.sources},
+                [dep.key for dep in self.deps],
+            )
+        return self._key
+
+
+class Pipeline:
+    """Runs stages on demand, reusing cached outputs whose key is unchanged"""
+
+    def __init__(self, cache_dir: str = CACHE_DIR, use_cache: bool = True):
+        self.cache_dir = cache_dir
+        self.use_cache = use_cache
+        self.log = []
+        self._outputs = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_path(self, stage: Stage) -> str:
+        return os.path.join(self.cache_dir, f"{stage.name}-{stage.key[:16]}.joblib")
+
+    def run(self, stage: Stage):
+        """Return the stage output, computing only what the cache cannot supply"""
+        if stage.key in self._outputs:
+            return self._outputs[stage.key]
+
+        path = self._cache_path(stage)
+        if self.use_cache and os.path.exists(path):
+            start = time.perf_counter()
+            output = joblib.load(path)
+            if stage.validate is None or stage.validate(output):
+                self._record(stage, "cached", time.perf_counter() - start, None)
+                self._outputs[stage.key] = output
+                return output
+
+        inputs = [self.run(dep) for dep in stage.deps]
+
+        with PeakRSSSampler() as memory:
+            start = time.perf_counter()
+            output = stage.fn(*inputs, **stage.params)
+            elapsed = time.perf_counter() - start
+
+        # Write then rename so an interrupted run never leaves a truncated entry
+        tmp_path = path + ".tmp"
+        joblib.dump(output, tmp_path)
+        os.replace(tmp_path, path)
+
+        self._record(stage, "ran", elapsed, memory.peak)
+        self._outputs[stage.key] = output
+        return output
+
+    def _record(self, stage: Stage, status: str, seconds: float, peak_bytes):
+        self.log.append({
+            "stage": stage.name,
+            "status": status,
+            "key": stage.key[:12],
+            "seconds": seconds,
+            "peak_rss_mb": peak_bytes / 1e6 if peak_bytes is not None else None,
+        })
+
+    def print_log(self):
+        print(f"{'Stage':<10} {'Status':<8} {'Key':<14} {'Wall (s)':>9} {'Peak RSS (MB)':>14}")
+        print("-" * 80)
+        for row in self.log:
+            peak = f"{row['peak_rss_mb']:.0f}" if row["peak_rss_mb"] is not None else "-"
+            print(f"{row['stage']:<10} {row['status']:<8} {row['key']:<14} {row['seconds']:>9.3f} {peak:>14}")
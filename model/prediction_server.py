@@ -0,0 +1,279 @@
+"""
+Local prediction server with request micro-batching.
+
+One process owns the model and serves every Streamlit session over localhost
+HTTP. Concurrent single-row requests are queued and coalesced into one batch
+per max-wait window (or until max-batch rows arrive), encoded together and
+evaluated with a single call to the model's evaluator (flattened forest or
+boosting, per the model metadata).
+
+Endpoints:
+    POST /predict   {"features": {...}} or {"rows": [{...}, ...]}; returns
+                    predicted_delay plus the delay_lower/delay_upper interval
+    GET  /metrics   request latency p50/p99, batch-size histogram and the
+                    sha256 of the model and encoder being served
+    GET  /health
+
+Run with:
+    python model/prediction_server.py --port 8765 --max-batch 64 --max-wait-ms 2
+"""
+
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from feature_encoder import FeatureEncoder
+from model_backends import load_predictor, read_metadata
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, "app"))
+
+from model_registry import get_registry
+
+MODEL_PATH = os.path.join(BASE_DIR, "model", "delay_predictor_model.pkl")
+ENCODER_PATH = os.path.join(BASE_DIR, "model", "feature_encoder.joblib")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+REQUEST_TIMEOUT_SECONDS = 10.0
+
+
+class ServerMetrics:
+    """Rolling request latencies and a histogram of executed batch sizes"""
+
+    def __init__(self, window: int = 10_000):
+        self._latencies = deque(maxlen=window)
+        self._batch_sizes = Counter()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+
+    def record_batch(self, size: int, latencies):
+        with self._lock:
+            self.batches += 1
+            self.requests += size
+            # Power-of-two buckets: 1, 2, 4, 8, ...
+            self._batch_sizes[1 << (size - 1).bit_length()] += 1
+            self._latencies.extend(latencies)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            histogram = {f"<={size}": count for size, count in sorted(self._batch_sizes.items())}
+            requests, batches = self.requests, self.batches
+
+        return {
+            "requests": requests,
+            "batches": batches,
+            "mean_batch_size": requests / batches if batches else 0.0,
+            "latency_ms": {
+                "p50": float(np.percentile(latencies, 50)) if len(latencies) else None,
+                "p99": float(np.percentile(latencies, 99)) if len(latencies) else None,
+            },
+            "batch_size_histogram": histogram,
+        }
+
+
+class MicroBatcher:
+    """Coalesces concurrent requests into batches for one model call"""
+
+    def __init__(self, predict_rows, max_batch: int = 64, max_wait_ms: float = 2.0):
+        self.predict_rows = predict_rows
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.metrics = ServerMetrics()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, features: dict) -> Future:
+        future = Future()
+        self._queue.put((features, future, time.perf_counter()))
+        return future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _next_batch(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            try:
+                preds = self.predict_rows([features for features, _, _ in batch])
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                    continue
+                # One bad row (e.g. an unknown category) must not fail the other sessions' requests
+                preds = []
+                for features, future, _ in batch:
+                    try:
+                        preds.append(self.predict_rows([features])[0])
+                    except Exception as row_error:
+                        future.set_exception(row_error)
+                        preds.append(None)
+
+            done = time.perf_counter()
+            for (_, future, _), pred in zip(batch, preds):
+                if not future.done():
+                    future.set_result(pred)
+            self.metrics.record_batch(len(batch), [done - enqueued for _, _, enqueued in batch])
+
+
+class ModelService:
+    """Owns the model and encoder; predicts a list of feature dicts in one pass
+
+    Both artifacts are served through the app's ModelRegistry, so a model
+    published by retrain.py or delay_predictor.py is picked up on the next
+    batch, exactly as the in-process path does.
+    """
+
+    def __init__(self, model_path: str = MODEL_PATH, encoder_path: str = ENCODER_PATH):
+        self.model_registry = get_registry(model_path, loader=load_predictor)
+        self.encoder_registry = get_registry(encoder_path, loader=FeatureEncoder.load)
+        # Load both now, so a broken artifact fails at startup rather than on the first request
+        self.model_registry.current()
+        self.encoder_registry.current()
+
+    def predict_rows(self, rows) -> list:
+        """Return a (prediction, lower, upper) tuple per row"""
+        encoder = self.encoder_registry.get()
+        columns = {col: [row.get(col) for row in rows] for col in encoder.columns}
+        X = encoder.encode(columns)
+        pred, lower, upper = self.model_registry.get().predict_interval(X)
+        return list(zip(pred.tolist(), lower.tolist(), upper.tolist()))
+
+    def stats(self) -> dict:
+        """Which model and encoder versions are being served"""
+        model, encoder = self.model_registry.stats(), self.encoder_registry.stats()
+        return {"model_sha256": model["sha256"], "encoder_sha256": encoder["sha256"],
+                "model_reloads": model["reloads"], "encoder_reloads": encoder["reloads"]}
+
+
+class PredictionHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many sessions connect at once; the default listen backlog of 5 refuses them
+    request_queue_size = 256
+
+
+def make_handler(batcher: MicroBatcher, service: ModelService = None):
+    class PredictionHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status: int, payload: dict):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"status": "ok"})
+            elif self.path == "/metrics":
+                self._send_json(200, {**batcher.metrics.snapshot(), **(service.stats() if service else {})})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                rows = payload["rows"] if "rows" in payload else [payload["features"]]
+                if not isinstance(rows, list) or not rows or not all(isinstance(row, dict) for row in rows):
+                    raise ValueError("rows must be a non-empty list of feature objects")
+            except (ValueError, KeyError, TypeError) as e:
+                self._send_json(400, {"error": f"bad request: {e}"})
+                return
+
+            futures = [batcher.submit(row) for row in rows]
+            try:
+                preds = [f.result(timeout=REQUEST_TIMEOUT_SECONDS) for f in futures]
+            except ValueError as e:
+                # Inputs the encoder rejects, such as a category outside the vocabulary
+                self._send_json(400, {"error": f"bad request: {e}"})
+                return
+            except Exception as e:
+                self._send_json(500, {"error": str(e)})
+                return
+            pred, lower, upper = (list(values) for values in zip(*preds))
+            if "rows" not in payload:
+                pred, lower, upper = pred[0], lower[0], upper[0]
+            self._send_json(200, {"predicted_delay": pred, "delay_lower": lower, "delay_upper": upper})
+
+        def log_message(self, format, *args):
+            # Per-request access logs would dominate the latency we are measuring
+            pass
+
+    return PredictionHandler
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, max_batch: int = 64,
+          max_wait_ms: float = 2.0, model_path: str = MODEL_PATH, encoder_path: str = ENCODER_PATH):
+    service = ModelService(model_path, encoder_path)
+    batcher = MicroBatcher(service.predict_rows, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    server = PredictionHTTPServer((host, port), make_handler(batcher, service))
+
+    print("=" * 80)
+    print("PREDICTION SERVER")
+    print("=" * 80)
+    print(f"   Listening on: http://{host}:{port}")
+    print(f"   Model: {model_path} ({read_metadata(model_path)['backend']})")
+    print(f"   Micro-batching: up to {max_batch} rows, {max_wait_ms} ms max wait")
+    print("=" * 80)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve delay predictions with micro-batching")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-batch", type=int, default=64, help="Largest batch per model call")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="Longest a request waits for a batch to fill")
+    parser.add_argument("--model", default=MODEL_PATH, help="Model pickle or compact .npz artifact")
+    parser.add_argument("--encoder", default=ENCODER_PATH)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.max_batch, args.max_wait_ms, args.model, args.encoder)
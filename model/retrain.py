@@ -0,0 +1,277 @@
+"""
+Incremental retraining from observed outcomes in the patient history.
+
+The app stores every assessment's model inputs in patient_history, and the
+observed delay is recorded later (sidebar → "📝 Record observed delay"),
+which stamps the row with an increasing outcome_seq. This script
+keeps a watermark on outcome_seq in model/versions/manifest.json and only
+reads outcomes recorded since the last successful retrain, so the work
+scales with the new data rather than with the whole history.
+
+The current forest is extended with warm_start: its trees are kept and a few
+new trees are grown on the new rows only (the oldest trees are dropped past
+--max-trees). The candidate is scored against two holdouts the new trees
+never see, the static test split of the training CSV and the most recent
+--holdout-rows history rows with id % 5 == 0, and is published only if neither MAE regresses by more
+than --tolerance. Publishing writes a numbered version under model/versions/,
+swaps it in for model/delay_predictor_model.pkl atomically (the app
+hot-reloads it) and refreshes the compact artifact and the live-preview
+surrogate (see distill.py). A rejected candidate
+leaves the watermark in place, so its rows are retried with the next batch.
+
+Run with:
+    python model/retrain.py
+    python model/retrain.py --trees 20 --tolerance 0.05
+    python model/retrain.py --dry-run
+"""
+
+import argparse
+import copy
+import json
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import train_test_split
+
+from compact_forest import COMPACT_PATH, MAE_TOLERANCE_DAYS, finalize
+from dataset_io import read_dataset
+from distill import SURROGATE_PATH, distill, export
+from feature_encoder import FeatureEncoder, TARGET
+from flat_forest import FlatForest
+from model_backends import load_model, read_metadata, write_metadata
+from pipeline import file_sha256
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(BASE_DIR, "data", "db_data", "patient_history.db")
+DATA_PATH = os.path.join(BASE_DIR, "data", "women_health_dataset.csv")
+MODEL_PATH = os.path.join(BASE_DIR, "model", "delay_predictor_model.pkl")
+ENCODER_PATH = os.path.join(BASE_DIR, "model", "feature_encoder.joblib")
+VERSIONS_DIR = os.path.join(BASE_DIR, "model", "versions")
+
+# History rows with id % HOLDOUT_MODULUS == 0 are never trained on
+HOLDOUT_MODULUS = 5
+NEW_TREES = 10
+MAX_TREES = 200
+MIN_ROWS = 20
+# Most recent history holdout rows scored per retrain; bounds the holdout query as history grows
+HOLDOUT_ROWS = 5000
+
+
+def load_manifest(versions_dir: str) -> dict:
+    path = os.path.join(versions_dir, "manifest.json")
+    if not os.path.exists(path):
+        return {"watermark": 0, "current": None, "versions": []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict, versions_dir: str):
+    path = os.path.join(versions_dir, "manifest.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def fetch_outcomes(db_path: str, watermark: int, holdout_rows: int = HOLDOUT_ROWS):
+    """Return (new rows since the watermark, the most recent holdout_rows history holdout rows)"""
+    con = sqlite3.connect(db_path)
+    try:
+        columns = {row[1] for row in con.execute("PRAGMA table_info(patient_history)")}
+        if "outcome_seq" not in columns:
+            return pd.DataFrame(), pd.DataFrame()
+        # outcome_seq is indexed, so this reads only the new rows however long the history gets
+        new = pd.read_sql_query(
+            "SELECT * FROM patient_history WHERE outcome_seq > ? AND actual_delay IS NOT NULL "
+            "ORDER BY outcome_seq", con, params=(int(watermark),),
+        )
+        # Walks the same index backwards and stops after holdout_rows matches
+        holdout = pd.read_sql_query(
+            "SELECT * FROM patient_history WHERE outcome_seq IS NOT NULL AND actual_delay IS NOT NULL "
+            f"AND id % {HOLDOUT_MODULUS} = 0 ORDER BY outcome_seq DESC LIMIT ?", con, params=(int(holdout_rows),),
+        )
+    finally:
+        con.close()
+    return new, holdout
+
+
+def static_holdout(encoder: FeatureEncoder, data_path: str, test_size: float = 0.2, random_state: int = 42):
+    """The test split used by delay_predictor.py, which the current forest never trained on"""
+    df = read_dataset(data_path)
+    _, X_test, _, y_test = train_test_split(encoder.encode(df), df[TARGET].to_numpy(),
+                                            test_size=test_size, random_state=random_state)
+    return X_test, y_test
+
+
+def grow(model, X, y, new_trees: int, max_trees: int):
+    """Copy of model with new_trees more trees fitted on (X, y), keeping at most max_trees"""
+    candidate = copy.deepcopy(model)
+    # warm_start keeps the fitted trees and only grows the new ones
+    candidate.set_params(warm_start=True, n_estimators=len(candidate.estimators_) + new_trees)
+    candidate.fit(X, y)
+    if len(candidate.estimators_) > max_trees:
+        # The oldest trees saw the least recent data
+        candidate.estimators_ = candidate.estimators_[-max_trees:]
+        candidate.set_params(n_estimators=max_trees)
+    return finalize(candidate)
+
+
+def publish(model, encoder: FeatureEncoder, version: int, versions_dir: str, model_path: str,
+            compact_path: str, encoder_path: str = ENCODER_PATH, surrogate_path: str = SURROGATE_PATH) -> str:
+    """Save a numbered version, then swap it in for the served model and its derived artifacts"""
+    version_path = os.path.join(versions_dir, f"delay_predictor_v{version:04d}.pkl")
+    joblib.dump(model, version_path)
+
+    # Copy then rename: the app's registry never sees a half-written file
+    tmp_path = model_path + ".tmp"
+    shutil.copyfile(version_path, tmp_path)
+    os.replace(tmp_path, model_path)
+    # Only once the new pickle is served; the backend stays random_forest, so the
+    # registry's metadata check passes in between
+    write_metadata(model_path, model, encoder, version=version)
+
+    tmp_path = compact_path + ".tmp.npz"
+    FlatForest.from_sklearn(model).compact().save(tmp_path, compress=True)
+    os.replace(tmp_path, compact_path)
+
+    # The app stops previewing with a surrogate distilled from the previous version
+    export(distill(model, encoder), model_path, encoder_path, surrogate_path)
+    return version_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retrain the delay model on newly observed outcomes")
+    parser.add_argument("--db", default=DB_PATH, help="Patient history SQLite database")
+    parser.add_argument("--model", default=MODEL_PATH, help="Served model to extend and replace")
+    parser.add_argument("--encoder", default=ENCODER_PATH)
+    parser.add_argument("--compact", default=COMPACT_PATH, help="Compact artifact to refresh on publish")
+    parser.add_argument("--surrogate", default=SURROGATE_PATH, help="Live-preview surrogate to refresh on publish")
+    parser.add_argument("--data", default=DATA_PATH, help="Training dataset (for the static holdout)")
+    parser.add_argument("--versions-dir", default=VERSIONS_DIR)
+    parser.add_argument("--trees", type=int, default=NEW_TREES, help="Trees grown on the new rows")
+    parser.add_argument("--max-trees", type=int, default=MAX_TREES, help="Oldest trees are dropped past this")
+    parser.add_argument("--min-rows", type=int, default=MIN_ROWS, help="New training rows needed to retrain")
+    parser.add_argument("--holdout-rows", type=int, default=HOLDOUT_ROWS,
+                        help="Most recent history holdout rows to score the candidate on")
+    parser.add_argument("--tolerance", type=float, default=MAE_TOLERANCE_DAYS,
+                        help="Largest MAE increase (days) accepted on either holdout")
+    parser.add_argument("--dry-run", action="store_true", help="Evaluate the candidate but publish nothing")
+    args = parser.parse_args(argv)
+
+    print("=" * 80)
+    print("INCREMENTAL RETRAINING FROM PATIENT HISTORY")
+    print("=" * 80)
+
+    if not os.path.exists(args.db):
+        print(f"❌ No patient history database at {args.db}")
+        return 1
+
+    os.makedirs(args.versions_dir, exist_ok=True)
+    manifest = load_manifest(args.versions_dir)
+    watermark = manifest["watermark"]
+
+    start = time.perf_counter()
+    new, history_holdout = fetch_outcomes(args.db, watermark, args.holdout_rows)
+    train_rows = new[new["id"] % HOLDOUT_MODULUS != 0] if len(new) else new
+    fetch_seconds = time.perf_counter() - start
+    print(f"\n📥 Outcomes since watermark {watermark}: {len(new)} "
+          f"({len(train_rows)} for training, {len(new) - len(train_rows)} held out)")
+    print(f"   History holdout: {len(history_holdout)} rows")
+
+    if len(train_rows) < args.min_rows:
+        print(f"\n⏸️  Need at least {args.min_rows} new training rows; nothing to do")
+        return 0
+
+    backend = read_metadata(args.model)["backend"]
+    if backend != "random_forest":
+        # Growing trees with warm_start is specific to the forest
+        print(f"❌ {args.model} is a {backend} model; incremental retraining needs the random forest")
+        return 1
+    encoder = FeatureEncoder.load(args.encoder)
+    model = load_model(args.model)
+    # Assessments saved while the sidebar still offered options outside the vocabulary
+    # ("other" contraception, "low" mood) cannot be encoded; leave them out
+    unknown_train, unknown_holdout = encoder.unknown_rows(train_rows), encoder.unknown_rows(history_holdout)
+    if unknown_train.any() or unknown_holdout.any():
+        print(f"⚠️  Skipping {unknown_train.sum() + unknown_holdout.sum()} rows with categories outside "
+              f"the encoder's vocabulary")
+        train_rows, history_holdout = train_rows[~unknown_train], history_holdout[~unknown_holdout]
+
+    start = time.perf_counter()
+    X_new = encoder.encode(train_rows)
+    y_new = train_rows["actual_delay"].to_numpy(dtype=float)
+    candidate = grow(model, X_new, y_new, args.trees, args.max_trees)
+    fit_seconds = time.perf_counter() - start
+    print(f"\n🌲 Grew {args.trees} trees on {len(train_rows)} rows in {fit_seconds:.2f}s "
+          f"({len(model.estimators_)} → {len(candidate.estimators_)} trees)")
+
+    start = time.perf_counter()
+    holdouts = {"static": static_holdout(encoder, args.data)}
+    if len(history_holdout):
+        holdouts["history"] = (encoder.encode(history_holdout), history_holdout["actual_delay"].to_numpy(dtype=float))
+    metrics = {}
+    for name, (X, y) in holdouts.items():
+        metrics[name] = {
+            "rows": len(y),
+            "current_mae": float(mean_absolute_error(y, model.predict(X))),
+            "candidate_mae": float(mean_absolute_error(y, candidate.predict(X))),
+        }
+    evaluate_seconds = time.perf_counter() - start
+
+    print(f"\n{'Holdout':<10} {'Rows':>7} {'Current MAE':>12} {'Candidate MAE':>14} {'Change':>9}")
+    print("-" * 80)
+    for name, m in metrics.items():
+        change = m["candidate_mae"] - m["current_mae"]
+        print(f"{name:<10} {m['rows']:>7,} {m['current_mae']:>12.3f} {m['candidate_mae']:>14.3f} {change:>+9.3f}")
+    print("-" * 80)
+
+    regressed = [name for name, m in metrics.items() if m["candidate_mae"] > m["current_mae"] + args.tolerance]
+    if regressed:
+        print(f"❌ MAE regressed by more than {args.tolerance:.3f} days on: {', '.join(regressed)}; "
+              f"not published (watermark stays at {watermark})")
+    elif args.dry_run:
+        print(f"✅ Candidate passes the gate (dry run, nothing published)")
+    else:
+        start = time.perf_counter()
+        if not manifest["versions"]:
+            # Keep the model we started from, so the first retrain can be rolled back too
+            shutil.copyfile(args.model, os.path.join(args.versions_dir, "delay_predictor_v0000.pkl"))
+            manifest["versions"].append({
+                "version": 0, "path": "delay_predictor_v0000.pkl", "created": datetime.now().isoformat(),
+                "watermark": watermark, "n_trees": len(model.estimators_), "sha256": file_sha256(args.model),
+            })
+        version = manifest["versions"][-1]["version"] + 1
+        version_path = publish(candidate, encoder, version, args.versions_dir, args.model, args.compact,
+                               args.encoder, args.surrogate)
+        new_watermark = int(new["outcome_seq"].max())
+        manifest["versions"].append({
+            "version": version,
+            "path": os.path.basename(version_path),
+            "created": datetime.now().isoformat(),
+            "watermark": new_watermark,
+            "new_rows": len(train_rows),
+            "n_trees": len(candidate.estimators_),
+            "metrics": metrics,
+            "sha256": file_sha256(version_path),
+        })
+        manifest["watermark"] = new_watermark
+        manifest["current"] = version
+        save_manifest(manifest, args.versions_dir)
+        publish_seconds = time.perf_counter() - start
+        print(f"✅ Published version {version} → {args.model} (watermark {watermark} → {new_watermark}, "
+              f"{publish_seconds:.2f}s)")
+
+    print(f"\n⏱️  Fetch {fetch_seconds:.3f}s, fit {fit_seconds:.3f}s, evaluate {evaluate_seconds:.3f}s")
+    print("=" * 80)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
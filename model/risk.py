@@ -0,0 +1,44 @@
+"""
+Risk bands for a predicted cycle delay, shared by the app and batch scoring.
+"""
+
+import numpy as np
+
+# Upper bounds (inclusive, in days) of the Low and Moderate bands
+LOW_RISK_MAX_DAYS = 1.5
+MODERATE_RISK_MAX_DAYS = 4
+
+RISK_LEVELS = ["Low", "Moderate", "High"]
+INTERPRETATIONS = ["Normal variation", "Slight delay likely", "Irregularity risk"]
+
+
+def risk_level(days: float) -> str:
+    """Determine risk level based on predicted delay"""
+    if days <= LOW_RISK_MAX_DAYS:
+        return "Low"
+    elif days <= MODERATE_RISK_MAX_DAYS:
+        return "Moderate"
+    return "High"
+
+
+def interpretation(days: float) -> str:
+    """Provide clinical interpretation of the prediction"""
+    if days <= LOW_RISK_MAX_DAYS:
+        return "Normal variation"
+    elif days <= MODERATE_RISK_MAX_DAYS:
+        return "Slight delay likely"
+    return "Irregularity risk"
+
+
+def risk_band(days) -> np.ndarray:
+    """Vectorized band index (0=Low, 1=Moderate, 2=High) for an array of delays"""
+    days = np.asarray(days)
+    return (days > LOW_RISK_MAX_DAYS).astype(np.int8) + (days > MODERATE_RISK_MAX_DAYS)
+
+
+def risk_levels(days) -> np.ndarray:
+    return np.asarray(RISK_LEVELS, dtype=object)[risk_band(days)]
+
+
+def interpretations(days) -> np.ndarray:
+    return np.asarray(INTERPRETATIONS, dtype=object)[risk_band(days)]
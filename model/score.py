@@ -0,0 +1,411 @@
+"""
+Batch scoring CLI for whole cohorts.
+
+Streams a CSV, Parquet or SQLite input in fixed-size chunks, encodes each
+chunk in one vectorized pass with the shared FeatureEncoder, calls the model
+once per chunk and attaches predicted_delay / risk_level / interpretation
+using the dashboard's thresholds. Memory is bounded by the chunk size, not
+the input size. With --intervals every chunk also gets delay_lower /
+delay_upper (10th-90th percentile): a random forest is flattened once and
+the interval comes from the same single evaluation of all trees, a hist_gb
+model (see model_backends.py) adds its out-of-fold residual percentiles.
+
+With --workers N the chunks are scored by a process pool. The model is
+loaded once in the parent and forked workers inherit it copy-on-write (on
+platforms without fork, workers map it with joblib.load(mmap_mode="r")).
+At most 2 x N chunks are in flight and results are written back in input
+order, so the output is identical to a single-process run.
+
+Examples:
+    python model/score.py data/women_health_dataset.csv --output scores.parquet
+    python model/score.py data/db_data/patient_history.db --output scores.csv
+    python model/score.py big.csv --output scores.db --output-table scores --chunksize 200000
+    python model/score.py big.csv --output scores.parquet --workers 8
+    python model/score.py big.csv --output scores.parquet --intervals
+    python model/score.py --bench-workers 1,2,4,8 --bench-rows 2000000
+"""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from collections import deque
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from dataset_io import read_dataset
+from feature_encoder import FeatureEncoder
+from model_backends import load_model, predictor_for
+from risk import risk_levels, interpretations
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_PATH = os.path.join(BASE_DIR, "model", "delay_predictor_model.pkl")
+ENCODER_PATH = os.path.join(BASE_DIR, "model", "feature_encoder.joblib")
+
+DEFAULT_CHUNKSIZE = 100_000
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB"""
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def private_mb():
+    """Memory private to this process (USS) in MB, or None where /proc is unavailable"""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return None
+    kb = sum(int(fields[key].split()[0]) for key in ("Private_Clean", "Private_Dirty") if key in fields)
+    return kb / 1024
+
+
+def _file_kind(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext in SQLITE_EXTENSIONS:
+        return "sqlite"
+    if ext in (".parquet", ".pq"):
+        return "parquet"
+    if ext == ".csv":
+        return "csv"
+    raise ValueError(f"Unsupported file type '{ext}' for {path} (use .csv, .parquet or .db)")
+
+
+def iter_sqlite(path: str, table: str, chunksize: int):
+    """
+    Page through a table by rowid. Each page is its own short query, so no
+    read transaction stays open while results are written to the same file.
+    """
+    con = sqlite3.connect(path)
+    try:
+        last_rowid = -1
+        while True:
+            chunk = pd.read_sql_query(
+                f"SELECT rowid AS _rowid, * FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                con,
+                params=(last_rowid, chunksize),
+            )
+            if chunk.empty:
+                return
+            last_rowid = int(chunk["_rowid"].iloc[-1])
+            yield chunk.drop(columns="_rowid")
+    finally:
+        con.close()
+
+
+def iter_input(path: str, chunksize: int = DEFAULT_CHUNKSIZE, table: str = "patient_history"):
+    """Yield the input as DataFrame chunks of at most chunksize rows"""
+    kind = _file_kind(path)
+    if kind == "csv":
+        yield from pd.read_csv(path, chunksize=chunksize)
+    elif kind == "parquet":
+        import pyarrow.parquet as pq
+
+        # pre_buffer keeps every column chunk read so far cached; without it memory stays flat
+        for batch in pq.ParquetFile(path, pre_buffer=False).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from iter_sqlite(path, table, chunksize)
+
+
+class OutputWriter:
+    """Appends scored chunks to a CSV, Parquet or SQLite output"""
+
+    def __init__(self, path: str, table: str = "scores"):
+        self.path = path
+        self.table = table
+        self.kind = _file_kind(path)
+        self._parquet = None
+        self._con = None
+        self._started = False
+
+        if self.kind == "sqlite":
+            self._con = sqlite3.connect(path)
+            self._con.execute(f"DROP TABLE IF EXISTS {table}")
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def write(self, df: pd.DataFrame):
+        if self.kind == "csv":
+            df.to_csv(self.path, mode="a", header=not self._started, index=False)
+        elif self.kind == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table.cast(self._parquet.schema))
+        else:
+            df.to_sql(self.table, self._con, if_exists="append", index=False)
+            self._con.commit()
+        self._started = True
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+        if self._con is not None:
+            self._con.close()
+
+
+def attach_scores(chunk: pd.DataFrame, pred: np.ndarray) -> pd.DataFrame:
+    """Return chunk with predicted_delay, risk_level and interpretation columns
+
+    A 2-D pred of (prediction, lower, upper) rows also adds delay_lower / delay_upper.
+    """
+    scored = chunk.copy()
+    if pred.ndim == 2:
+        pred, lower, upper = pred.T
+        scored["predicted_delay"] = pred
+        scored["delay_lower"] = lower
+        scored["delay_upper"] = upper
+    else:
+        scored["predicted_delay"] = pred
+    scored["risk_level"] = risk_levels(pred)
+    scored["interpretation"] = interpretations(pred)
+    return scored
+
+
+def predict_chunk(model, encoder: FeatureEncoder, chunk: pd.DataFrame, buffer: np.ndarray = None,
+                  intervals: bool = False) -> np.ndarray:
+    """Encode a chunk in one pass and call the model once
+
+    With intervals=True returns an (n, 3) array of (prediction, lower, upper).
+    """
+    out = buffer[:len(chunk)] if buffer is not None and len(buffer) >= len(chunk) else None
+    X = encoder.encode(chunk, out=out)
+    if not intervals:
+        return np.maximum(model.predict(X), 0.0)
+    pred, lower, upper = predictor_for(model).predict_interval(X)
+    return np.maximum(np.stack([pred, lower, upper], axis=1), 0.0)
+
+
+def score_chunk(model, encoder: FeatureEncoder, chunk: pd.DataFrame, buffer: np.ndarray = None,
+                intervals: bool = False) -> pd.DataFrame:
+    """Encode, predict and attach risk columns to one chunk"""
+    return attach_scores(chunk, predict_chunk(model, encoder, chunk, buffer, intervals))
+
+
+# Set in the parent before forking, so workers share the parent's copy
+_worker_model = None
+_worker_encoder = None
+_worker_intervals = False
+
+
+def _init_worker(model_path: str, encoder_path: str, intervals: bool = False):
+    """Initializer for non-fork start methods: map the model read-only instead of copying"""
+    global _worker_model, _worker_encoder, _worker_intervals
+    if _worker_model is None:
+        _worker_model = joblib.load(model_path, mmap_mode="r")
+        _worker_encoder = FeatureEncoder.load(encoder_path)
+        _worker_intervals = intervals
+        if intervals:
+            _worker_model = predictor_for(_worker_model)
+
+
+def _predict_in_worker(chunk: pd.DataFrame):
+    pred = predict_chunk(_worker_model, _worker_encoder, chunk, intervals=_worker_intervals)
+    return pred, os.getpid(), private_mb()
+
+
+class ChunkScorer:
+    """Scores a stream of chunks in-process or across a worker pool, preserving order"""
+
+    def __init__(self, model, encoder: FeatureEncoder, workers: int = 1,
+                 model_path: str = MODEL_PATH, encoder_path: str = ENCODER_PATH, intervals: bool = False):
+        # Intervals need the per-tree outputs, so flatten a forest once up front
+        self.model = predictor_for(model) if intervals else model
+        self.encoder = encoder
+        self.intervals = intervals
+        self.workers = max(1, int(workers))
+        self.worker_private_mb = {}
+        self._pool = None
+
+        if self.workers > 1:
+            global _worker_model, _worker_encoder, _worker_intervals
+            _worker_model, _worker_encoder, _worker_intervals = self.model, encoder, intervals
+            methods = multiprocessing.get_all_start_methods()
+            ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+            self._pool = ctx.Pool(self.workers, initializer=_init_worker,
+                                  initargs=(model_path, encoder_path, intervals))
+
+    def predictions(self, chunks):
+        """Yield (chunk, predictions) in input order"""
+        if self._pool is None:
+            buffer = None
+            for chunk in chunks:
+                if buffer is None or len(buffer) < len(chunk):
+                    buffer = np.empty((len(chunk), self.encoder.n_features), dtype=np.float32)
+                yield chunk, predict_chunk(self.model, self.encoder, chunk, buffer, self.intervals)
+            return
+
+        # Bounded window of in-flight chunks keeps memory flat for any input size
+        pending = deque()
+        for chunk in chunks:
+            pending.append((chunk, self._pool.apply_async(_predict_in_worker, (chunk,))))
+            if len(pending) >= 2 * self.workers:
+                yield self._collect(*pending.popleft())
+        while pending:
+            yield self._collect(*pending.popleft())
+
+    def _collect(self, chunk, result):
+        pred, pid, mb = result.get()
+        if mb is not None:
+            self.worker_private_mb[pid] = max(mb, self.worker_private_mb.get(pid, 0.0))
+        return chunk, pred
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+
+def score(input_path: str, output_path: str, chunksize: int = DEFAULT_CHUNKSIZE,
+          table: str = "patient_history", output_table: str = "scores",
+          model_path: str = MODEL_PATH, encoder_path: str = ENCODER_PATH,
+          workers: int = 1, intervals: bool = False, verbose: bool = True) -> dict:
+    """Score input_path into output_path; returns throughput statistics"""
+    model = load_model(model_path)
+    encoder = FeatureEncoder.load(encoder_path)
+
+    writer = OutputWriter(output_path, table=output_table)
+    rows = 0
+    start = time.perf_counter()
+    try:
+        with ChunkScorer(model, encoder, workers, model_path, encoder_path, intervals) as scorer:
+            chunks = iter_input(input_path, chunksize, table)
+            for i, (chunk, pred) in enumerate(scorer.predictions(chunks), 1):
+                writer.write(attach_scores(chunk, pred))
+                rows += len(chunk)
+                if verbose:
+                    elapsed = time.perf_counter() - start
+                    print(f"   Chunk {i}: {rows:,} rows scored ({rows / elapsed:,.0f} rows/sec)")
+            scorer.close()
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "rows": rows,
+        "seconds": elapsed,
+        "rows_per_sec": rows / elapsed if elapsed > 0 else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "worker_private_mb": scorer.worker_private_mb,
+    }
+
+
+def synthetic_cohort(n_rows: int, seed: int = 42, data_path: str = None) -> pd.DataFrame:
+    """Resample the synthetic training dataset up to n_rows rows"""
+    data_path = data_path or os.path.join(BASE_DIR, "data", "women_health_dataset.csv")
+    df = read_dataset(data_path)
+    rng = np.random.default_rng(seed)
+    return df.iloc[rng.integers(0, len(df), n_rows)].reset_index(drop=True)
+
+
+def benchmark_workers(worker_counts, n_rows: int = 1_000_000, chunksize: int = DEFAULT_CHUNKSIZE,
+                      model_path: str = MODEL_PATH, encoder_path: str = ENCODER_PATH) -> list:
+    """Scoring throughput for each worker count on an in-memory synthetic cohort"""
+    model = load_model(model_path)
+    encoder = FeatureEncoder.load(encoder_path)
+    cohort = synthetic_cohort(n_rows)
+    chunks = [cohort.iloc[i:i + chunksize] for i in range(0, n_rows, chunksize)]
+
+    results = []
+    for workers in worker_counts:
+        with ChunkScorer(model, encoder, workers, model_path, encoder_path) as scorer:
+            start = time.perf_counter()
+            for _ in scorer.predictions(chunks):
+                pass
+            elapsed = time.perf_counter() - start
+            scorer.close()
+        private = list(scorer.worker_private_mb.values())
+        results.append({
+            "workers": workers,
+            "rows_per_sec": n_rows / elapsed,
+            "max_worker_private_mb": max(private) if private else None,
+        })
+
+    base = results[0]["rows_per_sec"] / results[0]["workers"]
+    for row in results:
+        row["speedup"] = row["rows_per_sec"] / results[0]["rows_per_sec"]
+        row["efficiency"] = row["rows_per_sec"] / (base * row["workers"])
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a cohort with the delay prediction model")
+    parser.add_argument("input", nargs="?", help="Input .csv, .parquet or SQLite .db file")
+    parser.add_argument("--output", "-o", help="Output .csv, .parquet or SQLite .db file")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows per chunk")
+    parser.add_argument("--table", default="patient_history", help="Input table for SQLite inputs")
+    parser.add_argument("--output-table", default="scores", help="Output table for SQLite outputs")
+    parser.add_argument("--model", default=MODEL_PATH, help="Model pickle")
+    parser.add_argument("--encoder", default=ENCODER_PATH, help="Feature encoder")
+    parser.add_argument("--workers", "-j", type=int, default=1, help="Worker processes (default: 1)")
+    parser.add_argument("--intervals", action="store_true",
+                        help="Also write delay_lower/delay_upper (10th-90th percentile across trees)")
+    parser.add_argument("--bench-workers", help="Comma-separated worker counts to benchmark, e.g. 1,2,4,8")
+    parser.add_argument("--bench-rows", type=int, default=1_000_000, help="Synthetic rows for the benchmark")
+    args = parser.parse_args(argv)
+
+    if args.bench_workers:
+        worker_counts = [int(w) for w in args.bench_workers.split(",")]
+        print("=" * 80)
+        print(f"SCORING SCALING BENCHMARK ({args.bench_rows:,} synthetic rows, {os.cpu_count()} CPUs)")
+        print("=" * 80)
+        model_mb = os.path.getsize(args.model) / 1e6
+        print(f"{'Workers':>8} {'Rows/sec':>14} {'Speedup':>9} {'Efficiency':>11} {'Worker USS (MB)':>16}")
+        print("-" * 80)
+        for row in benchmark_workers(worker_counts, args.bench_rows, args.chunksize, args.model, args.encoder):
+            uss = f"{row['max_worker_private_mb']:.0f}" if row["max_worker_private_mb"] else "-"
+            print(f"{row['workers']:>8} {row['rows_per_sec']:>14,.0f} {row['speedup']:>8.2f}x "
+                  f"{row['efficiency']:>10.0%} {uss:>16}")
+        print("-" * 80)
+        print(f"   Model file: {model_mb:.1f} MB (shared with workers, not copied into their USS)")
+        print("=" * 80)
+        return
+
+    if not args.input or not args.output:
+        parser.error("input and --output are required unless --bench-workers is given")
+
+    print("=" * 80)
+    print("BATCH SCORING")
+    print("=" * 80)
+    print(f"   Input:  {args.input}")
+    print(f"   Output: {args.output}")
+    print(f"   Chunk size: {args.chunksize:,} rows")
+    print(f"   Workers: {args.workers}")
+    print(f"   Intervals: {'10th-90th percentile across trees' if args.intervals else 'off'}\n")
+
+    stats = score(args.input, args.output, args.chunksize, args.table, args.output_table,
+                  args.model, args.encoder, args.workers, args.intervals)
+
+    print(f"\n✅ Scored {stats['rows']:,} rows in {stats['seconds']:.2f}s")
+    print(f"   Throughput: {stats['rows_per_sec']:,.0f} rows/sec")
+    print(f"   Peak RSS:   {stats['peak_rss_mb']:.0f} MB (parent)")
+    if stats["worker_private_mb"]:
+        print(f"   Worker USS: {max(stats['worker_private_mb'].values()):.0f} MB max per worker")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
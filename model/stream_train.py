@@ -0,0 +1,321 @@
+"""
+Out-of-core training for datasets larger than memory.
+
+The dataset (CSV, Parquet or Feather, see dataset_io.py) is read once in
+fixed-size chunks with its fixed schema: compact numerics, and categoricals
+as pandas categoricals over the encoder's fixed vocabularies, so no chunk can
+add a column. Each chunk's numerics are appended to a raw float32 file and
+its categoricals, already final codes, to a uint8 file, while a uniform
+reservoir sample of SAMPLE_ROWS rows across all chunks collects the values the
+bin edges are fitted on (features with few distinct values get one bin each).
+The raw numerics are then binned from a memory map into a uint8 code per
+feature. Training memory-maps the codes batch by batch, so the data is parsed
+only once however many epochs run, and no more than one batch is resident at
+a time.
+
+The model is an SGDRegressor trained with partial_fit on the one-hot bins
+(sparse, one non-zero per feature), i.e. an additive model with a learned
+step function per input. The saved artifact is plain data: bin edges,
+vocabularies and one weight per bin, so predicting is a table lookup. It is an
+experiment for datasets the forest cannot be trained on: the app, the
+prediction server and batch scoring do not load it (model_backends.py has no
+backend for it, and it has no prediction interval).
+
+Run with:
+    python model/stream_train.py --make-synthetic 50000000 --data big.csv
+    python model/stream_train.py --data big.csv --epochs 3
+"""
+
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.linear_model import SGDRegressor
+
+from dataset_io import DatasetWriter, iter_dataset, read_dataset, vocab_codes
+from feature_encoder import CATEGORICAL_FEATURES, NUMERIC_FEATURES, TARGET
+from pipeline import PeakRSSSampler, current_rss_bytes
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(BASE_DIR, "data", "women_health_dataset.csv")
+OUTPUT_PATH = os.path.join(BASE_DIR, "model", "delay_predictor_streaming.joblib")
+WORK_DIR = os.path.join(BASE_DIR, "model", ".cache", "stream")
+
+CHUNKSIZE = 1_000_000
+BATCH_ROWS = 100_000
+# Numeric features get at most this many bins, so codes (plus 0 for missing) fit in a uint8
+MAX_BINS = 255
+# Samples seen before SGD starts averaging its weights
+AVERAGE_AFTER = 1_000_000
+# Rows of the uniform sample, across all chunks, that the numeric bin edges are fitted on
+SAMPLE_ROWS = 1_000_000
+
+
+class Reservoir:
+    """Uniform sample of up to size rows from a stream of chunks
+
+    Every row gets a random key and the size smallest keys seen so far are kept,
+    so each row is equally likely to end up in the sample whatever chunk it came in.
+    """
+
+    def __init__(self, size: int = SAMPLE_ROWS, seed: int = 42):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.keys = np.empty(0)
+        self.rows = None
+
+    def add(self, rows: np.ndarray):
+        keys = np.concatenate([self.keys, self.rng.random(len(rows))])
+        rows = rows if self.rows is None else np.concatenate([self.rows, rows])
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size)[:self.size]
+            keys, rows = keys[keep], rows[keep]
+        self.keys, self.rows = keys, rows
+
+
+class StreamBinner:
+    """Maps raw inputs to one uint8 bin code per feature with fixed edges and vocabularies"""
+
+    def __init__(self, edges: dict, categorical: dict = None):
+        self.edges = {col: np.asarray(e, dtype=np.float32) for col, e in edges.items()}
+        self.categorical = {col: list(vocab) for col, vocab in (categorical or CATEGORICAL_FEATURES).items()}
+        self.columns = list(self.edges) + list(self.categorical)
+        # Bins per feature, including the missing / unknown bin
+        self.n_bins = [len(e) + 2 for e in self.edges.values()] + [len(v) + 1 for v in self.categorical.values()]
+        self.offsets = np.concatenate([[0], np.cumsum(self.n_bins)[:-1]]).astype(np.int64)
+
+    @classmethod
+    def fit(cls, sample: pd.DataFrame, max_bins: int = MAX_BINS) -> "StreamBinner":
+        edges = {}
+        for col in NUMERIC_FEATURES:
+            values = sample[col].dropna().to_numpy(dtype=np.float64)
+            distinct = np.unique(values)
+            if len(distinct) <= max_bins:
+                # One bin per value: split halfway between neighbours
+                edges[col] = (distinct[:-1] + distinct[1:]) / 2
+            else:
+                edges[col] = np.unique(np.quantile(values, np.linspace(0, 1, max_bins + 1)[1:-1]))
+        return cls(edges)
+
+    @property
+    def total_bins(self) -> int:
+        return int(sum(self.n_bins))
+
+    def numeric_codes(self, values: np.ndarray) -> np.ndarray:
+        """Bin codes of a float32 (n_rows, n_numeric) array in the edges' column order; 0 is missing"""
+        codes = np.zeros(values.shape, dtype=np.uint8)
+        for j, edges in enumerate(self.edges.values()):
+            codes[:, j] = np.where(np.isnan(values[:, j]), 0, np.searchsorted(edges, values[:, j], side="right") + 1)
+        return codes
+
+    def categorical_codes(self, chunk: pd.DataFrame) -> np.ndarray:
+        codes = np.zeros((len(chunk), len(self.categorical)), dtype=np.uint8)
+        for j, (col, vocab) in enumerate(self.categorical.items()):
+            # Category code -1 (missing or outside the vocabulary) lands in bin 0
+            codes[:, j] = vocab_codes(chunk[col], vocab) + 1
+        return codes
+
+    def transform(self, chunk: pd.DataFrame) -> np.ndarray:
+        numeric = chunk[list(self.edges)].to_numpy(dtype=np.float32, na_value=np.nan)
+        return np.hstack([self.numeric_codes(numeric), self.categorical_codes(chunk)])
+
+    def one_hot(self, codes: np.ndarray) -> sp.csr_matrix:
+        n_rows, n_cols = codes.shape
+        indices = (codes.astype(np.int64) + self.offsets).ravel()
+        indptr = np.arange(0, n_rows * n_cols + 1, n_cols, dtype=np.int64)
+        return sp.csr_matrix((np.ones(len(indices), dtype=np.float64), indices, indptr),
+                             shape=(n_rows, self.total_bins))
+
+    def to_dict(self) -> dict:
+        return {"edges": {col: e.tolist() for col, e in self.edges.items()}, "categorical": self.categorical}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "StreamBinner":
+        return cls(state["edges"], state["categorical"])
+
+
+class BinnedAdditiveModel:
+    """Prediction = intercept + one learned weight per (feature, bin); experimental, not a serving backend"""
+
+    def __init__(self, binner: StreamBinner, weights: np.ndarray, intercept: float):
+        self.binner = binner
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.intercept = float(intercept)
+
+    def predict_codes(self, codes: np.ndarray) -> np.ndarray:
+        return self.intercept + self.weights[codes.astype(np.int64) + self.binner.offsets].sum(axis=1)
+
+    def predict(self, df: pd.DataFrame) -> np.ndarray:
+        return self.predict_codes(self.binner.transform(df))
+
+    def save(self, path: str):
+        # Plain data, like the feature encoder: loading never depends on this module's import path
+        joblib.dump({"binner": self.binner.to_dict(), "weights": self.weights, "intercept": self.intercept}, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BinnedAdditiveModel":
+        state = joblib.load(path)
+        return cls(StreamBinner.from_dict(state["binner"]), state["weights"], state["intercept"])
+
+
+def read_chunks(data_path: str, chunksize: int = CHUNKSIZE):
+    return iter_dataset(data_path, chunksize, columns=NUMERIC_FEATURES + list(CATEGORICAL_FEATURES) + [TARGET])
+
+
+def bin_to_disk(data_path: str, work_dir: str, chunksize: int = CHUNKSIZE, sample_rows: int = SAMPLE_ROWS,
+                seed: int = 42):
+    """Stream the dataset once into uint8 codes and float32 targets on disk; returns (binner, n_rows)
+
+    Bin edges are fitted on a reservoir sample of the whole file, so the raw
+    numerics are kept on disk until the last chunk has been read.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    numeric_path = os.path.join(work_dir, "numeric.f32")
+    categorical_path = os.path.join(work_dir, "categorical.u8")
+    # Only the categorical codes are needed up front, and they do not depend on the edges
+    binner = StreamBinner({col: [] for col in NUMERIC_FEATURES})
+    reservoir = Reservoir(sample_rows, seed)
+    n_rows = 0
+    with open(numeric_path, "wb") as numeric_file, open(categorical_path, "wb") as categorical_file, \
+            open(os.path.join(work_dir, "target.f32"), "wb") as target_file:
+        for chunk in read_chunks(data_path, chunksize):
+            numeric = chunk[NUMERIC_FEATURES].to_numpy(dtype=np.float32, na_value=np.nan)
+            numeric.tofile(numeric_file)
+            reservoir.add(numeric)
+            binner.categorical_codes(chunk).tofile(categorical_file)
+            chunk[TARGET].to_numpy(dtype=np.float32).tofile(target_file)
+            n_rows += len(chunk)
+
+    binner = StreamBinner.fit(pd.DataFrame(reservoir.rows, columns=NUMERIC_FEATURES))
+    n_numeric, n_categorical = len(NUMERIC_FEATURES), len(binner.categorical)
+    with open(os.path.join(work_dir, "codes.u8"), "wb") as codes_file:
+        for start in range(0, n_rows, chunksize):
+            stop = min(start + chunksize, n_rows)
+            numeric = np.memmap(numeric_path, dtype=np.float32, mode="r", offset=start * n_numeric * 4,
+                                shape=(stop - start, n_numeric))
+            categorical = np.memmap(categorical_path, dtype=np.uint8, mode="r", offset=start * n_categorical,
+                                    shape=(stop - start, n_categorical))
+            np.hstack([binner.numeric_codes(numeric), categorical]).tofile(codes_file)
+            del numeric, categorical
+    os.remove(numeric_path)
+    os.remove(categorical_path)
+    return binner, n_rows
+
+
+def read_batch(work_dir: str, n_cols: int, start: int, stop: int):
+    """Map only rows [start, stop); the mapping is released when the arrays are dropped"""
+    codes = np.memmap(os.path.join(work_dir, "codes.u8"), dtype=np.uint8, mode="r",
+                      offset=start * n_cols, shape=(stop - start, n_cols))
+    target = np.memmap(os.path.join(work_dir, "target.f32"), dtype=np.float32, mode="r",
+                       offset=start * 4, shape=(stop - start,))
+    return np.array(codes), np.array(target, dtype=np.float64)
+
+
+def train(binner: StreamBinner, work_dir: str, n_rows: int, epochs: int = 3, batch_rows: int = BATCH_ROWS,
+          holdout_rows: int = 200_000, random_state: int = 42) -> dict:
+    """Epochs of partial_fit over shuffled batches; the last holdout_rows rows are only scored"""
+    n_cols = len(binner.columns)
+    holdout_rows = min(holdout_rows, n_rows // 5)
+    n_train = n_rows - holdout_rows
+    batches = [(start, min(start + batch_rows, n_train)) for start in range(0, n_train, batch_rows)]
+
+    # A constant step keeps rare bins (e.g. skipped cycles) learning; averaging starts once
+    # the weights have settled, which smooths out the step noise
+    sgd = SGDRegressor(alpha=1e-7, learning_rate="constant", eta0=0.05, average=AVERAGE_AFTER,
+                       random_state=random_state)
+    rng = np.random.default_rng(random_state)
+    history = []
+    for epoch in range(1, epochs + 1):
+        start_time = time.perf_counter()
+        for b in rng.permutation(len(batches)):
+            codes, y = read_batch(work_dir, n_cols, *batches[b])
+            sgd.partial_fit(binner.one_hot(codes), y)
+        seconds = time.perf_counter() - start_time
+
+        model = BinnedAdditiveModel(binner, sgd.coef_, sgd.intercept_[0])
+        abs_error = 0.0
+        for start in range(n_train, n_rows, batch_rows):
+            codes, y = read_batch(work_dir, n_cols, start, min(start + batch_rows, n_rows))
+            abs_error += np.abs(model.predict_codes(codes) - y).sum()
+        history.append({
+            "epoch": epoch,
+            "seconds": seconds,
+            "rows_per_sec": n_train / seconds,
+            "holdout_mae": abs_error / max(holdout_rows, 1),
+            "rss_mb": (current_rss_bytes() or 0) / 1e6,
+        })
+    return {"model": model, "history": history, "train_rows": n_train, "holdout_rows": holdout_rows}
+
+
+def write_synthetic(path: str, n_rows: int, seed: int = 42, chunksize: int = CHUNKSIZE,
+                    source_path: str = DATA_PATH):
+    """Resample the training dataset up to n_rows rows, one chunk in memory at a time"""
+    source = read_dataset(source_path)
+    rng = np.random.default_rng(seed)
+    with DatasetWriter(path) as writer:
+        for start in range(0, n_rows, chunksize):
+            writer.write(source.iloc[rng.integers(0, len(source), min(chunksize, n_rows - start))])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Out-of-core training on a dataset larger than memory")
+    parser.add_argument("--data", default=DATA_PATH, help="Training dataset (.csv, .parquet or .feather)")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="Where to save the trained model")
+    parser.add_argument("--work-dir", default=WORK_DIR, help="Directory for the binned memory-mapped arrays")
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE, help="Rows read per chunk")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS, help="Rows per partial_fit call")
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--holdout-rows", type=int, default=200_000, help="Rows at the end kept for scoring")
+    parser.add_argument("--sample-rows", type=int, default=SAMPLE_ROWS,
+                        help="Rows sampled across all chunks to fit the numeric bin edges")
+    parser.add_argument("--random-state", type=int, default=42)
+    parser.add_argument("--make-synthetic", type=int, metavar="N_ROWS",
+                        help="Write an N_ROWS synthetic dataset to --data and exit")
+    args = parser.parse_args(argv)
+
+    print("=" * 80)
+    if args.make_synthetic:
+        print(f"WRITING {args.make_synthetic:,}-ROW SYNTHETIC DATASET")
+        print("=" * 80)
+        start = time.perf_counter()
+        write_synthetic(args.data, args.make_synthetic, args.random_state, args.chunksize)
+        print(f"   ✅ {args.data}: {os.path.getsize(args.data) / 1e9:.2f} GB in {time.perf_counter() - start:.1f}s")
+        print("=" * 80)
+        return
+
+    print("OUT-OF-CORE TRAINING (BINNED SGD)")
+    print("=" * 80)
+
+    with PeakRSSSampler() as binning_memory:
+        start = time.perf_counter()
+        binner, n_rows = bin_to_disk(args.data, args.work_dir, args.chunksize, args.sample_rows, args.random_state)
+        binning_seconds = time.perf_counter() - start
+    print(f"\n📥 Binned {n_rows:,} rows in {binning_seconds:.1f}s ({n_rows / binning_seconds:,.0f} rows/s)")
+    print(f"   {len(binner.columns)} features → {binner.total_bins} bins, "
+          f"{n_rows * len(binner.columns) / 1e6:,.0f} MB of codes in {args.work_dir}")
+    print(f"   Peak RSS: {binning_memory.peak / 1e6:,.0f} MB")
+
+    with PeakRSSSampler() as training_memory:
+        result = train(binner, args.work_dir, n_rows, args.epochs, args.batch_rows, args.holdout_rows,
+                       args.random_state)
+
+    print(f"\n{'Epoch':>6} {'Wall (s)':>9} {'Rows/s':>12} {'Holdout MAE':>12} {'RSS (MB)':>9}")
+    print("-" * 80)
+    for row in result["history"]:
+        print(f"{row['epoch']:>6} {row['seconds']:>9.1f} {row['rows_per_sec']:>12,.0f} "
+              f"{row['holdout_mae']:>12.3f} {row['rss_mb']:>9.0f}")
+    print("-" * 80)
+    print(f"   Trained on {result['train_rows']:,} rows, scored on the last {result['holdout_rows']:,}")
+    print(f"   Peak RSS while training: {training_memory.peak / 1e6:,.0f} MB")
+
+    result["model"].save(args.output)
+    print(f"\n💾 Model saved to: {args.output} ({os.path.getsize(args.output) / 1e3:.1f} KB)")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Successive-halving hyperparameter search for the delay forest.
+
+HalvingRandomSearchCV samples candidates from SEARCH_SPACE, scores them all on
+a slice of the training rows, and keeps the best 1/factor at each round while
+tripling the rows they get. Rounds are spread across every core with
+joblib, and fixed seeds make the search deterministic for any core count.
+
+Accuracy alone does not pick the winner. The finalists are re-scored with
+full-data cross-validation and refit. The winner is the finalist with the
+fewest nodes (the work of a flattened single-row prediction, and the same
+cost compact_forest.py minimizes) whose MAE is within tolerance of the most
+accurate one; equal node counts go to the lower MAE. Node counts do not
+depend on timer noise, so the same seed always picks the same winner.
+Single-row latency of the flattened forest is measured for the report and
+only affects the choice when a latency budget is given.
+
+Used by model/delay_predictor.py --tune.
+"""
+
+import time
+
+import numpy as np
+from scipy.stats import randint
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import HalvingRandomSearchCV, KFold, cross_val_score
+
+from flat_forest import FlatForest
+
+SEARCH_SPACE = {
+    "n_estimators": [25, 50, 75, 100, 150, 200],
+    "max_depth": [4, 6, 8, 10, 12, 16, 20, None],
+    "min_samples_split": randint(2, 11),
+    "min_samples_leaf": randint(1, 5),
+    "max_features": [1.0, 0.7, 0.5, "sqrt"],
+}
+
+N_CANDIDATES = 27
+HALVING_FACTOR = 3
+CV_FOLDS = 5
+SHORTLIST = 8
+
+
+def single_row_latency_us(model, X, repeats: int = 200) -> float:
+    """Best-case single-row latency of the flattened forest, in microseconds"""
+    flat = FlatForest.from_sklearn(model)
+    rows = X[:repeats]
+    timings = []
+    for i in range(repeats):
+        row = rows[i % len(rows)][None, :]
+        start = time.perf_counter()
+        flat.predict(row)
+        timings.append(time.perf_counter() - start)
+    # The minimum is the most repeatable estimate of the work per call
+    return float(np.min(timings) * 1e6)
+
+
+def _pareto(rows) -> None:
+    """Flag rows no other row beats on both MAE and latency"""
+    for row in rows:
+        row["pareto"] = not any(
+            other["cv_mae"] <= row["cv_mae"] and other["latency_us"] <= row["latency_us"]
+            and (other["cv_mae"] < row["cv_mae"] or other["latency_us"] < row["latency_us"])
+            for other in rows
+        )
+
+
+def tune(X_train, y_train, random_state: int = 42, n_candidates: int = N_CANDIDATES,
+         factor: int = HALVING_FACTOR, mae_tolerance: float = 0.02, latency_budget_us: float = None,
+         n_jobs: int = -1) -> dict:
+    """Run the search; returns the winner's parameters and a JSON-serializable report"""
+    cv = KFold(CV_FOLDS, shuffle=True, random_state=random_state)
+    search = HalvingRandomSearchCV(
+        RandomForestRegressor(random_state=random_state),
+        SEARCH_SPACE,
+        n_candidates=n_candidates,
+        factor=factor,
+        resource="n_samples",
+        # Size the first round so the last one trains on (almost) every row
+        min_resources="exhaust",
+        scoring="neg_mean_absolute_error",
+        cv=cv,
+        refit=False,
+        random_state=random_state,
+        n_jobs=n_jobs,
+    )
+    start = time.perf_counter()
+    search.fit(X_train, y_train)
+    search_seconds = time.perf_counter() - start
+
+    results = search.cv_results_
+    iterations = np.asarray(results["iter"])
+    last_iteration = iterations.max()
+    # Each candidate's score at the deepest round it reached
+    reached = {}
+    for i, params in enumerate(results["params"]):
+        key = repr(sorted(params.items()))
+        if key not in reached or iterations[i] > iterations[reached[key]]:
+            reached[key] = i
+    ranked = sorted(reached.values(), key=lambda i: (-iterations[i], -results["mean_test_score"][i]))
+
+    finalists = []
+    for i in ranked[:SHORTLIST]:
+        params = dict(results["params"][i])
+        model = RandomForestRegressor(random_state=random_state, **params)
+        cv_mae = -cross_val_score(model, X_train, y_train, cv=cv, scoring="neg_mean_absolute_error",
+                                  n_jobs=n_jobs).mean()
+        model.fit(X_train, y_train)
+        finalists.append({
+            "params": {k: (v.item() if hasattr(v, "item") else v) for k, v in params.items()},
+            "round": int(iterations[i]),
+            "cv_mae": float(cv_mae),
+            "latency_us": single_row_latency_us(model, X_train),
+            "n_nodes": int(sum(est.tree_.node_count for est in model.estimators_)),
+        })
+    _pareto(finalists)
+
+    best_mae = min(f["cv_mae"] for f in finalists)
+    eligible = [f for f in finalists if f["cv_mae"] <= best_mae + mae_tolerance]
+    if latency_budget_us is not None:
+        eligible = [f for f in eligible if f["latency_us"] <= latency_budget_us] or eligible
+    winner = min(eligible, key=lambda f: (f["n_nodes"], f["cv_mae"]))
+    for f in finalists:
+        f["winner"] = f is winner
+
+    return {
+        "params": winner["params"],
+        "report": {
+            "random_state": random_state,
+            "n_candidates": n_candidates,
+            "factor": factor,
+            "rounds": int(last_iteration) + 1,
+            "candidates_per_round": [int((iterations == it).sum()) for it in range(last_iteration + 1)],
+            "rows_per_round": [int(n) for n in search.n_resources_],
+            "search_seconds": search_seconds,
+            "mae_tolerance": mae_tolerance,
+            "latency_budget_us": latency_budget_us,
+            "finalists": sorted(finalists, key=lambda f: f["cv_mae"]),
+            "winner": winner,
+        },
+    }
@@ -1,138 +1,366 @@
-import pandas as pd
+"""
+Synthetic women's health dataset generator.
+
+Every column is drawn for all rows at once: conditional columns
+(hormonal_imbalance, cycle_length, contraceptive_use) are built with boolean
+masks over whole arrays instead of per-row loops, and categorical columns are
+drawn as integer codes (inverse CDF over one uniform draw per row, the method
+Generator.choice uses) and stored as pandas Categoricals. The CSV is written
+with pyarrow's multithreaded writer, several times faster than DataFrame.to_csv.
+A .parquet or .feather --output (and Parquet parts) get the typed, dictionary-
+encoded schema of model/dataset_io.py.
+
+Rows are generated in fixed-size chunks, each with its own random stream
+spawned from the seed (SeedSequence.spawn), so memory is bounded by the chunk
+size and a given (seed, chunk size) always produces the same rows. With
+--parts the output is a directory of one CSV or Parquet file per chunk plus a
+manifest.json, and the chunks are generated by a process pool; the parts are
+identical for any number of workers.
+
+The distributions are the ones the dataset has always used; the random stream
+is NumPy's Generator, so a seed gives different rows than the old
+np.random.seed(42) script did.
+
+Run with:
+    python notebooks/create_datasets.py                                  # data/women_health_dataset.csv
+    python notebooks/create_datasets.py --n-samples 10000000 --output big.csv --seed 7
+    python notebooks/create_datasets.py --n-samples 10000000 --output big.parquet
+    python notebooks/create_datasets.py --n-samples 200000000 --parts --output big_parts --workers 8 --format parquet
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
 import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, "model"))
+
+from dataset_io import DatasetWriter, file_format, to_arrow
+
+OUTPUT_PATH = os.path.join(BASE_DIR, "data", "women_health_dataset.csv")
+
+N_SAMPLES = 1000
+SEED = 42
+CHUNK_SIZE = 1_000_000
+PART_FORMATS = ("csv", "parquet")
+
+STRESS_LEVELS = (["low", "medium", "high"], [0.3, 0.45, 0.25])
+EXERCISE_FREQUENCIES = (["sedentary", "light", "moderate", "active"], [0.25, 0.30, 0.30, 0.15])
+DIET_QUALITIES = (["poor", "fair", "good", "excellent"], [0.15, 0.30, 0.40, 0.15])
+FLOW_LEVELS = (["light", "medium", "heavy"], [0.25, 0.5, 0.25])
+# Only drawn for adults; under-18s are always "none"
+CONTRACEPTIVES = (["none", "oral contraceptive", "IUD", "implant"], [0.45, 0.30, 0.15, 0.10])
+MOOD_STATES = (["excellent", "good", "neutral", "anxious", "depressed"], [0.15, 0.35, 0.30, 0.15, 0.05])
+
+
+def _bernoulli(rng: np.random.Generator, p: float, n: int) -> np.ndarray:
+    """0/1 flags with P(1) = p; the same distribution as binomial(1, p), drawn faster"""
+    return (rng.random(n) < p).astype(np.int8)
+
+
+def category_codes(rng: np.random.Generator, options, n: int) -> np.ndarray:
+    """n int8 indices into the categories of (categories, probabilities)"""
+    _, p = options
+    # Inverse CDF, as Generator.choice(p=...) does, but one int8 comparison pass
+    # per category boundary instead of a float64 binary search per row
+    u = rng.random(n, dtype=np.float32)
+    codes = np.zeros(n, dtype=np.int8)
+    for edge in np.cumsum(p)[:-1]:
+        codes += u >= edge
+    return codes
+
+
+def _categorical(rng: np.random.Generator, options, n: int) -> pd.Categorical:
+    """n draws from (categories, probabilities), kept as codes rather than Python strings"""
+    return pd.Categorical.from_codes(category_codes(rng, options, n), options[0])
+
+
+def generate_chunk(n_samples: int, seed, first_id: int = 1) -> pd.DataFrame:
+    """n_samples rows drawn from one random stream (an int seed or a SeedSequence)"""
+    rng = np.random.default_rng(seed)
+
+    # -----------------------------
+    # Demographics
+    # -----------------------------
+    age = rng.integers(15, 50, n_samples, dtype=np.int16)
+
+    # -----------------------------
+    # Medical conditions
+    # -----------------------------
+    has_pcos = _bernoulli(rng, 0.15, n_samples)
+    has_thyroid = _bernoulli(rng, 0.12, n_samples)
+    has_endometriosis = _bernoulli(rng, 0.10, n_samples)
+
+    # -----------------------------
+    # Lifestyle
+    # -----------------------------
+    stress_level = _categorical(rng, STRESS_LEVELS, n_samples)
+    sleep_hours = np.round(rng.uniform(4, 9, n_samples), 1)
+    exercise_frequency = _categorical(rng, EXERCISE_FREQUENCIES, n_samples)
+    diet_quality = _categorical(rng, DIET_QUALITIES, n_samples)
+    water_intake = rng.integers(2, 12, n_samples, dtype=np.int16)
+
+    # -----------------------------
+    # Body metrics
+    # -----------------------------
+    height = rng.uniform(150, 180, n_samples)
+    weight = rng.uniform(45, 90, n_samples)
+    bmi = np.round(weight / ((height / 100) ** 2), 2)
+
+    # -----------------------------
+    # Hormonal imbalance (bounded)
+    # -----------------------------
+    risk = (
+        0.35 * has_pcos
+        + 0.25 * has_thyroid
+        + 0.15 * (stress_level == "high")
+        + 0.15 * (sleep_hours < 6)
+        + 0.15 * ((bmi < 18.5) | (bmi > 30))
+    )
+    hormonal_imbalance = (rng.random(n_samples) < np.minimum(risk, 0.9)).astype(np.int8)
+
+    # -----------------------------
+    # Cycle length (realistic)
+    # -----------------------------
+    cycle_length = np.empty(n_samples, dtype=np.int16)
+    regular = hormonal_imbalance == 0
+    skipped = ~regular & (rng.random(n_samples) < 0.25)
+    irregular = ~regular & ~skipped
+    cycle_length[regular] = rng.integers(24, 36, regular.sum(), dtype=np.int16)
+    cycle_length[skipped] = rng.integers(90, 151, skipped.sum(), dtype=np.int16)      # skipped cycles
+    cycle_length[irregular] = rng.integers(36, 75, irregular.sum(), dtype=np.int16)   # irregular cycles
+
+    # -----------------------------
+    # Delay derived from cycle
+    # -----------------------------
+    delay_days = np.maximum(0, cycle_length - 28).astype(np.int16)
+
+    # -----------------------------
+    # Period characteristics
+    # -----------------------------
+    period_duration = rng.integers(3, 8, n_samples, dtype=np.int16)
+    flow_level = _categorical(rng, FLOW_LEVELS, n_samples)
+    cramp_severity = rng.integers(0, 11, n_samples, dtype=np.int16)
+
+    # -----------------------------
+    # Contraceptive (age-aware)
+    # -----------------------------
+    contraceptive_use = _categorical(rng, CONTRACEPTIVES, n_samples)
+    contraceptive_use[age < 18] = "none"
+
+    # -----------------------------
+    # Mood
+    # -----------------------------
+    mood_state = _categorical(rng, MOOD_STATES, n_samples)
 
-np.random.seed(42)
-n_samples = 1000
-
-# -----------------------------
-# Demographics
-# -----------------------------
-age = np.random.randint(15, 50, n_samples)
-
-# -----------------------------
-# Medical conditions
-# -----------------------------
-has_pcos = np.random.binomial(1, 0.15, n_samples)
-has_thyroid = np.random.binomial(1, 0.12, n_samples)
-has_endometriosis = np.random.binomial(1, 0.10, n_samples)
-
-# -----------------------------
-# Lifestyle
-# -----------------------------
-stress_level = np.random.choice(['low', 'medium', 'high'], n_samples, p=[0.3, 0.45, 0.25])
-sleep_hours = np.round(np.random.uniform(4, 9, n_samples), 1)
-exercise_frequency = np.random.choice(
-    ['sedentary', 'light', 'moderate', 'active'],
-    n_samples, p=[0.25, 0.30, 0.30, 0.15]
-)
-diet_quality = np.random.choice(
-    ['poor', 'fair', 'good', 'excellent'],
-    n_samples, p=[0.15, 0.30, 0.40, 0.15]
-)
-water_intake = np.random.randint(2, 12, n_samples)
-
-# -----------------------------
-# Body metrics
-# -----------------------------
-height = np.random.uniform(150, 180, n_samples)
-weight = np.random.uniform(45, 90, n_samples)
-bmi = np.round(weight / ((height / 100) ** 2), 2)
-
-# -----------------------------
-# Hormonal imbalance (bounded)
-# -----------------------------
-hormonal_imbalance = np.zeros(n_samples, dtype=int)
-
-for i in range(n_samples):
-    risk = 0.0
-    risk += 0.35 if has_pcos[i] else 0
-    risk += 0.25 if has_thyroid[i] else 0
-    risk += 0.15 if stress_level[i] == 'high' else 0
-    risk += 0.15 if sleep_hours[i] < 6 else 0
-    risk += 0.15 if bmi[i] < 18.5 or bmi[i] > 30 else 0
-
-    risk = min(risk, 0.9)
-    hormonal_imbalance[i] = np.random.rand() < risk
-
-# -----------------------------
-# Cycle length (realistic)
-# -----------------------------
-cycle_length = np.zeros(n_samples, dtype=int)
-
-for i in range(n_samples):
-    if hormonal_imbalance[i] == 0:
-        cycle_length[i] = np.random.randint(24, 36)
+    # -----------------------------
+    # Final Dataset
+    # -----------------------------
+    return pd.DataFrame({
+        "user_id": np.arange(first_id, first_id + n_samples),
+        "age": age,
+        "cycle_length": cycle_length,
+        "period_duration": period_duration,
+        "flow_level": flow_level,
+        "stress_level": stress_level,
+        "sleep_hours": sleep_hours,
+        "exercise_frequency": exercise_frequency,
+        "water_intake": water_intake,
+        "diet_quality": diet_quality,
+        "weight": np.round(weight, 1),
+        "height": np.round(height, 1),
+        "bmi": bmi,
+        "contraceptive_use": contraceptive_use,
+        "has_pcos": has_pcos,
+        "has_endometriosis": has_endometriosis,
+        "has_thyroid": has_thyroid,
+        "mood_state": mood_state,
+        "cramp_severity": cramp_severity,
+        "hormonal_imbalance": hormonal_imbalance,
+        "delay_days": delay_days,
+    })
+
+
+def chunk_plan(n_samples: int, seed: int = SEED, chunk_size: int = CHUNK_SIZE) -> list:
+    """(index, first user_id, rows, SeedSequence) per chunk; the same list for any worker count"""
+    n_chunks = max(1, -(-n_samples // chunk_size))
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    return [
+        (i, i * chunk_size + 1, min(chunk_size, n_samples - i * chunk_size), seeds[i])
+        for i in range(n_chunks)
+    ]
+
+
+def generate(n_samples: int = N_SAMPLES, seed: int = SEED, chunk_size: int = CHUNK_SIZE) -> pd.DataFrame:
+    """The whole dataset in memory; the same rows as the chunked writers"""
+    chunks = [generate_chunk(n, seed_seq, first_id)
+              for _, first_id, n, seed_seq in chunk_plan(n_samples, seed, chunk_size)]
+    return chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
+
+
+def _csv_table(df: pd.DataFrame) -> pa.Table:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Categoricals become dictionary columns; the CSV writer wants plain strings
+    return table.cast(pa.schema([
+        pa.field(field.name, pa.string()) if pa.types.is_dictionary(field.type) else field
+        for field in table.schema
+    ]))
+
+
+def _write_csv_rows(df: pd.DataFrame, f, header: bool):
+    table = _csv_table(df)
+    # The header is written by hand: pyarrow always quotes column names
+    if header:
+        f.write((",".join(table.column_names) + "\n").encode())
+    pa_csv.write_csv(table, f, pa_csv.WriteOptions(include_header=False, quoting_style="none"))
+
+
+def write_csv(df: pd.DataFrame, path: str):
+    """Write the frame as the plain, unquoted CSV the rest of the repo reads"""
+    with open(path, "wb") as f:
+        _write_csv_rows(df, f, header=True)
+
+
+def write_single(n_samples: int, path: str, seed: int = SEED, chunk_size: int = CHUNK_SIZE) -> dict:
+    """Stream all chunks into one file in order, holding one chunk in memory at a time
+
+    The format follows the extension: CSV, or Parquet / Feather with the
+    dataset_io schema (one row group per chunk).
+    """
+    generate_seconds = write_seconds = 0.0
+    columnar = file_format(path) != "csv"
+    with (DatasetWriter(path) if columnar else open(path, "wb")) as out:
+        for i, first_id, n, seed_seq in chunk_plan(n_samples, seed, chunk_size):
+            start = time.perf_counter()
+            df = generate_chunk(n, seed_seq, first_id)
+            generate_seconds += time.perf_counter() - start
+
+            start = time.perf_counter()
+            if columnar:
+                out.write(df)
+            else:
+                _write_csv_rows(df, out, header=i == 0)
+            write_seconds += time.perf_counter() - start
+    return {"rows": n_samples, "generate_seconds": generate_seconds, "write_seconds": write_seconds}
+
+
+def part_name(index: int, fmt: str) -> str:
+    return f"part-{index:05d}.{fmt}"
+
+
+def _write_part(task) -> dict:
+    """Generate and write one chunk; runs in a worker so only this summary crosses processes"""
+    (index, first_id, n, seed_seq), output_dir, fmt = task
+    start = time.perf_counter()
+    df = generate_chunk(n, seed_seq, first_id)
+    generate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    path = os.path.join(output_dir, part_name(index, fmt))
+    if fmt == "parquet":
+        pq.write_table(to_arrow(df), path)
     else:
-        if np.random.rand() < 0.25:
-            cycle_length[i] = np.random.randint(90, 151)  # skipped cycles
-        else:
-            cycle_length[i] = np.random.randint(36, 75)   # irregular cycles
-
-# -----------------------------
-# Delay derived from cycle
-# -----------------------------
-delay_days = np.maximum(0, cycle_length - 28)
-
-# -----------------------------
-# Period characteristics
-# -----------------------------
-period_duration = np.random.randint(3, 8, n_samples)
-flow_level = np.random.choice(['light', 'medium', 'heavy'], n_samples, p=[0.25, 0.5, 0.25])
-cramp_severity = np.random.randint(0, 11, n_samples)
-
-# -----------------------------
-# Contraceptive (age-aware)
-# -----------------------------
-contraceptive_use = []
-for a in age:
-    if a < 18:
-        contraceptive_use.append('none')
+        write_csv(df, path)
+    return {
+        "file": os.path.basename(path),
+        "rows": n,
+        "first_user_id": first_id,
+        "generate_seconds": generate_seconds,
+        "write_seconds": time.perf_counter() - start,
+    }
+
+
+def write_parts(n_samples: int, output_dir: str, seed: int = SEED, chunk_size: int = CHUNK_SIZE,
+                workers: int = 1, fmt: str = "csv") -> dict:
+    """Write one file per chunk plus manifest.json, generating chunks across a process pool"""
+    if fmt not in PART_FORMATS:
+        raise ValueError(f"Unknown part format '{fmt}' (use one of {PART_FORMATS})")
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, "manifest.json")
+
+    # Parts listed by an earlier manifest would otherwise be mixed into this dataset
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            for part in json.load(f)["parts"]:
+                stale = os.path.join(output_dir, part["file"])
+                if os.path.exists(stale):
+                    os.remove(stale)
+        os.remove(manifest_path)
+
+    tasks = [(chunk, output_dir, fmt) for chunk in chunk_plan(n_samples, seed, chunk_size)]
+    start = time.perf_counter()
+    workers = max(1, min(int(workers), len(tasks)))
+    if workers == 1:
+        parts = [_write_part(task) for task in tasks]
     else:
-        contraceptive_use.append(
-            np.random.choice(
-                ['none', 'oral contraceptive', 'IUD', 'implant'],
-                p=[0.45, 0.30, 0.15, 0.10]
-            )
-        )
-
-# -----------------------------
-# Mood
-# -----------------------------
-mood_state = np.random.choice(
-    ['excellent', 'good', 'neutral', 'anxious', 'depressed'],
-    n_samples, p=[0.15, 0.35, 0.30, 0.15, 0.05]
-)
-
-# -----------------------------
-# Final Dataset
-# -----------------------------
-df = pd.DataFrame({
-    "user_id": range(1, n_samples + 1),
-    "age": age,
-    "cycle_length": cycle_length,
-    "period_duration": period_duration,
-    "flow_level": flow_level,
-    "stress_level": stress_level,
-    "sleep_hours": sleep_hours,
-    "exercise_frequency": exercise_frequency,
-    "water_intake": water_intake,
-    "diet_quality": diet_quality,
-    "weight": np.round(weight, 1),
-    "height": np.round(height, 1),
-    "bmi": bmi,
-    "contraceptive_use": contraceptive_use,
-    "has_pcos": has_pcos,
-    "has_endometriosis": has_endometriosis,
-    "has_thyroid": has_thyroid,
-    "mood_state": mood_state,
-    "cramp_severity": cramp_severity,
-    "hormonal_imbalance": hormonal_imbalance,
-    "delay_days": delay_days
-})
-
-# SAME DATASET NAME (UNCHANGED)
-output_path = "/home/ritirai/Desktop/RITI/AI-Powered Women Health Insight System/Women Health Insight/data/women_health_dataset.csv"
-df.to_csv(output_path, index=False)
-
-print("Dataset generated successfully with realistic constraints.")
-print(f"Saved at: {output_path}")
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("fork" if "fork" in methods else "spawn")
+        with ctx.Pool(workers) as pool:
+            parts = pool.map(_write_part, tasks, chunksize=1)
+    seconds = time.perf_counter() - start
+
+    manifest = {
+        "rows": n_samples,
+        "seed": seed,
+        "chunk_size": chunk_size,
+        "format": fmt,
+        "parts": [{key: part[key] for key in ("file", "rows", "first_user_id")} for part in parts],
+    }
+    # Written last, so a manifest only ever describes a complete set of parts
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+    return {
+        "rows": n_samples,
+        "parts": len(parts),
+        "workers": workers,
+        "seconds": seconds,
+        "generate_seconds": sum(part["generate_seconds"] for part in parts),
+        "write_seconds": sum(part["write_seconds"] for part in parts),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the synthetic women's health dataset")
+    parser.add_argument("--n-samples", type=int, default=N_SAMPLES)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", default=OUTPUT_PATH, help="CSV, Parquet or Feather path (by extension), or a directory with --parts")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="Rows per chunk; the rows a seed produces depend on it")
+    parser.add_argument("--parts", action="store_true", help="Write one file per chunk plus manifest.json")
+    parser.add_argument("--format", choices=PART_FORMATS, default="csv", help="Part file format (with --parts)")
+    parser.add_argument("--workers", "-j", type=int, default=1, help="Worker processes (with --parts)")
+    args = parser.parse_args(argv)
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be positive")
+    if not args.parts and (args.format != "csv" or args.workers != 1):
+        parser.error("--format and --workers apply to --parts output")
+
+    if args.parts:
+        stats = write_parts(args.n_samples, args.output, args.seed, args.chunk_size, args.workers, args.format)
+        print("Dataset generated successfully with realistic constraints.")
+        print(f"Saved at: {args.output} ({stats['parts']} {args.format} parts + manifest.json)")
+        print(f"{stats['rows']:,} rows in {stats['seconds']:.2f}s with {stats['workers']} workers "
+              f"({stats['rows'] / stats['seconds']:,.0f} rows/s); summed over parts: "
+              f"generate {stats['generate_seconds']:.2f}s, write {stats['write_seconds']:.2f}s")
+        return
+
+    stats = write_single(args.n_samples, args.output, args.seed, args.chunk_size)
+    print("Dataset generated successfully with realistic constraints.")
+    print(f"Saved at: {args.output}")
+    print(f"{stats['rows']:,} rows: generated in {stats['generate_seconds']:.2f}s, "
+          f"written in {stats['write_seconds']:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Synthetic longitudinal patient histories for database and dashboard benchmarks.
+
+The shipped patient_history.db holds a couple of rows, so load_history, the
+history charts and SQLite writes have never run against a realistic table.
+This script generates many patients with many assessments each and bulk-loads
+them into patient_history with the app's schema (db.init_sqlite), in one
+transaction.
+
+Each patient keeps fixed traits (height, conditions, a baseline cycle) and
+drifts between visits: weight and sleep follow small random walks, and
+stress, exercise, diet, mood, flow and contraception change now and then
+(they are redrawn from the create_datasets.py distributions). Visits are
+about one cycle apart, with each patient's last visit in the weeks before
+--end-date. Rows are inserted in timestamp order, so ids are chronological
+as they are in the app. predicted_delay, the 10th-90th percentile interval
+and the risk columns come from the served model in chunks, as
+model/score.py does. Past visits of some patients carry a recorded
+actual_delay with outcome_seq in recording order, as record_outcome
+leaves them.
+
+Run with:
+    python notebooks/create_patient_history.py                                  # data/db_data/patient_history_fixture.db
+    python notebooks/create_patient_history.py --patients 200000 --mean-assessments 25 --bench
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(BASE_DIR, "app"))
+sys.path.append(os.path.join(BASE_DIR, "model"))
+
+from create_datasets import (CONTRACEPTIVES, DIET_QUALITIES, EXERCISE_FREQUENCIES, FLOW_LEVELS, MOOD_STATES,
+                             STRESS_LEVELS, category_codes)
+from db import DB_DATA_DIR, RECORD_COLUMNS, SQLITE_PATH, init_sqlite, load_history
+from feature_encoder import FeatureEncoder
+from model_backends import load_model, predictor_for
+from risk import interpretations, risk_levels
+from score import DEFAULT_CHUNKSIZE, ENCODER_PATH, MODEL_PATH, predict_chunk
+
+FIXTURE_PATH = os.path.join(DB_DATA_DIR, "patient_history_fixture.db")
+
+N_PATIENTS = 100_000
+MEAN_ASSESSMENTS = 20
+SEED = 42
+
+# Chance that a categorical input changes from one visit to the next
+CHANGE_RATES = {
+    "stress_level": (STRESS_LEVELS, 0.20),
+    "exercise_frequency": (EXERCISE_FREQUENCIES, 0.05),
+    "diet_quality": (DIET_QUALITIES, 0.05),
+    "mood_state": (MOOD_STATES, 0.40),
+    "flow_level": (FLOW_LEVELS, 0.15),
+    "contraceptive_use": (CONTRACEPTIVES, 0.03),
+}
+OUTCOME_RATE = 0.35
+NOTES = ["", "Follow-up visit", "Reports more cramps than usual", "Started new medication",
+         "Travelling this month", "Irregular sleep schedule"]
+NOTE_RATE = 0.05
+
+
+def _group_cumsum(values: np.ndarray, starts: np.ndarray, patient: np.ndarray) -> np.ndarray:
+    """Running sum that restarts at every patient's first row"""
+    total = np.cumsum(values)
+    return total - (total[starts] - values[starts])[patient]
+
+
+def _carry_forward(values: np.ndarray, changed: np.ndarray) -> np.ndarray:
+    """Each row takes the value of the latest row (within its patient) where changed is set"""
+    last = np.maximum.accumulate(np.where(changed, np.arange(len(values)), 0))
+    return values[last]
+
+
+def generate_history(n_patients: int = N_PATIENTS, mean_assessments: float = MEAN_ASSESSMENTS,
+                     seed: int = SEED, end_date: date = None) -> pd.DataFrame:
+    """All assessments of all patients in timestamp order, without model outputs"""
+    rng = np.random.default_rng(seed)
+    end = datetime.combine(end_date or date.today(), datetime.min.time())
+
+    # -----------------------------
+    # Patients and their visits (rows of one patient are contiguous until the final sort)
+    # -----------------------------
+    visits = 1 + rng.poisson(mean_assessments - 1, n_patients)
+    n = int(visits.sum())
+    patient = np.repeat(np.arange(n_patients), visits)
+    starts = np.concatenate([[0], np.cumsum(visits)[:-1]])
+    first = np.zeros(n, dtype=bool)
+    first[starts] = True
+    last = np.zeros(n, dtype=bool)
+    last[starts + visits - 1] = True
+
+    # -----------------------------
+    # Fixed traits
+    # -----------------------------
+    age0 = rng.integers(15, 50, n_patients)
+    height = np.round(rng.uniform(150, 180, n_patients), 1)[patient]
+    has_pcos = (rng.random(n_patients) < 0.15).astype(np.int8)[patient]
+    has_thyroid = (rng.random(n_patients) < 0.12).astype(np.int8)[patient]
+    has_endometriosis = (rng.random(n_patients) < 0.10).astype(np.int8)[patient]
+    base_cycle = rng.integers(24, 36, n_patients)[patient]
+    base_duration = rng.integers(3, 8, n_patients)[patient]
+    base_cramps = rng.integers(0, 11, n_patients)[patient]
+    base_water = rng.integers(2, 12, n_patients)[patient]
+
+    # -----------------------------
+    # Drifting lifestyle inputs
+    # -----------------------------
+    weight = rng.uniform(45, 90, n_patients)[patient] + _group_cumsum(rng.normal(0, 0.4, n), starts, patient)
+    weight = np.round(np.clip(weight, 40, 120), 1)
+    sleep = rng.uniform(4, 9, n_patients)[patient] + _group_cumsum(rng.normal(0, 0.15, n), starts, patient)
+    sleep_hours = np.round(np.clip(sleep, 4, 9), 1)
+    bmi = np.round(weight / ((height / 100) ** 2), 2)
+    water_intake = np.clip(base_water + rng.integers(-1, 2, n), 2, 11)
+    period_duration = np.clip(base_duration + rng.integers(-1, 2, n), 3, 7)
+    cramp_severity = np.clip(base_cramps + rng.integers(-1, 2, n), 0, 10)
+
+    codes = {}
+    for col, (options, rate) in CHANGE_RATES.items():
+        changed = first | (rng.random(n) < rate)
+        codes[col] = _carry_forward(category_codes(rng, options, n), changed)
+
+    # -----------------------------
+    # Cycle length: regular around the patient's baseline, irregular or skipped
+    # with the dataset's hormonal risk
+    # -----------------------------
+    risk = (
+        0.35 * has_pcos
+        + 0.25 * has_thyroid
+        + 0.15 * (codes["stress_level"] == STRESS_LEVELS[0].index("high"))
+        + 0.15 * (sleep_hours < 6)
+        + 0.15 * ((bmi < 18.5) | (bmi > 30))
+    )
+    imbalance = rng.random(n) < np.minimum(risk, 0.9)
+    skipped = imbalance & (rng.random(n) < 0.25)
+    irregular = imbalance & ~skipped
+    cycle_length = np.clip(base_cycle + np.round(rng.normal(0, 1.5, n)), 21, 35)
+    cycle_length[skipped] = rng.integers(90, 151, skipped.sum())
+    cycle_length[irregular] = rng.integers(36, 75, irregular.sum())
+
+    # -----------------------------
+    # Timestamps: one cycle between visits, the last one shortly before end_date
+    # -----------------------------
+    gap_days = np.where(first, 0.0, np.roll(cycle_length, 1) + rng.normal(0, 2, n))
+    elapsed = _group_cumsum(gap_days, starts, patient)
+    days_before_end = elapsed[starts + visits - 1][patient] - elapsed + rng.uniform(0, 60, n_patients)[patient]
+    seconds = np.round(days_before_end * 86400 + rng.uniform(0, 86400, n))
+    timestamp = np.datetime64(end, "s") - seconds.astype("timedelta64[s]")
+    age = age0[patient] + (elapsed // 365.25).astype(int)
+
+    # Under-18s are always "none", as in the training data
+    contraceptive = codes["contraceptive_use"]
+    contraceptive[age < 18] = CONTRACEPTIVES[0].index("none")
+
+    # -----------------------------
+    # Recorded outcomes: past visits only; the delay is the one that cycle had
+    # -----------------------------
+    has_outcome = ~last & (rng.random(n) < OUTCOME_RATE)
+    actual_delay = np.where(has_outcome, np.maximum(0, cycle_length - 28), np.nan)
+
+    notes = np.where(rng.random(n) < NOTE_RATE, rng.integers(1, len(NOTES), n), 0)
+    ids = np.arange(1, n_patients + 1)
+    df = pd.DataFrame({
+        "timestamp": timestamp,
+        "patient_id": pd.Categorical.from_codes(patient, [f"P-{i:06d}" for i in ids]),
+        "patient_name": pd.Categorical.from_codes(patient, [f"Patient {i}" for i in ids]),
+        "age": age,
+        "cycle_length": cycle_length.astype(float),
+        "period_duration": period_duration.astype(float),
+        "sleep_hours": sleep_hours,
+        "notes": pd.Categorical.from_codes(notes, NOTES),
+        "water_intake": water_intake.astype(float),
+        "weight": weight,
+        "height": height,
+        "bmi": bmi,
+        "cramp_severity": cramp_severity,
+        "has_pcos": has_pcos,
+        "has_endometriosis": has_endometriosis,
+        "has_thyroid": has_thyroid,
+        "actual_delay": actual_delay,
+    })
+    for col, (options, _) in CHANGE_RATES.items():
+        df[col] = pd.Categorical.from_codes(codes[col], options[0])
+
+    df = df.sort_values("timestamp", kind="stable", ignore_index=True)
+    # outcome_seq follows the order the outcomes were recorded in, i.e. the visits' order;
+    # it starts at 1 here and bulk_load shifts it past any outcomes already in the table
+    recorded = df["actual_delay"].notna().to_numpy()
+    df["outcome_seq"] = np.where(recorded, np.cumsum(recorded), np.nan)
+    df["timestamp"] = df["timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    return df
+
+
+def attach_predictions(df: pd.DataFrame, model, encoder: FeatureEncoder,
+                       chunksize: int = DEFAULT_CHUNKSIZE) -> pd.DataFrame:
+    """predicted_delay, delay_lower/upper, risk_level and interpretation from the served model"""
+    predictor = predictor_for(model)
+    buffer = np.empty((chunksize, encoder.n_features), dtype=np.float32)
+    pred = np.concatenate([
+        predict_chunk(predictor, encoder, df.iloc[i:i + chunksize], buffer, intervals=True)
+        for i in range(0, len(df), chunksize)
+    ])
+    df["predicted_delay"] = np.round(pred[:, 0], 2)
+    df["delay_lower"] = np.round(pred[:, 1], 2)
+    df["delay_upper"] = np.round(pred[:, 2], 2)
+    df["risk_level"] = risk_levels(pred[:, 0])
+    df["interpretation"] = interpretations(pred[:, 0])
+    return df
+
+
+def bulk_load(df: pd.DataFrame, sqlite_path: str, replace: bool = True, batch_size: int = 100_000) -> int:
+    """Insert every row into patient_history in a single transaction
+
+    When appending, outcome_seq continues after the table's highest one (as
+    db.record_outcome numbers outcomes), so the new outcomes land above the
+    retrain watermark instead of reusing sequence numbers it already passed.
+    """
+    init_sqlite(sqlite_path)
+    columns = RECORD_COLUMNS + ["actual_delay", "outcome_seq"]
+    insert = (f"INSERT INTO patient_history ({', '.join(columns)}) "
+              f"VALUES ({', '.join('?' for _ in columns)})")
+
+    con = sqlite3.connect(sqlite_path)
+    try:
+        with con:
+            # Hold the write lock from reading MAX(outcome_seq) to the commit
+            con.execute("BEGIN IMMEDIATE")
+            if replace:
+                con.execute("DELETE FROM patient_history")
+                con.execute("DELETE FROM sqlite_sequence WHERE name = 'patient_history'")
+            offset = con.execute("SELECT COALESCE(MAX(outcome_seq), 0) FROM patient_history").fetchone()[0]
+            df = df.assign(outcome_seq=df["outcome_seq"] + offset)
+            for i in range(0, len(df), batch_size):
+                batch = df.iloc[i:i + batch_size]
+                # ndarray.tolist gives Python ints/floats, which sqlite3 binds directly; NaN -> NULL
+                values = [batch[col].astype(object).where(batch[col].notna(), None).tolist()
+                          if batch[col].hasnans else batch[col].to_numpy().tolist() for col in columns]
+                con.executemany(insert, zip(*values))
+        # A WAL-mode database (db.py enables it) would otherwise keep the new rows in -wal
+        con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        con.close()
+    return len(df)
+
+
+def database_bytes(sqlite_path: str) -> int:
+    """Size of the database file plus any write-ahead log not yet checkpointed into it"""
+    wal_path = sqlite_path + "-wal"
+    return os.path.getsize(sqlite_path) + (os.path.getsize(wal_path) if os.path.exists(wal_path) else 0)
+
+
+def benchmark_reads(sqlite_path: str, patient_id: str) -> list:
+    """Wall time of the app's history reads on the loaded table"""
+    results = []
+    for limit in (50, 200, 10_000):
+        start = time.perf_counter()
+        rows = len(load_history(limit=limit, sqlite_path=sqlite_path))
+        results.append((f"load_history(limit={limit})", rows, time.perf_counter() - start))
+
+    con = sqlite3.connect(sqlite_path)
+    try:
+        start = time.perf_counter()
+        rows = len(pd.read_sql_query("SELECT * FROM patient_history WHERE patient_id = ? ORDER BY id",
+                                     con, params=(patient_id,)))
+        results.append(("one patient's history", rows, time.perf_counter() - start))
+
+        start = time.perf_counter()
+        rows = con.execute("SELECT COUNT(*) FROM patient_history WHERE outcome_seq > ? AND actual_delay IS NOT NULL",
+                           (0,)).fetchone()[0]
+        results.append(("retrain outcome scan", rows, time.perf_counter() - start))
+    finally:
+        con.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load synthetic longitudinal patient histories into SQLite")
+    parser.add_argument("--patients", type=int, default=N_PATIENTS)
+    parser.add_argument("--mean-assessments", type=float, default=MEAN_ASSESSMENTS,
+                        help="Mean assessments per patient (at least 1 each)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--end-date", type=date.fromisoformat, default=None,
+                        help="YYYY-MM-DD the histories end at (default: today)")
+    parser.add_argument("--db", default=FIXTURE_PATH, help="SQLite database to load into")
+    parser.add_argument("--append", action="store_true", help="Keep existing rows instead of replacing them")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--encoder", default=ENCODER_PATH)
+    parser.add_argument("--bench", action="store_true", help="Time the app's history reads afterwards")
+    args = parser.parse_args(argv)
+    if args.patients < 1 or args.mean_assessments < 1:
+        parser.error("--patients and --mean-assessments must be at least 1")
+    if os.path.abspath(args.db) == os.path.abspath(SQLITE_PATH) and not args.append:
+        parser.error("refusing to replace the app's patient history; pass --append or choose another --db")
+
+    start = time.perf_counter()
+    df = generate_history(args.patients, args.mean_assessments, args.seed, args.end_date)
+    generate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    df = attach_predictions(df, load_model(args.model), FeatureEncoder.load(args.encoder))
+    predict_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rows = bulk_load(df, args.db, replace=not args.append)
+    load_seconds = time.perf_counter() - start
+
+    print("=" * 80)
+    print("PATIENT HISTORY FIXTURE")
+    print("=" * 80)
+    print(f"Database:         {args.db}")
+    print(f"Patients:         {args.patients:,}")
+    print(f"Assessments:      {rows:,} ({df['timestamp'].iloc[0]} → {df['timestamp'].iloc[-1]})")
+    print(f"With outcomes:    {int(df['outcome_seq'].notna().sum()):,}")
+    print(f"Generated in:     {generate_seconds:.2f}s")
+    print(f"Predicted in:     {predict_seconds:.2f}s ({rows / predict_seconds:,.0f} rows/s)")
+    print(f"Inserted in:      {load_seconds:.2f}s ({rows / load_seconds:,.0f} rows/s, one transaction)")
+    print(f"Database size:    {database_bytes(args.db) / 1e6:.1f} MB")
+    print("=" * 80)
+
+    if args.bench:
+        print(f"\n{'Read':<28} {'Rows':>10} {'Time (ms)':>12}")
+        print("-" * 52)
+        for name, n_rows, seconds in benchmark_reads(args.db, df["patient_id"].iloc[-1]):
+            print(f"{name:<28} {n_rows:>10,} {seconds * 1000:>12.1f}")
+        print("-" * 52)
+
+
+if __name__ == "__main__":
+    main()